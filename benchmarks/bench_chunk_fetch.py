@@ -0,0 +1,149 @@
+"""
+chunk 下載客戶端比較：以本機的替身伺服器（模擬 raw.githubusercontent.com 的延遲、ETag 與偶發 503）
+比較逐一下載（每次新連線）與 ChunkFetcher 並行下載，並確認熱快取時只以 304 驗證、
+條目帶有相同的內容 sha256 時完全不發出請求、伺服器回應非 UTF-8 內容只算該條目失敗、暫時性錯誤會自動重試。
+
+使用方式（於專案根目錄執行，需先產生 index.json 與 knowledge_chunks/）：
+    python benchmarks/bench_chunk_fetch.py --latency 0.02
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+from chunk_fetch import ChunkFetcher  # noqa: E402
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """以目前資料夾為根目錄提供檔案，支援 ETag / If-None-Match，並依設定加入延遲與 503"""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    fail_first = False
+    requests = 0
+    connections = 0
+    failed_once = set()
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StandInHandler.lock:
+            StandInHandler.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with StandInHandler.lock:
+            StandInHandler.requests += 1
+            fail = StandInHandler.fail_first and self.path not in StandInHandler.failed_once
+            if fail:
+                StandInHandler.failed_once.add(self.path)
+        time.sleep(self.latency)
+        if fail:
+            self._send(503, b"", {"Retry-After": "0"})
+            return
+        try:
+            with open(urllib.parse.unquote(self.path.lstrip("/")), "rb") as f:
+                body = f.read()
+        except OSError:
+            self._send(404, b"")
+            return
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", {"ETag": etag})
+            return
+        self._send(200, body, {"ETag": etag, "Last-Modified": formatdate(usegmt=True)})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def reset_counters():
+    StandInHandler.requests = 0
+    StandInHandler.connections = 0
+
+
+def sequential_fetch(entries):
+    """舊做法：逐一以 urllib 下載，每個 chunk 一條新連線、沒有快取"""
+    return {entry["file"]: urllib.request.urlopen(entry["url"]).read().decode("utf-8") for entry in entries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="chunk 下載客戶端效能比較（本機替身伺服器）")
+    parser.add_argument("--index", default="index.json", help="index.json 路徑")
+    parser.add_argument("--limit", type=int, default=200, help="下載的 chunk 數")
+    parser.add_argument("--latency", type=float, default=0.02, help="替身伺服器每個請求的延遲（秒）")
+    parser.add_argument("--max-in-flight", type=int, default=16, help="ChunkFetcher 的並行請求數")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/"
+    StandInHandler.latency = args.latency
+
+    with open(args.index, "r", encoding="utf-8") as f:
+        entries = [dict(entry, url=base + urllib.parse.quote(entry["file"]))
+                   for entry in json.load(f)[:args.limit]]
+    expected = {}
+    for entry in entries:
+        with open(entry["file"], "r", encoding="utf-8") as f:
+            expected[entry["file"]] = f.read()
+
+    def run(label, func):
+        reset_counters()
+        start = time.perf_counter()
+        contents = func()
+        elapsed = time.perf_counter() - start
+        assert contents == expected, f"{label}：下載內容與原檔不同"
+        print(f"{label:<28} {elapsed:8.3f}s  請求 {StandInHandler.requests:4d}  連線 {StandInHandler.connections:4d}")
+
+    print(f"{len(entries)} 個 chunk，每個請求延遲 {args.latency * 1000:.0f} ms\n")
+    run("逐一下載（urllib）", lambda: sequential_fetch(entries))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        with ChunkFetcher(cache_dir, args.max_in_flight) as fetcher:
+            run("ChunkFetcher 冷快取", lambda: fetcher.fetch_many(entries)["contents"])
+            run("ChunkFetcher 熱快取（304 驗證）", lambda: fetcher.fetch_many(entries)["contents"])
+            assert fetcher.stats["not_modified"] == len(entries)
+
+            hashed = [dict(entry, sha256=hashlib.sha256(expected[entry["file"]].encode("utf-8")).hexdigest())
+                      for entry in entries]
+            run("熱快取且條目帶 sha256", lambda: fetcher.fetch_many(hashed)["contents"])
+            assert StandInHandler.requests == 0, "sha256 相同時不應發出任何請求"
+
+        # 替身伺服器以目前資料夾為根目錄，非 UTF-8 的檔案放在目前資料夾下的暫存資料夾
+        with tempfile.TemporaryDirectory(dir=".") as binary_dir, \
+                ChunkFetcher(os.path.join(binary_dir, "cache")) as fetcher:
+            bad_path = os.path.relpath(os.path.join(binary_dir, "bad.md")).replace("\\", "/")
+            with open(bad_path, "wb") as f:
+                f.write(b"\xff\xfe not utf-8")
+            bad = {"file": "bad.md", "url": base + urllib.parse.quote(bad_path)}
+            outcome = fetcher.fetch_many([bad] + entries[:3])
+            assert list(outcome["errors"]) == ["bad.md"] and len(outcome["contents"]) == 3, "非 UTF-8 內容應只影響該條目"
+
+        with ChunkFetcher(cache_dir, args.max_in_flight, backoff_base=0.01, revalidate=True) as fetcher:
+            StandInHandler.fail_first = True
+            run("每個 chunk 先回 503 一次", lambda: fetcher.fetch_many(entries)["contents"])
+            StandInHandler.fail_first = False
+            assert fetcher.stats["retries"] == len(entries) and fetcher.stats["failed"] == 0
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
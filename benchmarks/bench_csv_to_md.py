@@ -0,0 +1,118 @@
+"""
+CSV 轉 Markdown 效能比較：逐列 iterrows 的舊版寫法 vs 以欄為單位的向量化寫法，
+以及串流模式（chunksize）的記憶體峰值。每次執行都會先確認輸出逐位元組相同
+（合成資料含有空白的整數欄，確認串流與整份讀入推斷出相同的數值型別）。
+
+使用方式（於專案根目錄執行）：
+    python benchmarks/bench_csv_to_md.py --rows 200000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+import csv_to_md  # noqa: E402
+
+
+def legacy_generate_markdown_content(df: pd.DataFrame, base_name: str) -> str:
+    """舊版逐列寫法（保留作為比較基準與輸出正確性的對照）"""
+    content_parts = []
+    for index, row in df.iterrows():
+        content_parts.append(f"## {base_name} - 條目 {index + 1}\n")
+        for column, value in row.items():
+            if pd.notna(value) and str(value).strip():
+                clean_value = str(value).replace('\n', ' ').replace('\r', '')
+                content_parts.append(f"**{column}**: {clean_value}")
+        content_parts.append("---\n")
+    return '\n'.join(content_parts)
+
+
+def make_faq_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """產生與 FAQ 匯出檔相似的合成資料：分層類別（大量空白待 ffill）、多行問題與答案"""
+    rng = np.random.default_rng(seed)
+    layer1 = np.array(["益生菌", "蔓越莓", "膠原蛋白", "葉黃素"], dtype=object)
+    layer2 = np.array(["功能", "食用方式", "成分", "保存", "售後服務"], dtype=object)
+
+    def sparse(values):
+        column = pd.Series(values[rng.integers(0, len(values), rows)], dtype=object)
+        return column.where(rng.random(rows) < 0.2)  # 約八成空白，模擬合併儲存格
+
+    ids = np.arange(rows)
+    return pd.DataFrame({
+        "第1層": sparse(layer1),
+        "第2層": sparse(layer2),
+        "第3層": pd.Series([f"主題{i % 97}" for i in ids], dtype=object),
+        "原本的Q": pd.Series([f"問題{i}：這個產品可以怎麼吃?\n一天吃幾次?" for i in ids], dtype=object),
+        "答案層": pd.Series([f"●答案{i}: 每日一次〪\r\n●飯後食用效果更好" for i in ids], dtype=object),
+        "備註": pd.Series(np.where(rng.random(rows) < 0.1, " ", ""), dtype=object),
+        # 含空白的整數欄：整份讀入時推斷為浮點數（輸出 3.0），串流模式須與之相同
+        "數量": pd.Series([None if missing else i % 7 + 1 for i, missing in enumerate(rng.random(rows) < 0.1)],
+                        dtype=object),
+    })
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def peak_memory(func, *args, **kwargs):
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV 轉 Markdown 效能比較")
+    parser.add_argument("--rows", type=int, default=100000, help="合成 CSV 的列數")
+    parser.add_argument("--chunksize", type=int, default=10000, help="串流模式每批列數")
+    args = parser.parse_args()
+
+    df = make_faq_frame(args.rows).ffill().fillna('')
+
+    legacy, legacy_seconds = timed(legacy_generate_markdown_content, df, "bench")
+    vectorized, vectorized_seconds = timed(csv_to_md._generate_markdown_content, df, "bench")
+    assert legacy == vectorized, "向量化輸出與舊版不一致"
+
+    print(f"📊 {args.rows} 列，輸出 {len(vectorized.encode('utf-8')) / 1e6:.1f} MB")
+    print(f"  iterrows 舊版   : {legacy_seconds:8.3f} s")
+    print(f"  向量化          : {vectorized_seconds:8.3f} s  (x{legacy_seconds / vectorized_seconds:.1f})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "威德益生菌FAQ_bench.csv"
+        make_faq_frame(args.rows).to_csv(csv_path, index=False)
+
+        full_dir, stream_dir = Path(tmp) / "full", Path(tmp) / "stream"
+        # 傳入記憶體中的編碼快取，避免在專案中留下 sidecar 檔
+        _, full_seconds = timed(csv_to_md.convert_csv_to_md, str(csv_path), str(full_dir),
+                                encoding_cache={})
+        _, stream_seconds = timed(csv_to_md.convert_csv_to_md, str(csv_path), str(stream_dir),
+                                  chunksize=args.chunksize, encoding_cache={})
+        full_md = next(full_dir.rglob("*.md")).read_bytes()
+        stream_md = next(stream_dir.rglob("*.md")).read_bytes()
+        assert full_md == stream_md, "串流輸出與整份讀入不一致"
+
+        full_peak = peak_memory(csv_to_md.convert_csv_to_md, str(csv_path), str(full_dir),
+                                encoding_cache={})
+        stream_peak = peak_memory(csv_to_md.convert_csv_to_md, str(csv_path), str(stream_dir),
+                                  chunksize=args.chunksize, encoding_cache={})
+
+    print(f"  整份檔案轉換    : {full_seconds:8.3f} s  記憶體峰值 {full_peak / 1e6:7.1f} MB")
+    print(f"  串流轉換        : {stream_seconds:8.3f} s  記憶體峰值 {stream_peak / 1e6:7.1f} MB "
+          f"(chunksize={args.chunksize})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+建置流程各階段的效能測試：以合成語料（benchmarks/synthetic_corpus.py）在多個規模下分別量測
+PDF 文字擷取、CSV 轉 Markdown、依標題切割與索引產生的執行時間、吞吐量與記憶體峰值（RSS），
+結果寫成 JSON，可用 --compare 與其他 commit 的結果比較，及早發現規模放大時的效能退化。
+
+每個階段在獨立的子行程中執行，記憶體峰值不會受前一個階段影響。
+
+使用方式（於專案根目錄執行）：
+    python benchmarks/bench_pipeline.py --scales 1,10
+    python benchmarks/bench_pipeline.py --scales 1,10 --compare benchmarks/results/<舊結果>.json
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import multiprocessing
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "tools"))
+
+from synthetic_corpus import generate_corpus  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+# 與比較基準相比，耗時超過這個倍數即視為退化
+DEFAULT_REGRESSION_RATIO = 1.3
+# 每個階段重複執行的次數（取最短耗時，降低磁碟快取與排程造成的誤差）
+DEFAULT_REPEAT = 3
+
+# 量測順序即執行順序：後面的階段讀取前面階段的產出（CSV 轉出的 FAQ 與切割後的 chunks）
+STAGES = ["pdf_extract", "csv_to_md", "chunk_headings", "generate_index"]
+
+
+def _peak_rss_mb() -> float:
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # macOS 為 bytes，Linux 為 KB
+
+
+def _files_bytes(paths) -> int:
+    return sum(os.path.getsize(p) for p in paths)
+
+
+def _stage_pdf_extract(corpus):
+    from pdf_to_md import extract_text_from_pdf_pypdf2
+
+    pdfs = sorted(glob.glob("pdfs/*.pdf"))
+    started = time.perf_counter()
+    chars = sum(len(extract_text_from_pdf_pypdf2(p)) for p in pdfs)
+    return time.perf_counter() - started, {"items": len(pdfs), "unit": "pdf", "bytes": _files_bytes(pdfs),
+                                           "chars": chars}
+
+
+def _stage_csv_to_md(corpus):
+    from csv_to_md import convert_csv_to_md
+
+    csvs = sorted(glob.glob("csvs/*.csv"))
+    started = time.perf_counter()
+    converted = sum(convert_csv_to_md(p, "knowledge/", encoding_cache={}) for p in csvs)
+    elapsed = time.perf_counter() - started
+    if converted != len(csvs):
+        raise RuntimeError(f"CSV 轉換失敗：{len(csvs) - converted} 份")
+    return elapsed, {"items": corpus["csv_rows"], "unit": "row", "bytes": _files_bytes(csvs)}
+
+
+def _stage_chunk_headings(corpus):
+    from chunk_md import chunk_markdown_by_headings, write_chunks
+
+    sources = sorted(glob.glob("knowledge/**/*.md", recursive=True))
+    started = time.perf_counter()
+    chunks = 0
+    for path in sources:
+        relative_dir = os.path.dirname(os.path.relpath(path, "knowledge"))
+        pieces = chunk_markdown_by_headings(path)
+        write_chunks(pieces, os.path.join("knowledge_chunks", relative_dir),
+                     os.path.splitext(os.path.basename(path))[0])
+        chunks += len(pieces)
+    return time.perf_counter() - started, {"items": len(sources), "unit": "file", "bytes": _files_bytes(sources),
+                                           "chunks": chunks}
+
+
+def _stage_generate_index(corpus):
+    from generate_index import generate_index
+
+    chunk_files = sorted(glob.glob("knowledge_chunks/**/*.md", recursive=True))
+    started = time.perf_counter()
+    entries = generate_index(knowledge_dir="knowledge_chunks", output_file="index.json")
+    return time.perf_counter() - started, {"items": len(entries), "unit": "chunk",
+                                           "bytes": _files_bytes(chunk_files)}
+
+
+STAGE_FUNCTIONS = {
+    "pdf_extract": _stage_pdf_extract,
+    "csv_to_md": _stage_csv_to_md,
+    "chunk_headings": _stage_chunk_headings,
+    "generate_index": _stage_generate_index,
+}
+
+
+def _run_stage_child(stage, corpus_dir, corpus, results_queue):
+    """在子行程中執行單一階段；stdout 導向 /dev/null，避免各工具的進度訊息淹沒結果"""
+    os.chdir(corpus_dir)
+    sys.stdout = open(os.devnull, "w")
+    try:
+        seconds, stats = STAGE_FUNCTIONS[stage](corpus)
+        results_queue.put({"seconds": seconds, "peak_rss_mb": round(_peak_rss_mb(), 1), **stats})
+    except Exception as e:
+        results_queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def _measure_once(stage: str, corpus_dir: str, corpus: dict) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results_queue = context.Queue()
+    process = context.Process(target=_run_stage_child, args=(stage, corpus_dir, corpus, results_queue))
+    process.start()
+    result = results_queue.get()
+    process.join()
+    if "error" in result:
+        raise RuntimeError(f"{stage} 失敗：{result['error']}")
+    return result
+
+
+def measure_stage(stage: str, corpus_dir: str, corpus: dict, repeat: int = DEFAULT_REPEAT) -> dict:
+    """執行 repeat 次取最短耗時（各階段的輸出可重複覆寫），記憶體峰值取最大值"""
+    runs = [_measure_once(stage, corpus_dir, corpus) for _ in range(max(repeat, 1))]
+    result = min(runs, key=lambda r: r["seconds"])
+    result["peak_rss_mb"] = max(r["peak_rss_mb"] for r in runs)
+    result["seconds"] = round(result["seconds"], 4)
+    result["items_per_second"] = round(result["items"] / result["seconds"], 1) if result["seconds"] else None
+    result["mb_per_second"] = round(result["bytes"] / 1e6 / result["seconds"], 2) if result["seconds"] else None
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(scales, stages=STAGES, seed: int = 0, repeat: int = DEFAULT_REPEAT) -> dict:
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            corpus = generate_corpus(corpus_dir, scale, seed)
+            print(f"\n📦 規模 x{scale:g}：{len(corpus['pdfs'])} 份統計表、{corpus['csv_rows']} 列 FAQ")
+            for stage in stages:
+                result = measure_stage(stage, corpus_dir, corpus, repeat)
+                results.append({"stage": stage, "scale": scale, **result})
+                print(f"  {stage:<16} {result['seconds']:8.3f}s  {result['items_per_second']:>10} {result['unit']}/s"
+                      f"  {result['mb_per_second']:>7} MB/s  RSS {result['peak_rss_mb']:7.1f} MB")
+    return {
+        "commit": _git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def scaling_report(report: dict):
+    """同一階段在最大與最小規模之間，每單位的耗時增加多少倍（接近 1 表示線性擴展）"""
+    by_stage = {}
+    for result in report["results"]:
+        by_stage.setdefault(result["stage"], []).append(result)
+    print("\n📈 規模擴展（最大 / 最小規模的每單位耗時比）")
+    for stage, results in by_stage.items():
+        results.sort(key=lambda r: r["scale"])
+        small, large = results[0], results[-1]
+        if small is large or not small["items"] or not large["items"]:
+            continue
+        ratio = (large["seconds"] / large["items"]) / (small["seconds"] / small["items"])
+        print(f"  {stage:<16} x{small['scale']:g} → x{large['scale']:g}：{ratio:5.2f}"
+              + (" ⚠️ 非線性" if ratio > 2 else ""))
+
+
+def compare_reports(report: dict, baseline: dict, threshold: float = DEFAULT_REGRESSION_RATIO) -> list:
+    """與基準結果比較相同階段與規模的耗時，回傳超過 threshold 倍的項目"""
+    previous = {(r["stage"], r["scale"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n🔍 與 {baseline.get('commit', '?')} 比較（耗時比，> {threshold:g} 視為退化）")
+    for result in report["results"]:
+        old = previous.get((result["stage"], result["scale"]))
+        if not old or not old["seconds"]:
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        rss_ratio = result["peak_rss_mb"] / old["peak_rss_mb"] if old["peak_rss_mb"] else 1.0
+        flag = ratio > threshold
+        print(f"  {result['stage']:<16} x{result['scale']:<5g} 時間 {ratio:5.2f}  RSS {rss_ratio:5.2f}"
+              + ("  ❌ 退化" if flag else ""))
+        if flag:
+            regressions.append({"stage": result["stage"], "scale": result["scale"], "ratio": round(ratio, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以合成語料量測建置流程各階段的效能")
+    parser.add_argument("--scales", default="1,10", help="語料規模倍數，以逗號分隔")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"要量測的階段（可用：{', '.join(STAGES)}）")
+    parser.add_argument("--seed", type=int, default=0, help="合成語料的亂數種子")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每個階段重複執行次數，取最短耗時")
+    parser.add_argument("--output", help="結果 JSON 路徑（預設 benchmarks/results/pipeline-<commit>.json）")
+    parser.add_argument("--compare", help="比較基準的結果 JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_RATIO, help="視為退化的耗時倍數")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"未知的階段：{', '.join(sorted(unknown))}")
+    stages = [s for s in STAGES if s in stages]  # 維持相依順序
+    scales = [float(s) for s in args.scales.split(",") if s.strip()]
+
+    report = run_benchmarks(scales, stages, args.seed, args.repeat)
+    scaling_report(report)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{report['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 結果已寫入 {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_reports(report, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
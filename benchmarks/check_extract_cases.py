@@ -0,0 +1,124 @@
+"""
+處罰案件統計表解析檢查：以人工對照原始統計表確認過的案件（每份統計表數案）檢查
+extract_cases.parse_violation_cases 的項次、發文日期、處分商號、來源與罰鍰，
+並確認每個「受處分人」恰好解析為一案、產品名稱不會混入其他案件的描述。
+
+使用方式（於專案根目錄執行）：
+    python benchmarks/check_extract_cases.py
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+from extract_cases import SOURCE_MD_DIR, MAX_PRODUCT_NAME_CHARS, parse_violation_cases  # noqa: E402
+
+# (統計表檔名, 項次, 應有的欄位)；只列出在原始統計表中能明確對應到該案的欄位
+VERIFIED_CASES = [
+    ("公告114年1月份處理化粧品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-01-03", "company": "韓灣國際股份有限公司", "source": "電視"}),
+    ("公告114年1月份處理化粧品違規廣告處罰案件統計表.md", 5,
+     {"issued_date": "2025-01-21", "company": "實漪生醫股份有限公司", "source": "網站"}),
+    ("公告114年1月份處理藥品、醫療器材及一般商品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-01-08", "company": "專品醫療器材股份有限公司", "source": "網站", "fine": 320000}),
+    ("公告114年1月份處理藥品、醫療器材及一般商品違規廣告處罰案件統計表.md", 2,
+     {"issued_date": "2025-01-15", "company": "美康諾生醫股份有限公司", "source": "網站"}),
+    ("公告114年1月份處理食品、健康食品違規廣告處罰案件統計表.md", 12,
+     {"issued_date": "2025-01-21", "company": "凱蔚有限公司", "source": "網站"}),
+    ("公告114年2月份處理化粧品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-02-21", "company": "二三五九台灣有限公司", "source": "網站"}),
+    ("公告114年2月份處理化粧品違規廣告處罰案件統計表.md", 9,
+     {"issued_date": "2025-02-21", "company": "植沐股份有限公司", "source": "網站"}),
+    ("公告114年2月份處理藥品、醫療器材及一般商品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-02-27", "company": "台灣愛普兒有限公司", "source": "網站", "fine": 600000}),
+    ("公告114年2月份處理藥品、醫療器材及一般商品違規廣告處罰案件統計表.md", 2,
+     {"issued_date": "2025-02-07", "company": "智平衡健康事業股份有限公司", "source": "網站"}),
+    ("公告114年2月份處理食品、健康食品違規廣告處罰案件統計表.md", 2,
+     {"issued_date": "2025-02-24", "company": "七寶創意有限公司", "source": "網站"}),
+    ("公告114年3月份處理化粧品違規廣告處罰案件統計表.md", 12,
+     {"issued_date": "2025-03-28", "company": "愛比森國際股份有限公司", "source": "網站"}),
+    ("公告114年3月份處理藥品、醫療器材及一般商品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-03-14", "company": "輝葉企業有限公司", "source": "電視", "fine": 600000}),
+    ("公告114年3月份處理食品、健康食品違規廣告處罰案件統計表.md", 3,
+     {"issued_date": "2025-03-14", "company": "浩合企業有限公司", "source": "網站"}),
+    ("公告114年3月份處理食品、健康食品違規廣告處罰案件統計表.md", 17,
+     {"issued_date": "2025-03-28", "company": "歐森有限公司", "source": "網站"}),
+    ("公告114年4月份處理化粧品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-04-30", "company": "捷醫國際生物科技股份有限公司", "source": "網站"}),
+    ("公告114年4月份處理化粧品違規廣告處罰案件統計表.md", 4,
+     {"issued_date": "2025-04-22", "company": "達爾膚生醫科技股份有限公司", "source": "網站"}),
+    ("公告114年4月份處理藥品、醫療器材及一般商品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-04-16", "company": "氣機科技股份有限公司", "source": "網站", "fine": 600000}),
+    ("公告114年4月份處理藥品、醫療器材及一般商品違規廣告處罰案件統計表.md", 2,
+     {"issued_date": "2025-04-15", "company": "城欣科技股份有限公司", "source": "電視", "fine": 600000}),
+    ("公告114年4月份處理食品、健康食品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-04-16", "company": "雙江生技有限公司", "source": "網站"}),
+    # 沛怡國際的電視廣告（項次 17–19）欄位錯位，不可混入下一案
+    ("公告114年4月份處理食品、健康食品違規廣告處罰案件統計表.md", 19,
+     {"issued_date": "2025-04-10", "company": "沛怡國際有限公司", "source": "電視", "fine": 80000}),
+    ("公告114年4月份處理食品、健康食品違規廣告處罰案件統計表.md", 20,
+     {"issued_date": "2025-04-02", "company": "貝里斯商美麗樂生技股份有限公司臺灣分公司", "source": "網站"}),
+    ("公告114年4月份處理食品、健康食品違規廣告處罰案件統計表.md", 23,
+     {"issued_date": "2025-04-16", "company": "曜群生醫國際有限公司", "source": "網站"}),
+    ("公告114年5月份處理化粧品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-05-08", "company": "上星股份有限公司", "source": "電視"}),
+    ("公告114年5月份處理藥品、醫療器材及一般商品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-05-14", "company": "瑭琪健康事業有限公司", "source": "網站", "fine": 880000}),
+    ("公告114年5月份處理藥品、醫療器材及一般商品違規廣告處罰案件統計表.md", 2,
+     {"issued_date": "2025-05-14", "company": "科林國際助聽器股份有限公司", "source": "網站"}),
+    ("公告114年5月份處理食品、健康食品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-05-07", "company": "自然優原創有限公司", "source": "電視"}),
+    ("公告114年5月份處理食品、健康食品違規廣告處罰案件統計表.md", 17,
+     {"issued_date": "2025-05-19", "company": "美女子有限公司", "source": "網站"}),
+    ("臺北市政府衛生局 114年6月份處理藥品、醫療器材、一般商品違規廣告處罰案件統計表.md", 3,
+     {"issued_date": "2025-06-06", "company": "聯合牙材股份有限公司", "source": "網站"}),
+    ("臺北市政府衛生局 114年6月份處理食品、健康食品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-06-04", "company": "晶明生技有限公司", "source": "廣播"}),
+    ("臺北市政府衛生局 114年6月份處理食品、健康食品違規廣告處罰案件統計表.md", 12,
+     {"issued_date": "2025-06-27", "company": "米鴻有限公司", "source": "網站"}),
+    # 手動整理過的 Markdown（以「## 項次N 日期 產品」為標題），原表沒有罰鍰欄位
+    ("臺北市政府衛生局114年6月份處理化粧品違規廣告處罰案件統計表.md", 1,
+     {"issued_date": "2025-06-30", "company": "萬心行銷科技股份有限公司", "source": "網站",
+      "product_name": "萌髮科研洗髮精 /養髮液EX"}),
+    ("臺北市政府衛生局114年6月份處理化粧品違規廣告處罰案件統計表.md", 7,
+     {"issued_date": "2025-06-06", "company": "達爾膚生醫科技股份有限公司", "source": "網站"}),
+]
+
+
+def check_file(path: str) -> int:
+    """每個「受處分人」恰為一案，產品名稱不含其他案件的描述；回傳案件數"""
+    with open(path, "r", encoding="utf-8") as f:
+        expected = f.read().count("受處分人")
+    records = parse_violation_cases(path)
+    assert len(records) == expected, f"{os.path.basename(path)}：解析出 {len(records)} 案，應為 {expected} 案"
+    for record in records:
+        name = record["product_name"] or ""
+        assert "受處分人" not in name and len(name) <= MAX_PRODUCT_NAME_CHARS, \
+            f"{os.path.basename(path)} 項次 {record['item_no']}：產品名稱混入其他欄位：{name[:40]}"
+        assert (record["fine"] is None) == ("missing_fine" in (record["flags"] or "")), record
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以人工確認過的案件檢查統計表解析結果")
+    parser.add_argument("--source-dir", default=SOURCE_MD_DIR, help="統計表 Markdown 所在目錄")
+    args = parser.parse_args()
+
+    md_files = sorted(f for f in os.listdir(args.source_dir) if f.endswith(".md"))
+    total = sum(check_file(os.path.join(args.source_dir, f)) for f in md_files)
+    print(f"✅ {len(md_files)} 份統計表共 {total} 案，每個「受處分人」各解析為一案")
+
+    parsed = {}
+    for filename, item_no, fields in VERIFIED_CASES:
+        if filename not in parsed:
+            parsed[filename] = parse_violation_cases(os.path.join(args.source_dir, filename))
+        matches = [r for r in parsed[filename] if r["item_no"] == item_no]
+        assert len(matches) == 1, f"{filename} 項次 {item_no}：找到 {len(matches)} 案"
+        for key, value in fields.items():
+            assert matches[0][key] == value, f"{filename} 項次 {item_no}：{key} 為 {matches[0][key]!r}，應為 {value!r}"
+    print(f"✅ {len(VERIFIED_CASES)} 個人工確認的案件欄位皆正確")
+
+
+if __name__ == "__main__":
+    main()
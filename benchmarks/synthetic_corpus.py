@@ -0,0 +1,221 @@
+"""
+合成語料產生器：依比例產生與實際資料形狀相同的測試語料，供效能測試使用。
+    pdfs/           處罰案件統計表 PDF（每頁固定列數的案件，文字可由 PyPDF2 擷取）
+    knowledge/law/  同樣內容的統計表 Markdown（與 PDF 轉出的 knowledge/law/ 相同形狀）
+    csvs/           FAQ 匯出檔 CSV（分層類別大量留白、多行問答），含 UTF-8 BOM 與 Big5 版本
+
+使用方式（於專案根目錄執行）：
+    python benchmarks/synthetic_corpus.py /tmp/corpus --scale 10
+"""
+import os
+import random
+import argparse
+from typing import List
+
+# scale = 1 時的語料規模，其他規模依比例放大
+BASE_TABLES = 6
+BASE_CASES_PER_TABLE = 40
+BASE_CSVS = 2
+BASE_CSV_ROWS = 400
+CASES_PER_PAGE = 4
+
+DOMAINS = [
+    ("化粧品", "化粧品衛生安全管理法", "第10條第1項"),
+    ("食品、健康食品", "食品安全衛生管理法", "第28條第1項"),
+    ("藥品、醫療器材及一般商品", "醫療器材管理法", "第46條第1項"),
+]
+SOURCES = ["網站", "電視", "廣播", "報紙", "雜誌"]
+COMPANY_WORDS = ["康", "美", "健", "生", "和", "泰", "欣", "晶", "源", "華", "恆", "豐", "益", "寶", "聯", "興"]
+COMPANY_SUFFIXES = ["股份有限公司", "有限公司", "企業社", "商行"]
+PRODUCT_WORDS = ["膠原", "玻尿酸", "益生菌", "葉黃素", "精華", "乳霜", "膠囊", "面膜", "酵素", "錠"]
+CLAIMS = ["改善體質", "淡化斑點", "增強免疫力", "消除疲勞", "幫助入睡", "抗皺緊緻", "降低血糖", "快速瘦身"]
+CITIES = ["臺北市", "新北市", "桃園市", "臺中市", "臺南市", "高雄市"]
+
+FAQ_LAYER1 = ["益生菌", "蔓越莓", "膠原蛋白", "葉黃素"]
+FAQ_LAYER2 = ["功能", "食用方式", "成分", "保存", "售後服務"]
+FAQ_PRODUCTS = ["威德益生菌", "蔓越莓益生菌"]
+
+
+def _company(rng: random.Random) -> str:
+    return "".join(rng.choice(COMPANY_WORDS) for _ in range(rng.randint(2, 4))) + rng.choice(COMPANY_SUFFIXES)
+
+
+def _product(rng: random.Random) -> str:
+    return "".join(rng.sample(PRODUCT_WORDS, 2)) + f"{rng.randint(1, 99)}入"
+
+
+def violation_case_lines(rng: random.Random, item_no: int, year: int, month: int, domain: tuple) -> List[str]:
+    """一案的文字列，欄位順序與 PDF 轉出的統計表相同（項次、發文日期、產品名稱、來源、違規情節、商號、罰鍰、罰則、排名）"""
+    _, law, article = domain
+    company = _company(rng)
+    product = _product(rng)
+    fine = rng.choice([60, 80, 100, 150, 200, 400, 1000]) * 1000
+    claims = "、".join(rng.sample(CLAIMS, 3))
+    return [
+        f"{item_no} {year}/{month:02d}/{rng.randint(1, 28):02d}{product}{rng.choice(SOURCES)}受處分人{company}於",
+        f"{year}年{max(month - 2, 1)}月{rng.randint(1, 28)}日在網路刊播「{product}」廣告，內容述及略以:「{claims}",
+        f"…」等詞句，涉及誇大，違反{law}{article}規定，案經{rng.choice(CITIES)}政府衛生局查獲。{company}",
+        f"{fine:,}{law}{article}{item_no}",
+    ]
+
+
+def violation_table(rng: random.Random, cases: int, year: int, month: int, domain: tuple) -> dict:
+    """回傳 {"title", "pages": [每頁的文字列]}"""
+    title = f"臺北市政府衛生局 {year}年{month}月份處理{domain[0]}違規廣告處罰案件統計表"
+    header = ["項次裁處書", "發文日期產品名稱 來源 違規情節處分商號", "名稱罰鍰金額", "(元)罰則註記 排名"]
+    pages = []
+    for start in range(0, cases, CASES_PER_PAGE):
+        lines = [title] + header
+        for item_no in range(start + 1, min(start + CASES_PER_PAGE, cases) + 1):
+            lines += violation_case_lines(rng, item_no, year, month, domain)
+        pages.append(lines)
+    return {"title": title, "pages": pages}
+
+
+def _pdf_text_object(text: str) -> str:
+    # 以 UTF-16BE 碼位直接當作字碼（Identity-H），ToUnicode 對照表再對應回原字元
+    return "<" + text.encode("utf-16-be").hex().upper() + "> Tj T*"
+
+
+def _to_unicode_cmap(codes) -> bytes:
+    # 與實際的子集字型相同，只列出用到的字碼（完整的 0000–FFFF 對照表會讓 PyPDF2 每頁展開六萬多筆）
+    entries = [f"<{code:04X}> <{code:04X}>" for code in sorted(codes)]
+    blocks = []
+    for i in range(0, len(entries), 100):
+        part = entries[i:i + 100]
+        blocks.append(f"{len(part)} beginbfchar\n" + "\n".join(part) + "\nendbfchar")
+    return ("/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+            "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+            "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+            + "\n".join(blocks) + "\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend\n").encode("ascii")
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """
+    以最少的物件寫出可擷取中文文字的 PDF：Type0 字型（Identity-H）加上 ToUnicode 對照表，
+    不內嵌字型（只供文字擷取的效能測試，不需要正確顯示）。
+    """
+    objects: List[bytes] = []
+
+    def add(data: bytes) -> int:
+        objects.append(data)
+        return len(objects)
+
+    def stream(data: bytes) -> bytes:
+        return b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"
+
+    codes = {ord(char) for lines in pages for line in lines for char in line}
+    to_unicode = add(stream(_to_unicode_cmap(codes)))
+    descendant = add(b"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /MingLiU "
+                     b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> >>")
+    font = add(b"<< /Type /Font /Subtype /Type0 /BaseFont /MingLiU /Encoding /Identity-H "
+               b"/DescendantFonts [%d 0 R] /ToUnicode %d 0 R >>" % (descendant, to_unicode))
+    pages_id = len(objects) + 2 * len(pages) + 1  # 頁面樹放在所有頁面之後
+    page_ids = []
+    for lines in pages:
+        content = "BT /F1 9 Tf 11 TL 30 810 Td\n" + "\n".join(_pdf_text_object(line) for line in lines) + "\nET"
+        content_id = add(stream(content.encode("ascii")))
+        page_ids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+                            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                            % (pages_id, font, content_id)))
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % p for p in page_ids), len(page_ids)))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, data in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + data + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def faq_rows(rng: random.Random, rows: int, product: str) -> List[List[str]]:
+    """FAQ 匯出檔的列：前三列為分組標題，之後第1、2層類別約八成留白（合併儲存格），問答為多行文字"""
+    header = [
+        ["", "產品", "諮詢類別", "", "", "", "", ""],
+        ["", "", "", "", "", "", "", ""],
+        ["", "第1層", "第2層", "第3層", "第4層", "原本的Q(接下來全部要藏在換句話說)", "答案層(修改)", ""],
+    ]
+    body = []
+    for i in range(rows):
+        body.append([
+            "",
+            rng.choice(FAQ_LAYER1) if rng.random() < 0.2 else "",
+            rng.choice(FAQ_LAYER2) if rng.random() < 0.2 else "",
+            f"主題{i % 97}",
+            "",
+            f"{product}的問題{i}:這個產品可以怎麼吃?\n一天吃幾次?",
+            f"●答案{i}: 建議每日一次\n●飯後食用{rng.choice(CLAIMS)}",
+            "",
+        ])
+    return header + body
+
+
+def write_csv(path: str, rows: List[List[str]], encoding: str):
+    import csv
+
+    with open(path, "w", encoding=encoding, newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+def generate_corpus(output_dir: str, scale: float = 1.0, seed: int = 0) -> dict:
+    """
+    產生一份合成語料並回傳各類檔案的路徑。
+    scale 放大統計表份數與 FAQ 列數；CSV 一半存成 UTF-8 BOM、一半存成 Big5。
+
+    Returns:
+        dict: {"pdfs": [...], "markdown": [...], "csvs": [...], "cases": 案件數, "csv_rows": 列數}
+    """
+    rng = random.Random(seed)
+    dirs = {name: os.path.join(output_dir, name) for name in ("pdfs", "knowledge/law", "csvs")}
+    for path in dirs.values():
+        os.makedirs(path, exist_ok=True)
+
+    tables = max(1, round(BASE_TABLES * scale))
+    result = {"pdfs": [], "markdown": [], "csvs": [], "cases": 0, "csv_rows": 0}
+    for t in range(tables):
+        year, month = 110 + t // 12 % 20, t % 12 + 1
+        domain = DOMAINS[t % len(DOMAINS)]
+        table = violation_table(rng, BASE_CASES_PER_TABLE, year, month, domain)
+        name = f"合成{t:04d}_{year}年{month}月份處理違規廣告處罰案件統計表"
+
+        pdf_path = os.path.join(dirs["pdfs"], name + ".pdf")
+        write_pdf(pdf_path, table["pages"])
+        md_path = os.path.join(dirs["knowledge/law"], name + ".md")
+        with open(md_path, "w", encoding="utf-8") as f:
+            f.write("\n".join("\n".join(lines) for lines in table["pages"]) + "\n")
+        result["pdfs"].append(pdf_path)
+        result["markdown"].append(md_path)
+        result["cases"] += BASE_CASES_PER_TABLE
+
+    rows = max(1, round(BASE_CSV_ROWS * scale))
+    for c in range(BASE_CSVS):
+        product = FAQ_PRODUCTS[c % len(FAQ_PRODUCTS)]
+        encoding = "utf-8-sig" if c % 2 == 0 else "big5"
+        csv_path = os.path.join(dirs["csvs"], f"{product}FAQ_合成{c:02d}_{encoding}.csv")
+        write_csv(csv_path, faq_rows(rng, rows, product), encoding)
+        result["csvs"].append(csv_path)
+        result["csv_rows"] += rows
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="產生合成的統計表 PDF/Markdown 與 FAQ CSV 語料")
+    parser.add_argument("output_dir", help="輸出資料夾")
+    parser.add_argument("--scale", type=float, default=1.0, help="語料規模倍數")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.output_dir, args.scale, args.seed)
+    print(f"✅ 已產生合成語料：{len(corpus['pdfs'])} 份統計表（{corpus['cases']} 案）、"
+          f"{len(corpus['csvs'])} 份 CSV（{corpus['csv_rows']} 列）→ {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
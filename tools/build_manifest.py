@@ -0,0 +1,225 @@
+import os
+import json
+import hashlib
+from typing import Iterable, Optional
+
+# 專案根目錄（假設此腳本位於 tools/build_manifest.py）
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 建置清單檔案，需隨其他產出一起 commit，CI 才能跨次執行沿用；只存內容雜湊，與 checkout 的時間無關
+MANIFEST_FILE = os.path.join(ROOT_DIR, "build_manifest.json")
+# 清單格式版本，格式不相容時遞增，舊清單會被整份捨棄
+MANIFEST_VERSION = 2
+# 版本 1 的清單把 stat 快取一起存在清單中，載入時拆出來沿用
+_COMPATIBLE_VERSIONS = (1, MANIFEST_VERSION)
+# 雜湊的 stat 快取（大小、mtime）只對本機檔案有意義，存在清單旁不 commit 的檔案（已列入 .gitignore）
+STAT_CACHE_SUFFIX = ".stat.json"
+
+_HASH_BLOCK_SIZE = 1 << 20
+
+
+def hash_file(path: str) -> str:
+    """以固定大小區塊串流計算檔案的 SHA-256，避免大檔一次讀入記憶體"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """
+    內容與既有檔案相同時不重寫（保留 mtime，清單中的雜湊快取仍然有效）；
+    否則先寫暫存檔再取代，讀取端不會讀到寫到一半的檔案。回傳是否有寫入
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+class BuildManifest:
+    """
+    持久化的建置清單，記錄每個來源檔、衍生 Markdown 與 chunk 的內容雜湊，
+    以及產生它們的工具版本，讓各階段只重做真正有變動的部分。
+
+    清單結構（commit）：
+        stages: {階段名稱: {來源相對路徑: {"sha256", "tool_version", "outputs", "data"}}}
+    stat 快取（清單旁的 *.stat.json，不 commit）：
+        files:  {相對路徑: {"sha256", "size", "mtime_ns"}}
+
+    檔案大小與 mtime 都沒變時直接沿用快取的雜湊，不重新讀檔，
+    因此沒有任何變動的重建只需要對每個檔案做一次 stat。
+    新的 checkout（如 CI）沒有 stat 快取，每個檔案重新計算一次雜湊，仍與清單比對內容決定是否重做；
+    mtime 不寫進清單，清單只在內容真的變動時才改變。
+    """
+
+    def __init__(self, manifest_path: str = MANIFEST_FILE, root_dir: str = ROOT_DIR):
+        self.manifest_path = manifest_path
+        self.stat_cache_path = os.path.splitext(manifest_path)[0] + STAT_CACHE_SUFFIX
+        self.root_dir = root_dir
+        self._dirty = False
+        self._files_dirty = False
+        self._files = {}
+        self._stages = {}
+        self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.save()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 建置清單無法讀取，將全部重建：{self.manifest_path}，錯誤：{e}")
+            self._dirty = True
+            return
+
+        if data.get("version") not in _COMPATIBLE_VERSIONS:
+            print(f"⚠️ 建置清單版本不符，將全部重建：{self.manifest_path}")
+            self._dirty = True
+            return
+
+        self._stages = data.get("stages", {})
+        if data["version"] != MANIFEST_VERSION:
+            # 舊版清單內含 stat 快取：沿用為本機快取，並改寫為不含 mtime 的新格式
+            self._files = data.get("files", {})
+            self._dirty = self._files_dirty = True
+            return
+        self._load_stat_cache()
+
+    def _load_stat_cache(self):
+        try:
+            with open(self.stat_cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return  # 快取遺失或損壞時只是重新計算雜湊
+        if data.get("version") == MANIFEST_VERSION:
+            self._files = data.get("files", {})
+
+    def key(self, path: str) -> str:
+        """將路徑轉為相對於專案根目錄的 POSIX 路徑，作為清單中的鍵值"""
+        return os.path.relpath(os.path.abspath(path), self.root_dir).replace("\\", "/")
+
+    def file_hash(self, path: str) -> Optional[str]:
+        """
+        取得檔案內容雜湊，檔案不存在時回傳 None。
+        大小與 mtime 皆與快取相同時不重新計算。
+        """
+        key = self.key(path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if self._files.pop(key, None) is not None:
+                self._files_dirty = True
+            return None
+
+        cached = self._files.get(key)
+        if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+            return cached["sha256"]
+
+        sha256 = hash_file(path)
+        self._files[key] = {"sha256": sha256, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        self._files_dirty = True
+        return sha256
+
+    def is_up_to_date(self, stage: str, source: str, tool_version: str) -> bool:
+        """
+        判斷某階段對某來源的產出是否仍然有效：
+        來源內容、工具版本與所有產出檔的內容都必須與上次記錄一致。
+        """
+        entry = self._stages.get(stage, {}).get(self.key(source))
+        if not entry or entry["tool_version"] != tool_version:
+            return False
+        if entry["sha256"] != self.file_hash(source):
+            return False
+        for output_key, output_hash in entry["outputs"].items():
+            if self.file_hash(os.path.join(self.root_dir, output_key)) != output_hash:
+                return False
+        return True
+
+    def record(self, stage: str, source: str, tool_version: str,
+               outputs: Iterable[str] = (), data: Optional[dict] = None):
+        """記錄某階段處理完某來源後的狀態（需在產出檔寫入完成後呼叫）"""
+        output_hashes = {}
+        for output in outputs:
+            output_hash = self.file_hash(output)
+            if output_hash is not None:
+                output_hashes[self.key(output)] = output_hash
+
+        entry = {
+            "sha256": self.file_hash(source),
+            "tool_version": tool_version,
+            "outputs": output_hashes,
+        }
+        if data is not None:
+            entry["data"] = data
+        self._stages.setdefault(stage, {})[self.key(source)] = entry
+        self._dirty = True
+
+    def outputs(self, stage: str, source: str) -> list:
+        """回傳某來源上次記錄的產出檔路徑（相對於專案根目錄）"""
+        entry = self._stages.get(stage, {}).get(self.key(source))
+        return list(entry["outputs"]) if entry else []
+
+    def data(self, stage: str, source: str) -> Optional[dict]:
+        """回傳某來源上次記錄時附帶的資料"""
+        entry = self._stages.get(stage, {}).get(self.key(source))
+        return entry.get("data") if entry else None
+
+    def recorded_hash(self, stage: str, source: str) -> Optional[str]:
+        """回傳某階段上次處理某來源時記錄的來源內容雜湊（不重新計算檔案雜湊）"""
+        entry = self._stages.get(stage, {}).get(self.key(source))
+        return entry["sha256"] if entry else None
+
+    def sources(self, stage: str) -> list:
+        """回傳某階段目前記錄的所有來源（相對於專案根目錄）"""
+        return list(self._stages.get(stage, {}))
+
+    def forget(self, stage: str, source: str):
+        """移除某來源在某階段的記錄"""
+        if self._stages.get(stage, {}).pop(self.key(source), None) is not None:
+            self._dirty = True
+
+    def prune(self, stage: str, existing_sources: Iterable[str], within: Optional[Iterable[str]] = None) -> list:
+        """
+        移除來源已不存在的記錄，回傳被移除的來源鍵值。
+        within 指定資料夾時只清理這些資料夾下的記錄（只處理部分來源時，其他來源的記錄不受影響）。
+        只清理清單本身，不刪除任何產出檔。
+        """
+        keep = {self.key(s) for s in existing_sources}
+        prefixes = None if within is None else tuple(self.key(d).rstrip("/") + "/" for d in within)
+        stage_entries = self._stages.get(stage, {})
+        removed = [k for k in stage_entries if k not in keep and (prefixes is None or k.startswith(prefixes))]
+        for k in removed:
+            del stage_entries[k]
+        if removed:
+            self._dirty = True
+        return removed
+
+    def save(self):
+        """有變動時才寫回清單與 stat 快取（write_if_changed：先寫暫存檔再取代，內容相同時不重寫）"""
+        if self._dirty:
+            data = {"version": MANIFEST_VERSION, "stages": self._stages}
+            write_if_changed(self.manifest_path, _dump(data, indent=1))
+            self._dirty = False
+        if self._files_dirty:
+            # 本機快取不需要可讀性，省略縮排
+            write_if_changed(self.stat_cache_path, _dump({"version": MANIFEST_VERSION, "files": self._files}))
+            self._files_dirty = False
+
+
+def _dump(data: dict, indent: Optional[int] = None) -> bytes:
+    return json.dumps(data, ensure_ascii=False, indent=indent, sort_keys=True).encode("utf-8")
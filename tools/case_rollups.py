@@ -0,0 +1,230 @@
+import os
+import json
+import sqlite3
+import hashlib
+import argparse
+from typing import Dict, List, Optional
+
+from build_manifest import BuildManifest, write_if_changed
+from extract_cases import CASES_DB_FILE, LAW_ALIASES, SOURCE_MD_DIR
+from extract_cases import MANIFEST_STAGE as CASES_STAGE, TOOL_VERSION as CASES_TOOL_VERSION
+
+# 預先彙總的案件統計（與 index.json 一起產生），以及各統計表的部分彙總快取
+INDEX_DATA_DIR = "knowledge_index"
+ROLLUPS_FILE = os.path.join(INDEX_DATA_DIR, "case_rollups.json")
+ROLLUP_PARTS_FILE = os.path.join(INDEX_DATA_DIR, "case_rollups.parts.json")
+ROLLUPS_FORMAT_VERSION = 1
+# 部分彙總快取的格式版本（快取鍵改變時遞增，舊快取全部重算）
+ROLLUP_PARTS_VERSION = 2
+
+# 排行榜列出的名次數
+TOP_N = 10
+
+# 彙總維度：名稱 → 由案件組出鍵值的欄位（多個欄位以 | 串接，任一欄位缺值的案件不列入該維度）
+#   month / quarter 依統計表的公告年月（民國 114年1月 → 2025-01、2025-Q1）
+DIMENSIONS = {
+    "month": ("period",),
+    "quarter": ("quarter",),
+    "domain": ("domain",),
+    "law": ("law_article",),
+    "law_name": ("law_name",),
+    "company": ("company",),
+    "source": ("source",),
+    "city": ("city",),
+    "month_domain": ("period", "domain"),
+    "quarter_domain": ("quarter", "domain"),
+    "quarter_law": ("quarter", "law_article"),
+}
+
+_CASE_COLUMNS = ["year", "month", "domain", "company", "fine", "law_name", "law_article", "source", "city"]
+
+
+def _empty_stats() -> dict:
+    return {"cases": 0, "fined": 0, "fine_total": 0, "fine_max": 0}
+
+
+def _add_case(stats: dict, fine: Optional[int]):
+    stats["cases"] += 1
+    if fine is not None:
+        stats["fined"] += 1
+        stats["fine_total"] += fine
+        stats["fine_max"] = max(stats["fine_max"], fine)
+
+
+def _merge_stats(target: dict, stats: dict):
+    target["cases"] += stats["cases"]
+    target["fined"] += stats["fined"]
+    target["fine_total"] += stats["fine_total"]
+    target["fine_max"] = max(target["fine_max"], stats["fine_max"])
+
+
+def rollup_cases(cases: List[dict]) -> dict:
+    """將一批案件彙總為 {"total": 統計, "dimensions": {維度: {鍵: 統計}}}"""
+    total = _empty_stats()
+    dimensions: Dict[str, Dict[str, dict]] = {name: {} for name in DIMENSIONS}
+    for case in cases:
+        fields = dict(case)
+        if case["year"] and case["month"]:
+            fields["period"] = f"{case['year']}-{case['month']:02d}"
+            fields["quarter"] = f"{case['year']}-Q{(case['month'] - 1) // 3 + 1}"
+        _add_case(total, case["fine"])
+        for name, columns in DIMENSIONS.items():
+            values = [fields.get(column) for column in columns]
+            if all(values):
+                _add_case(dimensions[name].setdefault("|".join(values), _empty_stats()), case["fine"])
+    return {"total": total, "dimensions": dimensions}
+
+
+def merge_rollups(parts: List[dict]) -> dict:
+    """合併多份部分彙總（各統計表一份），結果與直接彙總所有案件相同"""
+    total = _empty_stats()
+    dimensions: Dict[str, Dict[str, dict]] = {name: {} for name in DIMENSIONS}
+    for part in parts:
+        _merge_stats(total, part["total"])
+        for name, groups in part["dimensions"].items():
+            if name not in dimensions:
+                continue
+            for key, stats in groups.items():
+                _merge_stats(dimensions[name].setdefault(key, _empty_stats()), stats)
+    return {"total": total, "dimensions": {name: dict(sorted(groups.items())) for name, groups in dimensions.items()}}
+
+
+def _rankings(dimensions: dict) -> dict:
+    """處分次數與罰鍰總額最高的商號、法條排行"""
+    rankings = {}
+    for name in ("company", "law"):
+        groups = dimensions[name]
+        rankings[f"{name}_by_cases"] = [key for key, _ in sorted(
+            groups.items(), key=lambda item: (-item[1]["cases"], item[0]))[:TOP_N]]
+        rankings[f"{name}_by_fine"] = [key for key, _ in sorted(
+            groups.items(), key=lambda item: (-item[1]["fine_total"], item[0]))[:TOP_N]]
+    return rankings
+
+
+def _load_parts(parts_file: str) -> dict:
+    try:
+        with open(parts_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == ROLLUP_PARTS_VERSION:
+            return data["parts"]
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def _source_cases(conn: sqlite3.Connection, source_file: str) -> List[dict]:
+    rows = conn.execute(f"SELECT {', '.join(_CASE_COLUMNS)} FROM cases WHERE source_file = ? ORDER BY id",
+                        (source_file,))
+    return [{c: row[c] for c in _CASE_COLUMNS} for row in rows]
+
+
+def build_case_rollups(db_path: str = CASES_DB_FILE, output_file: str = ROLLUPS_FILE,
+                       parts_file: str = ROLLUP_PARTS_FILE, manifest: Optional[BuildManifest] = None,
+                       source_dir: str = SOURCE_MD_DIR) -> dict:
+    """
+    由案件資料庫產生彙總統計 case_rollups.json。
+    每份統計表的部分彙總快取在 parts 檔，新增一個月份的統計表時只需彙總該份的案件，
+    再與其他月份的部分彙總合併；內容未變動時不重寫輸出檔。
+
+    快取鍵為建置清單中 cases 階段記錄的統計表雜湊（加上解析工具版本），未變動的統計表
+    完全不讀取其案件；清單中沒有記錄的統計表（例如未提供 manifest）才讀出案件、以內容雜湊為鍵。
+
+    Returns:
+        dict: {"sources", "recomputed", "cases", "written"}
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"找不到案件資料庫：{db_path}")
+    cached_parts = _load_parts(parts_file)
+    parts = {}
+    recomputed = 0
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        # 只走訪 source_file 索引，不掃描整個資料表
+        source_files = [row[0] for row in conn.execute("SELECT DISTINCT source_file FROM cases ORDER BY source_file")]
+        for source_file in source_files:
+            recorded = (manifest.recorded_hash(CASES_STAGE, os.path.join(source_dir, source_file))
+                        if manifest is not None else None)
+            cases = None
+            if recorded is not None:
+                digest = f"{CASES_TOOL_VERSION}:{recorded}"
+            else:
+                cases = _source_cases(conn, source_file)
+                digest = hashlib.sha256(json.dumps(cases, ensure_ascii=False).encode("utf-8")).hexdigest()
+            cached = cached_parts.get(source_file)
+            if cached and cached["digest"] == digest:
+                parts[source_file] = cached
+                continue
+            if cases is None:
+                cases = _source_cases(conn, source_file)
+            parts[source_file] = {"digest": digest, **rollup_cases(cases)}
+            recomputed += 1
+    finally:
+        conn.close()
+
+    merged = merge_rollups(list(parts.values()))
+    rollups = {
+        "version": ROLLUPS_FORMAT_VERSION,
+        "sources": sorted(parts),
+        "total": merged["total"],
+        "rankings": _rankings(merged["dimensions"]),
+        "dimensions": merged["dimensions"],
+    }
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    written = write_if_changed(output_file,
+                               json.dumps(rollups, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    write_if_changed(parts_file, json.dumps({"version": ROLLUP_PARTS_VERSION, "parts": parts},
+                                            ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    print(f"✅ 案件彙總統計：{len(parts)} 份統計表（重新彙總 {recomputed} 份）、"
+          f"{merged['total']['cases']} 案{'，已更新' if written else '，未變動'}：{output_file}")
+    return {"sources": len(parts), "recomputed": recomputed, "cases": merged["total"]["cases"], "written": written}
+
+
+def load_rollups(path: str = ROLLUPS_FILE) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def lookup(rollups: dict, dimension: str, *keys: str) -> dict:
+    """
+    查詢某個維度的統計，多個鍵時合併，例如：
+        lookup(rollups, "quarter_domain", "2025-Q1|化粧品")
+        lookup(rollups, "month", "2025-01", "2025-02", "2025-03")
+    法規維度可用 LAW_ALIASES 中的簡稱。
+    """
+    if dimension not in rollups["dimensions"]:
+        raise ValueError(f"未知的彙總維度：{dimension}")
+    groups = rollups["dimensions"][dimension]
+    stats = _empty_stats()
+    for key in keys:
+        key = LAW_ALIASES.get(key, key) if dimension == "law_name" else key
+        if key in groups:
+            _merge_stats(stats, groups[key])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="由案件資料庫產生或查詢彙總統計")
+    parser.add_argument("--db", default=CASES_DB_FILE, help="案件資料庫")
+    parser.add_argument("--show", metavar="維度", help=f"列出某個維度的統計（可用：{', '.join(DIMENSIONS)}）")
+    parser.add_argument("keys", nargs="*", help="搭配 --show 只查詢這些鍵並合併，例如 2025-Q1|化粧品")
+    args = parser.parse_args()
+
+    if not args.show:
+        with BuildManifest() as manifest:
+            build_case_rollups(args.db, manifest=manifest)
+        return
+
+    rollups = load_rollups()
+    if args.keys:
+        stats = lookup(rollups, args.show, *args.keys)
+        print(f"{' + '.join(args.keys)}：{stats['cases']} 案，罰鍰 {stats['fine_total']:,} 元（最高 {stats['fine_max']:,} 元）")
+        return
+    for key, stats in rollups["dimensions"][args.show].items():
+        print(f"{stats['cases']:5d} 案  {stats['fine_total']:>13,} 元  {key}")
+
+
+if __name__ == "__main__":
+    main()
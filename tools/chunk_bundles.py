@@ -0,0 +1,241 @@
+import os
+import re
+import json
+import mmap
+import hashlib
+import argparse
+import http.client
+import urllib.parse
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from build_manifest import write_if_changed
+
+# 打包後的 chunk bundle 與位移表輸出位置
+INDEX_DATA_DIR = "knowledge_index"
+BUNDLES_DIR = os.path.join(INDEX_DATA_DIR, "bundles")
+BUNDLES_TABLE_FILE = os.path.join(BUNDLES_DIR, "bundles.json")
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_EXTENSION = ".bundle"
+
+# 打包方式：category 每個分類一個 bundle，source 每份來源文件一個 bundle
+BUNDLE_GROUPINGS = ("category", "source")
+DEFAULT_BUNDLE_GROUPING = "category"
+
+# 以 HTTP Range 讀取時，同一個 bundle 中間隔小於此位元組數的 chunk 合併為一次請求
+RANGE_COALESCE_GAP = 16 * 1024
+
+_CHUNK_SUFFIX_RE = re.compile(r"_chunk_\d+\.md$")
+
+
+def _group_key(entry: dict, grouping: str) -> str:
+    if grouping == "category":
+        return entry["category"]
+    source = _CHUNK_SUFFIX_RE.sub("", os.path.basename(entry["file"]))
+    return f"{entry['category']}__{source}"
+
+
+def pack_chunk_bundles(index_list: List[dict], bundles_dir: str = BUNDLES_DIR,
+                       grouping: str = DEFAULT_BUNDLE_GROUPING, url_base: str = "") -> dict:
+    """
+    將 chunk 依分類或來源文件串接成少數幾個 bundle 檔，並寫出位移表 bundles.json：
+        bundles: {bundle 名稱: {"file", "url", "bytes", "sha256"}}
+        chunks:  {chunk 路徑: [bundle 名稱, 位移, 長度]}（位移與長度皆以位元組計）
+    chunk 之間不加分隔字元，依 index.json 的順序存放，同一份文件的 chunk 因此彼此相鄰。
+    內容未變動的 bundle 不重寫，已不存在的舊 bundle 會被刪除。
+
+    Returns:
+        dict: 位移表內容（與 bundles.json 相同）
+    """
+    if grouping not in BUNDLE_GROUPINGS:
+        raise ValueError(f"未知的打包方式：{grouping}")
+    os.makedirs(bundles_dir, exist_ok=True)
+
+    groups: Dict[str, List[dict]] = {}
+    for entry in index_list:
+        groups.setdefault(_group_key(entry, grouping), []).append(entry)
+
+    bundles = {}
+    chunks = {}
+    for name in sorted(groups):
+        parts = []
+        offset = 0
+        for entry in groups[name]:
+            with open(entry["file"], "rb") as f:
+                data = f.read()
+            chunks[entry["file"]] = [name, offset, len(data)]
+            parts.append(data)
+            offset += len(data)
+        payload = b"".join(parts)
+        bundle_path = os.path.join(bundles_dir, name + BUNDLE_EXTENSION).replace("\\", "/")
+        write_if_changed(bundle_path, payload)
+        bundles[name] = {
+            "file": bundle_path,
+            "url": f"{url_base}/{urllib.parse.quote(bundle_path)}" if url_base else "",
+            "bytes": len(payload),
+            "sha256": hashlib.sha256(payload).hexdigest(),
+        }
+
+    table = {"version": BUNDLE_FORMAT_VERSION, "grouping": grouping, "bundles": bundles, "chunks": chunks}
+    table_path = os.path.join(bundles_dir, os.path.basename(BUNDLES_TABLE_FILE))
+    write_if_changed(table_path, json.dumps(table, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    current = {os.path.basename(b["file"]) for b in bundles.values()}
+    for filename in os.listdir(bundles_dir):
+        if filename.endswith(BUNDLE_EXTENSION) and filename not in current:
+            os.remove(os.path.join(bundles_dir, filename))
+    return table
+
+
+def annotate_entries(index_list: List[dict], table: dict) -> List[dict]:
+    """回傳加上 bundle 位移資訊的條目副本（{"bundle": {"file", "offset", "length"}}），不修改原條目"""
+    annotated = []
+    for entry in index_list:
+        name, offset, length = table["chunks"][entry["file"]]
+        annotated.append(dict(entry, bundle={"file": table["bundles"][name]["file"],
+                                             "offset": offset, "length": length}))
+    return annotated
+
+
+def _coalesce(ranges: List[Tuple[int, int, str]], gap: int) -> List[Tuple[int, int, List[Tuple[int, int, str]]]]:
+    """將 (位移, 長度, chunk) 依位移排序後，間隔小於 gap 的合併為 (起點, 終點, 成員)"""
+    merged = []
+    for offset, length, chunk_file in sorted(ranges):
+        end = offset + length
+        if merged and offset - merged[-1][1] <= gap:
+            start, previous_end, members = merged[-1]
+            merged[-1] = (start, max(previous_end, end), members + [(offset, length, chunk_file)])
+        else:
+            merged.append((offset, end, [(offset, length, chunk_file)]))
+    return merged
+
+
+class ChunkBundleReader:
+    """
+    依位移表讀取 chunk 內容。
+    本機讀取以 mmap 對應 bundle 檔，只有被讀到的頁面才會載入記憶體；
+    遠端讀取以 HTTP Range 只下載需要的位元組，同一主機共用一條連線，
+    一次讀取多個 chunk 時相鄰的範圍會合併為一個請求。
+    """
+
+    def __init__(self, table: dict, timeout: float = 10.0):
+        if table.get("version") != BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"不支援的 bundle 版本：{table.get('version')}")
+        self.bundles = table["bundles"]
+        self.chunks = table["chunks"]
+        self.timeout = timeout
+        self._maps: Dict[str, Tuple[object, mmap.mmap]] = {}
+        self._connections: Dict[Tuple[str, str], http.client.HTTPConnection] = {}
+
+    @classmethod
+    def load(cls, table_path: str = BUNDLES_TABLE_FILE, **kwargs) -> "ChunkBundleReader":
+        with open(table_path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        for f, mapped in self._maps.values():
+            mapped.close()
+            f.close()
+        self._maps.clear()
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+    def _locate(self, chunk_file: str) -> Tuple[str, int, int]:
+        try:
+            return tuple(self.chunks[chunk_file])
+        except KeyError:
+            raise KeyError(f"位移表中沒有這個 chunk：{chunk_file}") from None
+
+    def _mapped(self, name: str) -> mmap.mmap:
+        if name not in self._maps:
+            f = open(self.bundles[name]["file"], "rb")
+            self._maps[name] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return self._maps[name][1]
+
+    def read(self, chunk_file: str) -> str:
+        """從本機 bundle 讀取單一 chunk"""
+        name, offset, length = self._locate(chunk_file)
+        return self._mapped(name)[offset:offset + length].decode("utf-8")
+
+    def read_many(self, chunk_files: Iterable[str]) -> Dict[str, str]:
+        """從本機 bundle 讀取多個 chunk，回傳 {chunk 路徑: 內容}"""
+        return {chunk_file: self.read(chunk_file) for chunk_file in chunk_files}
+
+    def _connection(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        key = (scheme, host)
+        if key not in self._connections:
+            connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            self._connections[key] = connection_class(host, timeout=self.timeout)
+        return self._connections[key]
+
+    def _get_range(self, url: str, start: int, end: int) -> bytes:
+        """以 Range 請求下載 [start, end)；伺服器不支援 Range 而回傳整份檔案時自行擷取"""
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+        headers = {"Range": f"bytes={start}-{end - 1}"}
+        for attempt in range(2):
+            connection = self._connection(parsed.scheme, parsed.netloc)
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # 共用的連線可能已被伺服器關閉，重新連線後再試一次
+                connection.close()
+                del self._connections[(parsed.scheme, parsed.netloc)]
+                if attempt:
+                    raise
+        if response.status == 206:
+            return body
+        if response.status == 200:
+            return body[start:end]
+        raise OSError(f"下載 bundle 失敗：HTTP {response.status} {url}")
+
+    def fetch_many(self, chunk_files: Iterable[str], base_url: Optional[str] = None,
+                   gap: int = RANGE_COALESCE_GAP) -> Dict[str, str]:
+        """
+        以 HTTP Range 從遠端 bundle 讀取多個 chunk，回傳 {chunk 路徑: 內容}。
+        base_url 指定時以 base_url + bundle 路徑組成網址，否則使用位移表中的 url。
+        """
+        by_bundle: Dict[str, List[Tuple[int, int, str]]] = {}
+        for chunk_file in chunk_files:
+            name, offset, length = self._locate(chunk_file)
+            by_bundle.setdefault(name, []).append((offset, length, chunk_file))
+
+        results = {}
+        for name, ranges in by_bundle.items():
+            bundle = self.bundles[name]
+            url = f"{base_url.rstrip('/')}/{urllib.parse.quote(bundle['file'])}" if base_url else bundle["url"]
+            for start, end, members in _coalesce(ranges, gap):
+                data = self._get_range(url, start, end)
+                for offset, length, chunk_file in members:
+                    results[chunk_file] = data[offset - start:offset - start + length].decode("utf-8")
+        return results
+
+    def fetch(self, chunk_file: str, base_url: Optional[str] = None) -> str:
+        """以單一 HTTP Range 請求從遠端讀取一個 chunk"""
+        return self.fetch_many([chunk_file], base_url=base_url, gap=0)[chunk_file]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="由 bundle 讀取 chunk 內容")
+    parser.add_argument("chunks", nargs="+", help="chunk 路徑（即 index.json 的 file 欄位）")
+    parser.add_argument("--remote", action="store_true", help="以 HTTP Range 從遠端 bundle 讀取")
+    args = parser.parse_args()
+
+    with ChunkBundleReader.load() as reader:
+        contents = reader.fetch_many(args.chunks) if args.remote else reader.read_many(args.chunks)
+    for chunk_file, content in contents.items():
+        print(f"===== {chunk_file} =====")
+        print(content)
+
+
+if __name__ == "__main__":
+    main()
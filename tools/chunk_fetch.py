@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import queue
+import random
+import hashlib
+import argparse
+import threading
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+# 下載過的 chunk 快取位置（內容與 ETag 等驗證資訊各存一個檔案）
+DEFAULT_CACHE_DIR = ".chunk_cache"
+CACHE_FORMAT_VERSION = 2
+
+# 同時進行中的請求數上限、每個主機保留的 keep-alive 連線數
+DEFAULT_MAX_IN_FLIGHT = 8
+POOL_SIZE_PER_HOST = 8
+DEFAULT_TIMEOUT = 10.0
+
+# 失敗重試：最多重試 MAX_RETRIES 次，等待 BACKOFF_BASE * 2^n 秒（加上隨機抖動，上限 BACKOFF_MAX）
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """重試後仍無法取得 chunk"""
+
+
+class ConnectionPool:
+    """依 (scheme, host) 保留 keep-alive 連線，供多個執行緒輪流使用"""
+
+    def __init__(self, max_per_host: int = POOL_SIZE_PER_HOST, timeout: float = DEFAULT_TIMEOUT):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._idle: Dict[tuple, "queue.LifoQueue[http.client.HTTPConnection]"] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        with self._lock:
+            idle = self._idle.setdefault((scheme, host), queue.LifoQueue())
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            return connection_class(host, timeout=self.timeout)
+
+    def release(self, scheme: str, host: str, connection: http.client.HTTPConnection):
+        idle = self._idle[(scheme, host)]
+        if idle.qsize() < self.max_per_host:
+            idle.put(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                while not idle.empty():
+                    idle.get_nowait().close()
+            self._idle.clear()
+
+
+class ChunkCache:
+    """
+    chunk 的磁碟快取：<sha256(url)>.md 存內容，<sha256(url)>.json 存 ETag、Last-Modified
+    與內容的 sha256。先寫內容再寫驗證資訊，中斷時不會留下對不上的快取。
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".md"), os.path.join(self.cache_dir, key + ".json")
+
+    def load(self, url: str) -> Optional[dict]:
+        """回傳 {"meta": 驗證資訊, "content": 內容}，沒有快取或快取損毀時回傳 None"""
+        content_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(content_path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != CACHE_FORMAT_VERSION or meta.get("url") != url:
+            return None
+        return {"meta": meta, "content": content}
+
+    def store(self, url: str, content: str, etag: Optional[str], last_modified: Optional[str],
+              write_content: bool = True):
+        """write_content 為 False 時只更新驗證資訊（伺服器回應 304，內容沿用快取）"""
+        content_path, meta_path = self._paths(url)
+        if write_content:
+            with open(content_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(content_path + ".tmp", content_path)
+        meta = {"version": CACHE_FORMAT_VERSION, "url": url, "etag": etag, "last_modified": last_modified,
+                "sha256": hashlib.sha256(content.encode("utf-8")).hexdigest()}
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+
+class ChunkFetcher:
+    """
+    依 index.json 條目並行下載 chunk：同時進行的請求數有上限，連線以 keep-alive 重複使用，
+    下載結果存入磁碟快取。條目帶有內容的 sha256 且與快取相同時直接使用快取，完全不連網；
+    其餘情況（updated 只到日期，同一天內可能改版）一律以 If-None-Match / If-Modified-Since 驗證，
+    伺服器回應 304 就沿用快取內容。
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 timeout: float = DEFAULT_TIMEOUT, max_retries: int = MAX_RETRIES,
+                 backoff_base: float = BACKOFF_BASE, revalidate: bool = False):
+        self.cache = ChunkCache(cache_dir)
+        self.pool = ConnectionPool(max_per_host=max(max_in_flight, 1), timeout=timeout)
+        self.max_in_flight = max(max_in_flight, 1)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.revalidate = revalidate  # True 時即使 sha256 相同也向伺服器驗證
+        self._stats_lock = threading.Lock()
+        self.stats = {"cached": 0, "not_modified": 0, "downloaded": 0, "retries": 0, "failed": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _request(self, url: str, headers: dict):
+        """送出一次 GET，回傳 (狀態碼, 回應標頭, 內容)；連線錯誤時丟棄該連線並拋出例外"""
+        parsed = urllib.parse.urlsplit(url)
+        path = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+        connection = self.pool.acquire(parsed.scheme, parsed.netloc)
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self.pool.release(parsed.scheme, parsed.netloc, connection)
+        return response.status, response, body
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+        return min(self.backoff_base * (2 ** attempt), BACKOFF_MAX) * (0.5 + random.random() / 2)
+
+    def _fresh(self, entry: dict, cached: Optional[dict]) -> bool:
+        """條目帶有的內容 sha256 與快取相同時視為未變動，不必連網"""
+        return (cached is not None and not self.revalidate and bool(entry.get("sha256"))
+                and cached["meta"].get("sha256") == entry["sha256"])
+
+    def fetch(self, entry: dict) -> str:
+        """取得單一條目的 chunk 內容"""
+        url = entry["url"]
+        cached = self.cache.load(url)
+        if self._fresh(entry, cached):
+            self._count("cached")
+            return cached["content"]
+
+        headers = {"Accept-Encoding": "identity"}
+        if cached:
+            if cached["meta"].get("etag"):
+                headers["If-None-Match"] = cached["meta"]["etag"]
+            if cached["meta"].get("last_modified"):
+                headers["If-Modified-Since"] = cached["meta"]["last_modified"]
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+            try:
+                status, response, body = self._request(url, headers)
+            except (OSError, http.client.HTTPException) as e:
+                last_error = f"{type(e).__name__}: {e}"
+                if attempt < self.max_retries:
+                    time.sleep(self._backoff(attempt))
+                continue
+
+            if status == 304 and cached:
+                self.cache.store(url, cached["content"], response.getheader("ETag") or cached["meta"].get("etag"),
+                                 response.getheader("Last-Modified") or cached["meta"].get("last_modified"),
+                                 write_content=False)
+                self._count("not_modified")
+                return cached["content"]
+            if status == 200:
+                try:
+                    content = body.decode("utf-8")
+                except UnicodeDecodeError as e:
+                    self._count("failed")
+                    raise FetchError(f"chunk 內容不是有效的 UTF-8：{url}（{e}）") from e
+                self.cache.store(url, content, response.getheader("ETag"), response.getheader("Last-Modified"))
+                self._count("downloaded")
+                return content
+            last_error = f"HTTP {status}"
+            if status not in RETRY_STATUSES:
+                break
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response.getheader("Retry-After")))
+
+        self._count("failed")
+        raise FetchError(f"無法取得 chunk：{url}（{last_error}）")
+
+    def fetch_many(self, entries: Iterable[dict]) -> dict:
+        """
+        並行取得多個條目的 chunk。
+
+        Returns:
+            dict: {"contents": {file: 內容}, "errors": {file: 錯誤訊息}}
+        """
+        entries = list(entries)
+        contents: Dict[str, str] = {}
+        errors: Dict[str, str] = {}
+
+        def run(entry):
+            try:
+                contents[entry["file"]] = self.fetch(entry)
+            except FetchError as e:
+                errors[entry["file"]] = str(e)
+
+        # 快取命中不需要佔用連線，先在目前執行緒處理，只有需要連網的條目才交給執行緒池
+        pending: List[dict] = []
+        for entry in entries:
+            cached = self.cache.load(entry["url"])
+            if self._fresh(entry, cached):
+                contents[entry["file"]] = cached["content"]
+                self._count("cached")
+            else:
+                pending.append(entry)
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(pending))) as executor:
+                list(executor.map(run, pending))
+        return {"contents": contents, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="依 index.json 並行下載 chunk，並以 ETag 磁碟快取避免重複下載")
+    parser.add_argument("--index", default="index.json", help="index.json 路徑")
+    parser.add_argument("--category", action="append", help="只下載指定分類（可重複指定）")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="快取資料夾")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT, help="同時進行的請求數上限")
+    parser.add_argument("--revalidate", action="store_true", help="即使條目的 sha256 與快取相同也向伺服器驗證 ETag")
+    args = parser.parse_args()
+
+    with open(args.index, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if args.category:
+        entries = [entry for entry in entries if entry["category"] in set(args.category)]
+
+    started = time.perf_counter()
+    with ChunkFetcher(args.cache_dir, args.max_in_flight, revalidate=args.revalidate) as fetcher:
+        outcome = fetcher.fetch_many(entries)
+    stats = fetcher.stats
+    print(f"✅ 取得 {len(outcome['contents'])}/{len(entries)} 個 chunk（{time.perf_counter() - started:.3f}s）："
+          f"快取 {stats['cached']}、未變動 {stats['not_modified']}、下載 {stats['downloaded']}、"
+          f"重試 {stats['retries']}、失敗 {stats['failed']}")
+    for chunk_file, error in outcome["errors"].items():
+        print(f"❌ {chunk_file}：{error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 import os
 import re
 import json
+import itertools
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from build_manifest import BuildManifest, write_if_changed
+from metrics import add_metrics_arguments, metrics_from_args, stage_metrics, write_metrics
 
 # 配置路徑
 # 假設此腳本位於 tools/chunk_md.py
@@ -10,6 +17,29 @@ SOURCE_MD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__f
 # 建議存儲到一個新的目錄，例如 knowledge_chunks
 OUTPUT_CHUNKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'knowledge_chunks', 'law_CK')
 
+# 整個知識庫的分類與對應的 chunks 輸出目錄（維護點：新增分類時在這裡加入）
+# knowledge/<分類>/... → knowledge_chunks/<輸出目錄>/...，子資料夾結構會保留
+KNOWLEDGE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'knowledge')
+CHUNKS_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'knowledge_chunks')
+CATEGORY_OUTPUT_DIRS = {
+    "law": "law_CK",
+    "product": "product",
+}
+
+# 建置清單中的階段名稱與工具版本（切割邏輯變動時請遞增版本，既有 chunks 會被重新切割）
+MANIFEST_STAGE = "chunk_md"
+TOOL_VERSION = "3"
+
+# 切割模式：
+#   headings - 只依 ## 標題切割（舊行為）
+#   size     - 依 token 預算切割，優先在案件列、段落、句號處斷開
+#   auto     - 先依標題切割，超過預算的部分再依 token 預算切割
+CHUNK_MODES = ("headings", "size", "auto")
+DEFAULT_CHUNK_MODE = "auto"
+# 每個 chunk 的 token 上限與相鄰 chunk 之間重疊的 token 數
+DEFAULT_MAX_TOKENS = 800
+DEFAULT_OVERLAP_TOKENS = 80
+
 def chunk_markdown_by_headings(filepath):
     """
     優化後的 Markdown 文件切割函數。
@@ -104,98 +134,462 @@ def chunk_markdown_by_headings(filepath):
     return chunks
 
 
+_CJK_CHAR_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_WHITESPACE_RE = re.compile(r"\s")
+
+def estimate_tokens(text):
+    """
+    粗估文字的 token 數：中日韓字元與全形標點約各佔 1 個 token，
+    其他非空白字元約 4 個字元 1 個 token。
+    """
+    cjk = len(_CJK_CHAR_RE.findall(text))
+    other = len(text) - cjk - len(_WHITESPACE_RE.findall(text))
+    return cjk + (other + 3) // 4
+
+# 可用的長度估算方式（--estimator），chars 代表以字元數作為預算
+TOKEN_ESTIMATORS = {
+    "cjk": estimate_tokens,
+    "chars": len,
+}
+
+# 自然斷點：Markdown 標題、「項次N」、以及 PDF 表格中「項次 發文日期」開頭的案件列
+_BLOCK_BOUNDARY_RE = re.compile(r"^\s*(?:#{1,6}\s|項次\s*\d+|\d{1,3}\s*\d{2,3}/\d{1,2}/\d{1,2})")
+# 句子斷點：句號、分號、問號、驚嘆號之後
+_SENTENCE_END_RE = re.compile(r"(?<=[。；！？;])")
+_LINE_END_RE = re.compile(r"(?<=\n)")
+# auto 模式的分段標題（與 chunk_markdown_by_headings 相同，## 以下的標題）
+_SECTION_HEADING_RE = re.compile(r"##+\s")
+
+def _iter_blocks(lines):
+    """將逐行讀入的內容組成區塊，遇到空行或案件列、標題開頭時斷開"""
+    buffer = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            if buffer:
+                yield "\n".join(buffer)
+                buffer = []
+            continue
+        if buffer and _BLOCK_BOUNDARY_RE.match(line):
+            yield "\n".join(buffer)
+            buffer = []
+        buffer.append(line)
+    if buffer:
+        yield "\n".join(buffer)
+
+def _hard_split(text, max_tokens, estimator):
+    """沒有任何斷點可用時，直接依預算切斷"""
+    while text:
+        end = len(text)
+        while end > 1 and estimator(text[:end]) > max_tokens:
+            end = max(1, end * max_tokens // max(estimator(text[:end]), 1))
+        # 盡量退回到換行處，避免在一行中間斷開
+        newline = text.rfind("\n", 0, end)
+        if end < len(text) and newline > end // 2:
+            end = newline + 1
+        yield text[:end]
+        text = text[end:]
+
+def _split_block(block, max_tokens, estimator):
+    """區塊超過預算時，依句子斷開後重新組合，單句仍過長則硬切"""
+    if estimator(block) <= max_tokens:
+        yield block
+        return
+    pending = ""
+    for sentence in _SENTENCE_END_RE.split(block):
+        if not sentence:
+            continue
+        if estimator(sentence) > max_tokens:
+            if pending:
+                yield pending
+                pending = ""
+            yield from _hard_split(sentence, max_tokens, estimator)
+            continue
+        if pending and estimator(pending + sentence) > max_tokens:
+            yield pending
+            pending = ""
+        pending += sentence
+    if pending:
+        yield pending
+
+def _fit_tail(pieces, overlap_tokens, estimator):
+    tail = ""
+    for piece in reversed([p for p in pieces if p]):
+        if estimator(piece + tail) > overlap_tokens:
+            break
+        tail = piece + tail
+    return tail.strip()
+
+def _overlap_tail(text, overlap_tokens, estimator):
+    """
+    從上一個 chunk 的結尾取出不超過 overlap_tokens 的完整句子，作為下一個 chunk 的開頭；
+    最後一句就超過預算（或沒有句號，如 PDF 表格列）時改取結尾的完整行
+    """
+    if overlap_tokens <= 0:
+        return ""
+    return (_fit_tail(_SENTENCE_END_RE.split(text), overlap_tokens, estimator)
+            or _fit_tail(_LINE_END_RE.split(text), overlap_tokens, estimator))
+
+def iter_chunks_by_size(lines, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                        estimator=estimate_tokens):
+    """
+    依 token 預算逐步產生 chunks，適用於沒有標題的文件。
+    lines 可以是開啟中的檔案，內容逐行處理而不一次讀入；
+    優先在案件列、段落、句子處斷開，相鄰 chunk 之間保留 overlap_tokens 的重疊，且不產生空 chunk。
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens 必須小於 max_tokens")
+
+    parts = []
+    current_tokens = 0
+    for block in _iter_blocks(lines):
+        for piece_index, piece in enumerate(_split_block(block, max_tokens, estimator)):
+            piece_tokens = estimator(piece)
+            if parts and current_tokens + piece_tokens > max_tokens:
+                chunk = "".join(parts).strip()
+                if chunk:
+                    yield chunk
+                overlap = _overlap_tail(chunk, overlap_tokens, estimator)
+                parts, current_tokens = [], 0
+                if overlap and estimator(overlap) + piece_tokens <= max_tokens:
+                    parts, current_tokens = [overlap], estimator(overlap)
+            # 同一區塊切出的句子直接接續，不同區塊之間以空行分隔
+            if parts and piece_index == 0:
+                parts.append("\n\n")
+            parts.append(piece)
+            current_tokens += piece_tokens
+    chunk = "".join(parts).strip()
+    if chunk:
+        yield chunk
+
+def chunk_markdown_by_size(filepath, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                           estimator=estimate_tokens):
+    """依 token 預算切割 Markdown 檔案（串流讀取）"""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return [c for c in iter_chunks_by_size(f, max_tokens, overlap_tokens, estimator) if c.strip()]
+    except FileNotFoundError:
+        print(f"錯誤：檔案未找到 - {filepath}")
+        return []
+
+def _is_heading_only(chunk):
+    lines = [line for line in chunk.strip().split('\n') if line.strip()]
+    return len(lines) == 1 and lines[0].lstrip().startswith('#')
+
+def iter_chunks_auto(lines, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                     estimator=estimate_tokens):
+    """
+    auto 模式的串流版本：逐行讀入並依 ## 標題分段（第一行的 # 標題併入前言），
+    段落在預算內時整段成為一個 chunk，略過只有標題沒有內容的段落；
+    段落超過預算時，把已讀入的行與段落其餘的行接續交給 iter_chunks_by_size，
+    記憶體中最多只保留一個預算內的段落，不需一次讀入整份檔案。
+    """
+    lines = (line.rstrip("\r\n") for line in lines)
+    section, body_start, tokens = [], 0, 0
+    next_heading = []
+
+    def rest_of_section():
+        yield from section
+        for line in lines:
+            if _SECTION_HEADING_RE.match(line):
+                next_heading.append(line)
+                return
+            yield line
+
+    # 文件總標題：第一行的 # 標題，或開頭空行之後的 H1，與前言之間空一行
+    first, leading_blank = next(lines, None), False
+    while first is not None and not first.strip():
+        first, leading_blank = next(lines, None), True
+    if first is None:
+        return
+    if (first.startswith("#") and not leading_blank) or first.lstrip().startswith("# "):
+        section, body_start, tokens = [first.strip(), ""], 2, estimator(first)
+    else:
+        lines = itertools.chain([first], lines)
+
+    while True:
+        if next_heading:
+            heading = next_heading.pop()
+            section, body_start, tokens = [heading.strip()], 1, estimator(heading)
+        for line in lines:
+            if _SECTION_HEADING_RE.match(line):
+                next_heading.append(line)
+                break
+            if len(section) == body_start:
+                line = line.lstrip()  # 段落開頭的空白與空行
+                if not line:
+                    continue
+            section.append(line)
+            tokens += estimator(line)
+            # 逐行累加的估算只是上限，超過預算時再以整段確認
+            if tokens > max_tokens:
+                tokens = estimator("\n".join(section))
+                if tokens > max_tokens:
+                    yield from (c for c in iter_chunks_by_size(rest_of_section(), max_tokens, overlap_tokens,
+                                                              estimator) if c.strip())
+                    section, body_start = [], 0
+                    break
+        if len(section) > body_start:
+            chunk = "\n".join(section).strip()
+            if chunk and not _is_heading_only(chunk):
+                yield chunk
+        if not next_heading:
+            return
+        section, body_start = [], 0
+
+def chunk_markdown(filepath, mode=DEFAULT_CHUNK_MODE, max_tokens=DEFAULT_MAX_TOKENS,
+                   overlap_tokens=DEFAULT_OVERLAP_TOKENS, estimator="cjk"):
+    """
+    依指定模式切割 Markdown 檔案，回傳 chunks 串列。
+    auto 模式先依標題切割，超過預算的 chunk 再依 token 預算細分，並略過只有標題沒有內容的 chunk
+    （與 size 模式相同為串流讀取，見 iter_chunks_auto）。
+    """
+    estimate = TOKEN_ESTIMATORS[estimator]
+    if mode == "headings":
+        return chunk_markdown_by_headings(filepath)
+    if mode == "size":
+        return chunk_markdown_by_size(filepath, max_tokens, overlap_tokens, estimate)
+    if mode != "auto":
+        raise ValueError(f"未知的切割模式：{mode}")
+
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return list(iter_chunks_auto(f, max_tokens, overlap_tokens, estimate))
+    except FileNotFoundError:
+        print(f"錯誤：檔案未找到 - {filepath}")
+        return []
+
+def _tool_version(chunk_options):
+    """切割參數也納入工具版本，參數變動時既有 chunks 會被重新切割"""
+    if not chunk_options:
+        return TOOL_VERSION
+    options = ",".join(f"{k}={chunk_options[k]}" for k in sorted(chunk_options))
+    return f"{TOOL_VERSION}:{options}"
+
+def existing_chunks(output_dir, base_filename):
+    """列出某份來源目前在輸出目錄中的 chunk 檔，回傳 {編號: 路徑}"""
+    pattern = re.compile(re.escape(base_filename) + r"_chunk_(\d+)\.md$")
+    if not os.path.isdir(output_dir):
+        return {}
+    chunks = {}
+    for name in os.listdir(output_dir):
+        match = pattern.match(name)
+        if match:
+            chunks[int(match.group(1))] = os.path.join(output_dir, name)
+    return chunks
+
+def _remove_stale_chunks(output_dir, base_filename, chunk_count):
+    """重新切割後 chunk 數變少時，刪除編號超出的舊 chunk 檔"""
+    for number, path in existing_chunks(output_dir, base_filename).items():
+        if number > chunk_count:
+            os.remove(path)
+            print(f"  - 已刪除過期 chunk: {os.path.basename(path)}")
+
+
+def get_output_dir(filepath):
+    """
+    依來源檔所在分類決定 chunks 輸出目錄，例如
+    knowledge/law/x.md → knowledge_chunks/law_CK/
+    knowledge/product/product_xxx/y.md → knowledge_chunks/product/product_xxx/
+    不在已知分類下的檔案沿用 OUTPUT_CHUNKS_DIR。
+    """
+    relative_path = os.path.relpath(os.path.abspath(filepath), KNOWLEDGE_ROOT)
+    parts = relative_path.replace("\\", "/").split("/")
+    if len(parts) >= 2 and parts[0] in CATEGORY_OUTPUT_DIRS:
+        return os.path.join(CHUNKS_ROOT, CATEGORY_OUTPUT_DIRS[parts[0]], *parts[1:-1])
+    return OUTPUT_CHUNKS_DIR
+
+def write_chunks(chunks, output_dir, base_filename):
+    """
+    一次寫入同一份來源的所有 chunks，回傳輸出路徑串列。
+    內容與既有檔案相同時不重寫，保留原本的 mtime（見 build_manifest.write_if_changed）；
+    編號超出的舊 chunk 會被刪除。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    output_filepaths = []
+    for i, chunk_content in enumerate(chunks):
+        output_filepath = os.path.join(output_dir, f"{base_filename}_chunk_{i+1}.md")
+        write_if_changed(output_filepath, chunk_content.encode('utf-8'))
+        output_filepaths.append(output_filepath)
+    _remove_stale_chunks(output_dir, base_filename, len(chunks))
+    return output_filepaths
+
+def _chunk_file_task(filepath, chunk_options):
+    """
+    切割並寫入單一檔案（可在行程池中執行）。
+    回傳 (filepath, 輸出路徑串列, 耗時秒數, 錯誤訊息或 None, 各 chunk 內文)
+    """
+    started = time.perf_counter()
+    try:
+        chunks = chunk_markdown(filepath, **chunk_options)
+        base_filename = os.path.splitext(os.path.basename(filepath))[0]
+        output_filepaths = write_chunks(chunks, get_output_dir(filepath), base_filename)
+        return filepath, output_filepaths, time.perf_counter() - started, None, chunks
+    except Exception as e:
+        return filepath, [], time.perf_counter() - started, str(e), []
+
+def _recorded_outputs(manifest, filepath):
+    """建置清單中記錄的 chunk 路徑（轉為絕對路徑，只回傳仍存在的檔案）"""
+    paths = [os.path.join(manifest.root_dir, key) for key in manifest.outputs(MANIFEST_STAGE, filepath)]
+    return [path for path in paths if os.path.exists(path)]
+
+def _walk_order(path):
+    """與 os.walk 搭配排序後的走訪順序相同：同目錄的檔案在子目錄之前，名稱依字典序"""
+    return os.path.normpath(os.path.dirname(path)).split(os.sep), os.path.basename(path)
+
 #單一處理指定md檔
-def process_single_markdown_file(filepath):
+def process_single_markdown_file(filepath, manifest=None, metrics=None, **chunk_options):
     """
     處理單一 Markdown 檔案，對其進行分塊處理，
-    並將切割後的 chunks 保存到指定的輸出目錄。
+    並將切割後的 chunks 保存到該分類對應的輸出目錄。
+    有提供 manifest 時，來源與 chunks 皆未變動就直接略過。
+    chunk_options 會傳給 chunk_markdown（mode、max_tokens、overlap_tokens、estimator）。
+    metrics（tools/metrics.py 的 StageMetrics）提供時記錄耗時、chunk 數與輸入輸出位元組數。
     """
+    tool_version = _tool_version(chunk_options)
     if not os.path.exists(filepath):
         print(f"錯誤：指定的檔案不存在 - {filepath}")
         return
 
+    if manifest is not None and manifest.is_up_to_date(MANIFEST_STAGE, filepath, tool_version):
+        print(f"未變動，略過: {filepath}")
+        if metrics is not None:
+            metrics.add(skipped=1)
+        return
+
     print(f"正在處理單一檔案: {filepath}")
-    chunks = chunk_markdown_by_headings(filepath)
+    _, output_filepaths, elapsed, error, _ = _chunk_file_task(filepath, chunk_options)
+    if metrics is not None:
+        _record_file_metrics(metrics, filepath, output_filepaths, elapsed, error)
 
-    if not chunks:
+    if error:
+        print(f"錯誤：檔案 {filepath} 切割失敗 - {error}")
+        return
+    if not output_filepaths:
         print(f"警告：檔案 {filepath} 沒有產生任何分塊。可能沒有找到標題或內容為空。")
         return
 
-    # 確定相對於 SOURCE_MD_DIR 的相對路徑，以在輸出目錄中重建相似的結構
-    # 如果 filepath 不在 SOURCE_MD_DIR 之下，這個相對路徑會包含 '../' 或其他非預期的部分
-    # 我們需要更穩健的方式來處理單一檔案的輸出路徑
-    
-    # 獲取檔案所在的目錄名稱，作為輸出子目錄的一部分
-    file_dir_name = os.path.basename(os.path.dirname(filepath))
-    # 獲取專案根目錄到檔案路徑之間的相對路徑部分 (例如 'knowledge/law')
-    # 這一步比較複雜，為了簡化，我們可以這樣做：
-    # 假設所有要處理的檔案都在 SOURCE_MD_DIR 之下
-    relative_to_base_source = os.path.relpath(filepath, SOURCE_MD_DIR)
-    # 輸出目錄應該是 OUTPUT_CHUNKS_DIR + 原始檔案的相對路徑目錄
-    output_target_dir = os.path.join(OUTPUT_CHUNKS_DIR, os.path.dirname(relative_to_base_source))
-    
-    # 如果 OUTPUT_CHUNKS_DIR 不存在則創建
-    if not os.path.exists(output_target_dir):
-        os.makedirs(output_target_dir)
-
-    base_filename = os.path.splitext(os.path.basename(filepath))[0]
-    
-    # 將每個 chunk 保存為一個新的 Markdown 檔案
-    for i, chunk_content in enumerate(chunks):
-        chunk_filename = f"{base_filename}_chunk_{i+1}.md"
-        output_filepath = os.path.join(output_target_dir, chunk_filename)
-        with open(output_filepath, 'w', encoding='utf-8') as outfile:
-            outfile.write(chunk_content)
+    for output_filepath in output_filepaths:
         print(f"  - 已生成 chunk: {output_filepath}")
 
-    print(f"檔案 '{os.path.basename(filepath)}' 已處理完畢並分塊保存。")
+    if manifest is not None:
+        manifest.record(MANIFEST_STAGE, filepath, tool_version, output_filepaths)
 
-#一次處理所有md檔案
-def process_all_markdown_files():
-    """
-    遍歷指定目錄下的所有 Markdown 檔案，對其進行分塊處理，
-    並將切割後的 chunks 保存到指定的輸出目錄。
+    print(f"檔案 '{os.path.basename(filepath)}' 已處理完畢並分塊保存（{elapsed:.3f}s）。")
+
+def _record_file_metrics(metrics, filepath, output_filepaths, elapsed, error):
+    metrics.file(os.path.relpath(filepath, KNOWLEDGE_ROOT), seconds=elapsed, bytes_in=os.path.getsize(filepath),
+                 chunks=len(output_filepaths), bytes_out=sum(os.path.getsize(p) for p in output_filepaths),
+                 **({"failed": 1} if error else {}))
+
+def list_markdown_files(categories=None):
+    """列出指定分類（預設為全部）下所有 Markdown 檔案"""
+    filepaths = []
+    for category in categories or CATEGORY_OUTPUT_DIRS:
+        source_dir = os.path.join(KNOWLEDGE_ROOT, category)
+        for root, dirs, files in os.walk(source_dir):
+            dirs.sort()
+            for file in sorted(files):
+                if file.endswith('.md'):
+                    filepaths.append(os.path.join(root, file))
+    return filepaths
+
+def process_knowledge_tree(manifest=None, workers=1, categories=None, metrics=None, **chunk_options):
     """
-    if not os.path.exists(OUTPUT_CHUNKS_DIR):
-        os.makedirs(OUTPUT_CHUNKS_DIR)
+    批次切割整個知識庫（預設為 CATEGORY_OUTPUT_DIRS 中的所有分類，包含產品 FAQ）。
+    workers 大於 1 時以行程池平行切割；每個檔案的 chunks 一次寫入，
+    並回報各檔案耗時。有提供 manifest 時只切割有變動的檔案。
+    metrics（tools/metrics.py 的 StageMetrics）提供時記錄各檔案的 chunk 數與輸入輸出位元組數。
 
-    for root, _, files in os.walk(SOURCE_MD_DIR):
-        for file in files:
-            if file.endswith('.md'):
-                filepath = os.path.join(root, file)
-                relative_path = os.path.relpath(filepath, SOURCE_MD_DIR) # 獲取相對於 SOURCE_MD_DIR 的路徑
+    Returns:
+        dict: {"success", "failed", "skipped", "total", "chunks", "timings": {檔案: 秒}, "errors": {檔案: 錯誤},
+               "chunk_files": 目前所有 chunk 的路徑（與 os.walk 排序相同，可直接交給 generate_index），
+               "chunk_texts": {本次寫出的 chunk 路徑: 內文}（下游階段直接取用，不必再讀檔）}
+    """
+    tool_version = _tool_version(chunk_options)
+    filepaths = list_markdown_files(categories)
+    results = {"success": 0, "failed": 0, "skipped": 0, "total": len(filepaths),
+               "chunks": 0, "timings": {}, "errors": {}, "chunk_files": [], "chunk_texts": {}}
 
-                print(f"正在處理檔案: {filepath}")
-                chunks = chunk_markdown_by_headings(filepath)
+    pending = []
+    for filepath in filepaths:
+        if manifest is not None and manifest.is_up_to_date(MANIFEST_STAGE, filepath, tool_version):
+            results["skipped"] += 1
+            results["chunk_files"].extend(_recorded_outputs(manifest, filepath))
+            continue
+        pending.append(filepath)
 
-                # 為這個檔案創建對應的輸出子目錄
-                output_subdir = os.path.join(OUTPUT_CHUNKS_DIR, os.path.dirname(relative_path))
-                if not os.path.exists(output_subdir):
-                    os.makedirs(output_subdir)
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_chunk_file_task, f, chunk_options) for f in pending]
+            outcomes = [future.result() for future in as_completed(futures)]
+    else:
+        outcomes = [_chunk_file_task(f, chunk_options) for f in pending]
 
-                base_filename = os.path.splitext(file)[0]
-                
-                # 將每個 chunk 保存為一個新的 Markdown 檔案
-                for i, chunk_content in enumerate(chunks):
-                    chunk_filename = f"{base_filename}_chunk_{i+1}.md"
-                    output_filepath = os.path.join(output_subdir, chunk_filename)
-                    with open(output_filepath, 'w', encoding='utf-8') as outfile:
-                        outfile.write(chunk_content)
-                    print(f"  - 已生成 chunk: {output_filepath}")
+    for filepath, output_filepaths, elapsed, error, chunks in sorted(outcomes, key=lambda outcome: outcome[0]):
+        relative_path = os.path.relpath(filepath, KNOWLEDGE_ROOT)
+        results["timings"][relative_path] = round(elapsed, 4)
+        if metrics is not None:
+            _record_file_metrics(metrics, filepath, output_filepaths, elapsed, error)
+        if error:
+            results["failed"] += 1
+            results["errors"][relative_path] = error
+            print(f"❌ {relative_path} 切割失敗：{error}")
+            if manifest is not None:
+                results["chunk_files"].extend(_recorded_outputs(manifest, filepath))  # 舊 chunks 仍在
+            continue
+        results["success"] += 1
+        results["chunks"] += len(output_filepaths)
+        results["chunk_files"].extend(output_filepaths)
+        results["chunk_texts"].update(zip(output_filepaths, chunks))
+        print(f"⏱️ {elapsed:7.3f}s  {relative_path} → {len(output_filepaths)} 個 chunk")
+        if manifest is not None:
+            manifest.record(MANIFEST_STAGE, filepath, tool_version, output_filepaths)
 
-    print("\n所有 Markdown 檔案已處理完畢並分塊保存。")
-    print(f"Chunks 已保存到目錄: {OUTPUT_CHUNKS_DIR}")
+    if manifest is not None:
+        # 只處理部分分類時（如 process_all_markdown_files 只切割 law），其他分類的記錄保持不動
+        within = [os.path.join(KNOWLEDGE_ROOT, category) for category in categories] if categories else None
+        manifest.prune(MANIFEST_STAGE, filepaths, within=within)
+    results["chunk_files"].sort(key=_walk_order)
+    if metrics is not None:
+        metrics.add(files=results["total"], skipped=results["skipped"])
 
-if __name__ == "__main__":
-    # --- 選擇以下其中一種方式執行 ---
+    print(f"\n切割完成：成功 {results['success']}，略過 {results['skipped']}，失敗 {results['failed']}，"
+          f"共產生 {results['chunks']} 個 chunk")
+    print(f"Chunks 已保存到目錄: {CHUNKS_ROOT}")
+    return results
 
-    # 1. 處理指定單一檔案
-    # 請根據您的實際路徑修改這個範例路徑
-    single_file_to_chunk = os.path.join(SOURCE_MD_DIR, '臺北市政府衛生局114年6月份處理化粧品違規廣告處罰案件統計表.md')
-    # 或者如果您知道絕對路徑：
-    # single_file_to_chunk = r"C:\Users\YourUser\test_index_wonders\knowledge\law\臺北市政府衛生局114年6月份處理化粧品違規廣告處罰案件統計表.md"
+#一次處理所有md檔案
+def process_all_markdown_files(manifest=None, **chunk_options):
+    """
+    遍歷 knowledge/law 下的所有 Markdown 檔案，對其進行分塊處理，
+    並將切割後的 chunks 保存到指定的輸出目錄。
+    整個知識庫（含產品 FAQ）請改用 process_knowledge_tree。
+    """
+    return process_knowledge_tree(manifest=manifest, categories=["law"], **chunk_options)
 
-    process_single_markdown_file(single_file_to_chunk)
+if __name__ == "__main__":
+    # 不指定檔案時批次切割整個知識庫；指定檔案時只切割該檔案，例如：
+    # python tools/chunk_md.py knowledge/law/臺北市政府衛生局114年6月份處理化粧品違規廣告處罰案件統計表.md
+    parser = argparse.ArgumentParser(description="將 Markdown 檔案切割為 chunks")
+    parser.add_argument("file", nargs="?", help="只切割指定的 Markdown 檔案（省略時處理整個知識庫）")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="平行處理的行程數，0 代表使用全部 CPU 核心（預設 1，逐一處理）")
+    parser.add_argument("--mode", choices=CHUNK_MODES, default=DEFAULT_CHUNK_MODE, help="切割模式")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="每個 chunk 的 token 上限")
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS, help="相鄰 chunk 的重疊 token 數")
+    parser.add_argument("--estimator", choices=list(TOKEN_ESTIMATORS), default="cjk",
+                        help="長度估算方式（chars 代表以字元數計算預算）")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    metrics = metrics_from_args(args)
+    chunk_options = {"mode": args.mode, "max_tokens": args.max_tokens,
+                     "overlap_tokens": args.overlap_tokens, "estimator": args.estimator}
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
 
-    # 2. 處理預設目錄下的所有 Markdown 檔案 (如果需要，請取消註解)
-    # process_all_markdown_files_in_dir()
\ No newline at end of file
+    with BuildManifest() as build_manifest, stage_metrics(metrics, MANIFEST_STAGE) as stage:
+        if args.file:
+            process_single_markdown_file(args.file, manifest=build_manifest, metrics=stage, **chunk_options)
+        else:
+            process_knowledge_tree(manifest=build_manifest, workers=workers, metrics=stage, **chunk_options)
+    write_metrics(metrics, args)
@@ -1,11 +1,22 @@
-import pandas as pd
 import os
+import json
+import time
+import codecs
+import hashlib
+import argparse
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 import logging
 
-# 設定日誌
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from build_manifest import BuildManifest
+from metrics import StageMetrics, add_metrics_arguments, metrics_from_args, stage_metrics, write_metrics
+
+if TYPE_CHECKING:
+    import pandas as pd  # 只供型別標註使用，實際在需要時才載入
+
+# 日誌格式（在 main() 或 tools/pipeline.py 中設定，import 時不做任何設定）
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 logger = logging.getLogger(__name__)
 
 # 產品識別與資料夾映射（維護點：新增產品時只需更新這裡）
@@ -16,27 +27,182 @@ PRODUCT_FOLDER_MAP = {
     # "膠原蛋白": "product_collagen",
 }
 
+# 建置清單中的階段名稱與工具版本（轉換邏輯變動時請遞增版本，既有輸出會被重新轉換）
+MANIFEST_STAGE = "csv_to_md"
+TOOL_VERSION = "1"
+
+# 編碼偵測：只讀取檔頭這麼多位元組判斷編碼，結果記錄在 sidecar 檔，重跑時直接沿用
+ENCODING_SNIFF_BYTES = 64 * 1024
+ENCODING_CACHE_FILE = os.path.join("knowledge_index", "csv_encodings.json")
+# 偵測不到或解析途中失敗時依序嘗試的編碼（iso-8859-1 可解碼任何位元組，必定放最後）
+CANDIDATE_ENCODINGS = ['utf-8', 'utf-8-sig', 'big5', 'cp950', 'gb2312', 'cp1252', 'iso-8859-1']
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+@lru_cache(maxsize=1)
+def _product_matcher(products: tuple):
+    """以 PRODUCT_FOLDER_MAP 建立的 Aho-Corasick 自動機（與 tools/facets.py 的分面標記共用實作）"""
+    from facets import AhoCorasick
+    
+    return AhoCorasick((key, (order, key, folder)) for order, (key, folder) in enumerate(products))
+
 def get_product_folder(csv_filename: str) -> str:
     """
     根據CSV檔名判斷應該輸出到哪個產品資料夾
     
+    所有產品關鍵字一次掃描檔名；多個關鍵字同時出現時，以 PRODUCT_FOLDER_MAP 中較前面的為準
+    
     Args:
         csv_filename: CSV檔案名稱
         
     Returns:
         產品資料夾名稱，如果無法識別則使用預設資料夾
     """
-    for product_key, folder_name in PRODUCT_FOLDER_MAP.items():
-        if product_key in csv_filename:
-            logger.info(f"識別產品: {product_key} -> {folder_name}")
-            return folder_name
+    matches = [value for _, _, value in _product_matcher(tuple(PRODUCT_FOLDER_MAP.items())).iter(csv_filename)]
+    if matches:
+        _, product_key, folder_name = min(matches)
+        logger.info(f"識別產品: {product_key} -> {folder_name}")
+        return folder_name
     
     # 如果無法識別，使用預設資料夾
     logger.warning(f"無法識別產品類型，使用預設資料夾: {csv_filename}")
     return "product_other_unmatch"
 
+def get_output_path(csv_file_path: str, base_output_dir: str) -> Path:
+    """
+    取得 CSV 對應的 Markdown 輸出路徑
+    
+    Args:
+        csv_file_path: CSV 檔案路徑
+        base_output_dir: 基礎輸出目錄 (knowledge/)
+        
+    Returns:
+        Path: knowledge/product/<產品資料夾>/<檔名>.md
+    """
+    csv_path = Path(csv_file_path)
+    product_folder = get_product_folder(csv_path.name)
+    return Path(base_output_dir) / "product" / product_folder / f"{csv_path.stem}.md"
+
+def _decodes(data: bytes, encoding: str, final: bool) -> bool:
+    """以增量解碼器檢查位元組能否以指定編碼解碼；final=False 時容許結尾被截斷的多位元組字元"""
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(data, final=final)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def _looks_like_big5(data: bytes, final: bool) -> bool:
+    """
+    檢查是否符合 Big5/CP950 的位元組結構：
+    首位元組 0x81-0xFE 後必須接 0x40-0x7E 或 0xA1-0xFE，且至少出現一個雙位元組字。
+    """
+    pairs = 0
+    i = 0
+    while i < len(data):
+        lead = data[i]
+        if lead < 0x80:
+            i += 1
+            continue
+        if not 0x81 <= lead <= 0xFE:
+            return False
+        if i + 1 >= len(data):
+            return not final and pairs > 0  # 檔頭最後一個字被截斷
+        trail = data[i + 1]
+        if not (0x40 <= trail <= 0x7E or 0xA1 <= trail <= 0xFE):
+            return False
+        pairs += 1
+        i += 2
+    return pairs > 0
+
+def sniff_encoding(csv_path: Path, sniff_bytes: int = ENCODING_SNIFF_BYTES) -> str:
+    """
+    只讀取檔頭一次判斷 CSV 編碼：先看 BOM，再依序檢查 UTF-8、Big5/CP950 位元組結構、
+    GB2312 與 CP1252，都不符合時回傳 iso-8859-1。
+    """
+    with open(csv_path, 'rb') as f:
+        prefix = f.read(sniff_bytes)
+    final = len(prefix) < sniff_bytes  # 整個檔案都讀進來了，不會有被截斷的字元
+    
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    if _decodes(prefix, 'utf-8', final):
+        return 'utf-8'
+    if _looks_like_big5(prefix, final):
+        for encoding in ('big5', 'cp950'):
+            if _decodes(prefix, encoding, final):
+                return encoding
+    for encoding in ('gb2312', 'cp1252'):
+        if _decodes(prefix, encoding, final):
+            return encoding
+    return 'iso-8859-1'
+
+def load_encoding_cache(cache_file: str = ENCODING_CACHE_FILE) -> dict:
+    """讀取編碼 sidecar 檔，格式為 {CSV 路徑: {"encoding", "size", "mtime_ns", "prefix_sha256"}}"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"編碼快取無法讀取，將重新偵測: {cache_file} ({e})")
+        return {}
+
+def save_encoding_cache(cache: dict, cache_file: str = ENCODING_CACHE_FILE):
+    """寫回編碼 sidecar 檔，先寫暫存檔再取代"""
+    os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_file, cache_file)
+
+def _prefix_sha256(csv_path: Path) -> str:
+    with open(csv_path, 'rb') as f:
+        return hashlib.sha256(f.read(ENCODING_SNIFF_BYTES)).hexdigest()
+
+def detect_encoding(csv_path: Path, cache: Optional[dict] = None) -> str:
+    """
+    取得 CSV 的編碼，優先沿用 sidecar 快取。
+    大小與 mtime 相同時完全不讀檔；mtime 變了（例如 CI 重新 checkout）但檔頭雜湊相同時也不重新偵測。
+    """
+    key = csv_path.as_posix()
+    st = csv_path.stat()
+    cached = cache.get(key) if cache is not None else None
+    if cached and cached["size"] == st.st_size:
+        if cached["mtime_ns"] == st.st_mtime_ns:
+            return cached["encoding"]
+        if cached["prefix_sha256"] == _prefix_sha256(csv_path):
+            return cached["encoding"]
+    
+    encoding = sniff_encoding(csv_path)
+    if cache is not None:
+        _remember_encoding(csv_path, encoding, cache)
+    logger.info(f"偵測編碼: {csv_path.name} -> {encoding}")
+    return encoding
+
+def _remember_encoding(csv_path: Path, encoding: str, cache: dict):
+    st = csv_path.stat()
+    cache[csv_path.as_posix()] = {
+        "encoding": encoding,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "prefix_sha256": _prefix_sha256(csv_path),
+    }
+
+def _encoding_candidates(encoding: str) -> list:
+    """偵測結果優先，其餘候選編碼只在整份解析途中出現解碼錯誤時才會用到"""
+    # 檔頭沒有 BOM 才會判定為 utf-8，此時 utf-8-sig 必然同樣失敗，不必再試
+    skip = {encoding, 'utf-8-sig'} if encoding == 'utf-8' else {encoding}
+    return [encoding] + [e for e in CANDIDATE_ENCODINGS if e not in skip]
+
 def convert_csv_to_md(csv_file_path: str, base_output_dir: str, 
-                      fill_na: bool = True, encoding: str = 'utf-8') -> bool:
+                      fill_na: bool = True, encoding: Optional[str] = None,
+                      chunksize: Optional[int] = None,
+                      encoding_cache: Optional[dict] = None,
+                      metrics: Optional[StageMetrics] = None) -> bool:
     """
     將單個 CSV 檔案轉換為 Markdown 檔案。
     
@@ -44,7 +210,10 @@ def convert_csv_to_md(csv_file_path: str, base_output_dir: str,
         csv_file_path: CSV 檔案路徑
         base_output_dir: 基礎輸出目錄 (knowledge/)
         fill_na: 是否填充 NaN 值
-        encoding: 檔案編碼
+        encoding: 檔案編碼，未指定時由檔頭自動偵測
+        chunksize: 設定時改用串流模式，每次只讀入這麼多列並逐批寫出
+        encoding_cache: 編碼快取（由批次轉換共用），未提供時讀寫 sidecar 檔
+        metrics: 提供時記錄列數與編碼快取命中次數
         
     Returns:
         bool: 轉換是否成功
@@ -55,40 +224,38 @@ def convert_csv_to_md(csv_file_path: str, base_output_dir: str,
         logger.error(f"CSV 檔案不存在: {csv_path}")
         return False
     
-    # 根據檔名決定輸出資料夾
-    product_folder = get_product_folder(csv_path.name)
-    output_dir = Path(base_output_dir) / "product" / product_folder
+    # 根據檔名決定輸出資料夾與檔名
+    output_file = get_output_path(csv_file_path, base_output_dir)
+    output_dir = output_file.parent
     
+    own_cache = encoding_cache is None and encoding is None
+    if own_cache:
+        encoding_cache = load_encoding_cache()
     try:
-        # 讀取 CSV，優先使用指定編碼
-        df = pd.read_csv(csv_path, encoding=encoding)
-        logger.info(f"成功讀取 CSV: {csv_path.name} (共 {len(df)} 行)")
-        
-    except UnicodeDecodeError:
-        # 嘗試其他常見編碼
-        encodings_to_try = ['utf-8-sig', 'big5', 'gb2312', 'cp1252', 'iso-8859-1']
-        df = None
+        if encoding is None:
+            cached = encoding_cache.get(csv_path.as_posix()) if encoding_cache is not None else None
+            encoding = detect_encoding(csv_path, encoding_cache)
+            if metrics is not None and cached is not None and encoding_cache.get(csv_path.as_posix()) is cached:
+                metrics.add(encoding_cache_hits=1)
         
-        for alt_encoding in encodings_to_try:
-            try:
-                df = pd.read_csv(csv_path, encoding=alt_encoding)
-                logger.info(f"使用 {alt_encoding} 編碼成功讀取: {csv_path.name}")
-                break
-            except (UnicodeDecodeError, Exception):
-                continue
+        if chunksize:
+            return _convert_csv_streaming(csv_path, output_file, fill_na, encoding, chunksize, encoding_cache,
+                                          metrics)
         
-        if df is None:
-            logger.error(f"嘗試多種編碼均失敗: {csv_path}")
-            return False
-            
-    except Exception as e:
-        logger.error(f"讀取 CSV 檔案失敗 {csv_path.name}: {e}")
+        df = _read_csv_once(csv_path, encoding, encoding_cache)
+    finally:
+        if own_cache:
+            save_encoding_cache(encoding_cache)
+    
+    if df is None:
         return False
     
     # 處理空 DataFrame
     if df.empty:
         logger.warning(f"CSV 檔案為空: {csv_path}")
         return False
+    if metrics is not None:
+        metrics.file(csv_path.name, rows=len(df))
     
     # 填充 NaN 值 - 修正 pandas 新版本的語法
     if fill_na:
@@ -100,9 +267,6 @@ def convert_csv_to_md(csv_file_path: str, base_output_dir: str,
     # 確保輸出目錄存在
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # 輸出檔案路徑與檔名
-    output_file = output_dir / f"{csv_path.stem}.md"
-    
     try:
         # 寫入檔案
         output_file.write_text(md_content, encoding='utf-8')
@@ -113,27 +277,178 @@ def convert_csv_to_md(csv_file_path: str, base_output_dir: str,
         logger.error(f"寫入檔案失敗 {output_file}: {e}")
         return False
 
-def _generate_markdown_content(df: pd.DataFrame, base_name: str) -> str:
-    """生成 Markdown 內容"""
-    content_parts = []
+def _read_csv_once(csv_path: Path, encoding: str, encoding_cache: Optional[dict]) -> Optional["pd.DataFrame"]:
+    """
+    以偵測到的編碼解析一次 CSV。只有檔頭之後才出現無法解碼的位元組時，
+    才改用下一個候選編碼重新解析，並更新快取。
+    """
+    import pandas as pd  # 延遲載入，所有 CSV 都未變動時不必付出載入成本
     
-    for index, row in df.iterrows():
-        # 添加標題
-        content_parts.append(f"## {base_name} - 條目 {index + 1}\n")
+    for candidate in _encoding_candidates(encoding):
+        try:
+            df = pd.read_csv(csv_path, encoding=candidate)
+        except UnicodeDecodeError as e:
+            logger.warning(f"以 {candidate} 解析失敗，改用下一個候選編碼: {csv_path.name} ({e})")
+            continue
+        except (OSError, ValueError) as e:  # pandas 的 ParserError、EmptyDataError 皆為 ValueError
+            logger.error(f"讀取 CSV 檔案失敗 {csv_path.name}: {e}")
+            return None
         
-        # 添加欄位內容
-        for column, value in row.items():
-            if pd.notna(value) and str(value).strip():  # 檢查非空且非空白
-                # 處理換行符號，讓 Markdown 格式更美觀
-                clean_value = str(value).replace('\n', ' ').replace('\r', '')
-                content_parts.append(f"**{column}**: {clean_value}")
+        if candidate != encoding and encoding_cache is not None:
+            _remember_encoding(csv_path, candidate, encoding_cache)
+        logger.info(f"成功讀取 CSV: {csv_path.name} (共 {len(df)} 行，編碼 {candidate})")
+        return df
+    
+    logger.error(f"嘗試多種編碼均失敗: {csv_path}")
+    return None
+
+def _convert_csv_streaming(csv_path: Path, output_file: Path, fill_na: bool,
+                           encoding: str, chunksize: int, encoding_cache: Optional[dict],
+                           metrics: Optional[StageMetrics] = None) -> bool:
+    """串流模式的轉換流程，只有串流途中出現解碼錯誤時才改用下一個候選編碼重新串流"""
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    
+    for candidate in _encoding_candidates(encoding):
+        try:
+            total_rows = _stream_markdown_content(csv_path, output_file, candidate, fill_na, chunksize)
+        except UnicodeDecodeError as e:
+            logger.warning(f"以 {candidate} 串流失敗，改用下一個候選編碼: {csv_path.name} ({e})")
+            continue
+        except (OSError, ValueError) as e:
+            logger.error(f"串流轉換失敗 {csv_path.name}: {e}")
+            return False
         
-        content_parts.append("---\n")  # 分隔線
+        if candidate != encoding and encoding_cache is not None:
+            _remember_encoding(csv_path, candidate, encoding_cache)
+        if not total_rows:
+            logger.warning(f"CSV 檔案為空: {csv_path}")
+            return False
+        if metrics is not None:
+            metrics.file(csv_path.name, rows=total_rows)
+        logger.info(f"成功串流轉換: {csv_path.name} -> {output_file} (共 {total_rows} 行，編碼 {candidate})")
+        return True
+    
+    logger.error(f"嘗試多種編碼均失敗: {csv_path}")
+    return False
+
+def _render_markdown_rows(df: "pd.DataFrame", base_name: str) -> list:
+    """
+    以欄為單位向量化產生每一列的 Markdown 文字，回傳各列字串。
+    
+    先以 df.to_numpy() 取得與 iterrows 相同的共同型別，
+    數值的字串格式（例如 1.0）才會和逐列處理時完全一致。
+    """
+    import numpy as np
+    import pandas as pd
+    
+    values = df.to_numpy()
+    row_numbers = pd.Series(df.index + 1).astype(str).to_numpy(dtype=object)
+    
+    # 添加標題
+    rows = f"## {base_name} - 條目 " + row_numbers + "\n\n"
+    
+    # 添加欄位內容
+    for position, column in enumerate(df.columns):
+        cells = pd.Series(values[:, position], dtype=object)
+        present = cells.notna().to_numpy()
+        text = cells.where(present, '').astype(str)
+        non_blank = (text.str.strip() != '').to_numpy(dtype=bool)  # 檢查非空且非空白
+        # 處理換行符號，讓 Markdown 格式更美觀
+        clean = text.str.replace('\n', ' ', regex=False).str.replace('\r', '', regex=False).to_numpy(dtype=object)
+        fields = f"**{column}**: " + clean + "\n"
+        rows = rows + np.where(present & non_blank, fields, "")
+    
+    rows = rows + "---\n"  # 分隔線
+    return rows.tolist()
+
+def _generate_markdown_content(df: "pd.DataFrame", base_name: str) -> str:
+    """生成 Markdown 內容"""
+    if df.empty:
+        return ""
+    return '\n'.join(_render_markdown_rows(df, base_name))
+
+def _merge_dtypes(previous, current):
+    """合併各批推斷出的欄位型別，與整份讀入時的推斷一致：整數遇到小數或空白為浮點數，混到文字即為文字"""
+    import numpy as np
+    
+    if previous == current:
+        return previous
+    numeric = [dtype.kind in "iuf" for dtype in (previous, current)]
+    if all(numeric):
+        return np.result_type(previous, current)
+    return np.dtype(object)
+
+def _stream_column_dtypes(csv_path: Path, encoding: str, chunksize: int):
+    """
+    先串流一次推斷各欄在整份讀入時的型別，回傳 (read_csv 的 dtype 對照, 第一列為空的欄位)。
+    文字欄改以 str 讀入，保留原始寫法（例如 1.50 不會變成 1.5）。
+    """
+    import numpy as np
+    import pandas as pd
+    
+    dtypes, leading_na = {}, set()
+    for chunk in pd.read_csv(csv_path, encoding=encoding, chunksize=chunksize):
+        if chunk.empty:
+            continue
+        if not dtypes:
+            leading_na = {column for column in chunk.columns if pd.isna(chunk[column].iloc[0])}
+        for column, dtype in chunk.dtypes.items():
+            dtypes[column] = _merge_dtypes(dtypes[column], dtype) if column in dtypes else dtype
+    return {column: (str if dtype == np.dtype(object) else dtype) for column, dtype in dtypes.items()}, leading_na
+
+def _stream_markdown_content(csv_path: Path, output_file: Path, encoding: str,
+                             fill_na: bool, chunksize: int) -> int:
+    """
+    以 chunksize 分批讀取 CSV 並逐批寫出 Markdown，記憶體只保留一批資料。
+    ffill 會帶入上一批最後一列的值，結果與整份讀入後再 ffill 相同。
+    各欄型別先由 _stream_column_dtypes 掃過一次決定，數值欄（如含空白的整數欄輸出 1.0）
+    與整份讀入的格式逐位元組相同；整份讀入時會變成 object 的資料表，每批也轉為 object 再輸出。
     
-    return '\n'.join(content_parts)
+    Returns:
+        int: 寫出的列數
+    """
+    import pandas as pd
+    
+    dtypes, leading_na = _stream_column_dtypes(csv_path, encoding, chunksize)
+    # 整份讀入後有文字欄，或 fillna('') 填入第一列的空白時，to_numpy() 的共同型別為 object
+    as_object = any(dtype is str for dtype in dtypes.values()) or (fill_na and bool(leading_na))
+    
+    tmp_file = output_file.with_name(output_file.name + ".tmp")
+    total_rows = 0
+    carry = None
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as out:
+            for chunk in pd.read_csv(csv_path, encoding=encoding, chunksize=chunksize, dtype=dtypes or None):
+                if chunk.empty:
+                    continue
+                if fill_na:
+                    if carry is not None:
+                        chunk = pd.concat([carry, chunk]).ffill().iloc[1:]
+                    else:
+                        chunk = chunk.ffill()
+                    carry = chunk.iloc[[-1]]
+                    chunk = chunk.fillna('')
+                if as_object:
+                    chunk = chunk.astype(object)
+                if total_rows:
+                    out.write('\n')
+                out.write('\n'.join(_render_markdown_rows(chunk, csv_path.stem)))
+                total_rows += len(chunk)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+    
+    if total_rows:
+        tmp_file.replace(output_file)
+    else:
+        tmp_file.unlink(missing_ok=True)
+    return total_rows
 
 def batch_convert_csv_to_md(input_dir: str, base_output_dir: str, 
-                           pattern: str = "*.csv") -> dict:
+                           pattern: str = "*.csv",
+                           manifest: Optional[BuildManifest] = None,
+                           chunksize: Optional[int] = None,
+                           metrics: Optional[StageMetrics] = None) -> dict:
     """
     批次轉換目錄中的所有 CSV 檔案
     
@@ -141,6 +456,9 @@ def batch_convert_csv_to_md(input_dir: str, base_output_dir: str,
         input_dir: 輸入目錄
         base_output_dir: 基礎輸出目錄 (knowledge/)
         pattern: 檔案匹配模式
+        manifest: 建置清單，提供時只轉換內容有變動的 CSV
+        chunksize: 設定時以串流模式轉換，每次讀入這麼多列
+        metrics: 提供時記錄各檔案的耗時、列數與輸入輸出位元組數（tools/metrics.py）
         
     Returns:
         dict: 轉換結果統計
@@ -149,7 +467,7 @@ def batch_convert_csv_to_md(input_dir: str, base_output_dir: str,
     
     if not input_path.exists():
         logger.error(f"輸入目錄不存在: {input_path}")
-        return {"success": 0, "failed": 0, "total": 0}
+        return {"success": 0, "failed": 0, "skipped": 0, "total": 0}
     
     # 找到所有 CSV 檔案 - 使用遞迴搜尋並處理路徑格式
     csv_files = []
@@ -167,25 +485,61 @@ def batch_convert_csv_to_md(input_dir: str, base_output_dir: str,
         if input_path.is_dir():
             all_files = [f.name for f in input_path.iterdir() if f.is_file()]
             logger.info(f"目錄中的檔案: {all_files[:10]}...")  # 只顯示前10個檔案
-        return {"success": 0, "failed": 0, "total": 0}
+        return {"success": 0, "failed": 0, "skipped": 0, "total": 0}
     
     logger.info(f"找到 {len(csv_files)} 個 CSV 檔案")
     
     # 批次處理
-    results = {"success": 0, "failed": 0, "total": len(csv_files)}
+    results = {"success": 0, "failed": 0, "skipped": 0, "total": len(csv_files)}
+    encoding_cache = load_encoding_cache()
     
     for csv_file in csv_files:
+        if manifest is not None and manifest.is_up_to_date(MANIFEST_STAGE, str(csv_file), TOOL_VERSION):
+            logger.info(f"未變動，略過: {csv_file.name}")
+            results["skipped"] += 1
+            continue
+        
         logger.info(f"處理檔案: {csv_file.name}")
         
-        if convert_csv_to_md(str(csv_file), base_output_dir):
+        started = time.perf_counter() if metrics is not None else 0.0
+        converted = convert_csv_to_md(str(csv_file), base_output_dir, chunksize=chunksize,
+                                      encoding_cache=encoding_cache, metrics=metrics)
+        if metrics is not None:
+            output_file = get_output_path(str(csv_file), base_output_dir)
+            metrics.file(csv_file.name, seconds=time.perf_counter() - started, bytes_in=csv_file.stat().st_size,
+                         bytes_out=output_file.stat().st_size if converted else 0)
+        if converted:
             results["success"] += 1
+            if manifest is not None:
+                output_file = get_output_path(str(csv_file), base_output_dir)
+                manifest.record(MANIFEST_STAGE, str(csv_file), TOOL_VERSION, [str(output_file)])
         else:
             results["failed"] += 1
     
+    if manifest is not None:
+        manifest.prune(MANIFEST_STAGE, [str(f) for f in csv_files])
+    
+    # 只保留仍存在的 CSV 的編碼記錄
+    existing = {f.as_posix() for f in csv_files}
+    pruned_cache = {k: v for k, v in encoding_cache.items() if k in existing}
+    if pruned_cache != load_encoding_cache():
+        save_encoding_cache(pruned_cache)
+    if metrics is not None:
+        metrics.add(files=results["total"], converted=results["success"], skipped=results["skipped"],
+                    failed=results["failed"])
+    
     return results
 
 def main():
     """主程式"""
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    parser = argparse.ArgumentParser(description="將 CSV 轉換為 Markdown")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="以串流模式轉換，每次讀入的列數（大型 CSV 可降低記憶體用量）")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    metrics = metrics_from_args(args)
+    
     # 設定路徑
     csv_input_dir = 'original_file/csvs/'
     base_output_dir = 'knowledge/'  # 改為基礎目錄，讓程式自動分配子資料夾
@@ -197,14 +551,18 @@ def main():
     for product, folder in PRODUCT_FOLDER_MAP.items():
         logger.info(f"  {product} -> {base_output_dir}product/{folder}/")
     
-    # 執行批次轉換
-    results = batch_convert_csv_to_md(csv_input_dir, base_output_dir)
+    # 執行批次轉換（以建置清單略過未變動的 CSV）
+    with BuildManifest() as manifest, stage_metrics(metrics, MANIFEST_STAGE) as stage:
+        results = batch_convert_csv_to_md(csv_input_dir, base_output_dir, manifest=manifest,
+                                          chunksize=args.chunksize, metrics=stage)
+    write_metrics(metrics, args)
     
     # 輸出結果
     logger.info("=" * 50)
     logger.info("轉換完成!")
     logger.info(f"總檔案數: {results['total']}")
     logger.info(f"成功: {results['success']}")
+    logger.info(f"略過: {results['skipped']}")
     logger.info(f"失敗: {results['failed']}")
     
     if results['failed'] > 0:
@@ -0,0 +1,270 @@
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import unicodedata
+from typing import Dict, List, Optional
+
+from build_manifest import write_if_changed
+
+# 近似重複偵測結果（與 index.json 一起產生）
+INDEX_DATA_DIR = "knowledge_index"
+DUPLICATES_FILE = os.path.join(INDEX_DATA_DIR, "chunk_duplicates.json")
+DUPLICATES_FORMAT_VERSION = 2
+
+# MinHash 參數：以 SHINGLE_SIZE 個字元為一個 shingle，簽章長度 SIGNATURE_SIZE，
+# LSH 切成 LSH_BANDS 段（每段 SIGNATURE_SIZE // LSH_BANDS 個值），估計 Jaccard 達 DEFAULT_THRESHOLD 才視為重複
+SHINGLE_SIZE = 5
+SIGNATURE_SIZE = 64
+LSH_BANDS = 16
+DEFAULT_THRESHOLD = 0.8
+# 同一個 LSH 桶內，每個 chunk 最多與幾個先前的成員比對
+MAX_BUCKET_COMPARISONS = 16
+# 每批計算簽章的字元數上限，控制記憶體用量
+BATCH_CODEPOINTS = 8_000_000
+
+_BIN_BITS = 6  # 2 ** 6 == SIGNATURE_SIZE
+_VALUE_MASK = (1 << (64 - _BIN_BITS)) - 1
+_WHITESPACE_RE = re.compile(r"\s+")
+# 標題行（如「## 威德益生菌FAQ - 條目 41」）只是位置標籤，不列入相似度比對
+_HEADING_RE = re.compile(r"(?m)^#.*$")
+# 「**欄位**: 值」形式的短欄位（問題、類別等）必須完全相同才算重複，
+# 避免共用同一段制式答案的不同問題被合併（合併後問題只剩在 aliases 中，檢索與分面都看不到）
+_FIELD_LINE_RE = re.compile(r"^\*\*(?P<field>[^*]+)\*\*:\s*(?P<value>.*)$")
+MAX_KEY_FIELD_CHARS = 100
+# 去除標題後內容太短（如只剩分隔線的空條目）的 chunk 不參與比對，以免不同來源的空條目被合併
+MIN_DEDUP_CHARS = 20
+
+
+def normalize_text(text: str) -> str:
+    """NFKC 正規化並將連續空白縮成一個空格，避免排版差異影響比對"""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def dedup_text(text: str) -> str:
+    """用於 MinHash 的文字：去除標題行後正規化"""
+    return normalize_text(_HEADING_RE.sub("", text))
+
+
+def field_key(text: str) -> tuple:
+    """chunk 中所有短欄位（值不超過 MAX_KEY_FIELD_CHARS 字）組成的鍵，鍵不同的 chunk 不會被視為重複"""
+    fields = []
+    for line in text.splitlines():
+        match = _FIELD_LINE_RE.match(line.strip())
+        if match:
+            value = normalize_text(match.group("value"))
+            if len(value) <= MAX_KEY_FIELD_CHARS:
+                fields.append((match.group("field").strip(), value))
+    return tuple(sorted(fields))
+
+
+def _mix64(h):
+    """64 位元雜湊的最終混合（murmur3 fmix64），讓高位元也分布均勻"""
+    import numpy as np
+
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(0xFF51AFD7ED558CCD)
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(0xC4CEB9FE1A85EC53)
+    h ^= h >> np.uint64(33)
+    return h
+
+
+def _signature_batch(texts: List[str]):
+    """
+    以 one-permutation MinHash 計算一批文字的簽章：每個 shingle 只雜湊一次，
+    以雜湊值的高 6 位元分到 64 個桶、桶內取最小值。所有運算以 numpy 向量化，
+    總成本與字元數成正比。
+    """
+    import numpy as np
+
+    k = SHINGLE_SIZE
+    lengths = np.array([max(len(t), k) for t in texts], dtype=np.int64)
+    # 以 UTF-32 取得每個字元的碼位，不足 k 個字元的文字補 0，讓每份文字至少有一個 shingle
+    codepoints = np.frombuffer("".join(t.ljust(k, "\0") for t in texts).encode("utf-32-le"),
+                               dtype=np.uint32).astype(np.uint64)
+
+    positions = len(codepoints) - k + 1
+    h = codepoints[:positions].copy()
+    prime = np.uint64(1099511628211)
+    for j in range(1, k):
+        h *= prime
+        h += codepoints[j:j + positions]
+    h = _mix64(h)
+
+    # 只保留完全落在同一份文字內的 shingle
+    counts = lengths - k + 1
+    starts = np.cumsum(lengths) - lengths
+    doc_ids = np.repeat(np.arange(len(texts)), counts)
+    valid = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    h = h[valid]
+
+    bins = (h >> np.uint64(64 - _BIN_BITS)).astype(np.int64)
+    values = h & np.uint64(_VALUE_MASK)
+    empty = np.uint64(_VALUE_MASK + 1)
+    signatures = np.full(len(texts) * SIGNATURE_SIZE, empty, dtype=np.uint64)
+    np.minimum.at(signatures, doc_ids * SIGNATURE_SIZE + bins, values)
+    signatures = signatures.reshape(len(texts), SIGNATURE_SIZE)
+
+    # 較短的文字可能有空桶：沿用右側第一個非空桶的值（加上位移量以免與該桶相同）
+    for row in np.nonzero((signatures == empty).any(axis=1))[0]:
+        sig = signatures[row]
+        filled = np.nonzero(sig != empty)[0]
+        for b in np.nonzero(sig == empty)[0]:
+            source = filled[np.searchsorted(filled, b) % len(filled)]
+            sig[b] = sig[source] + np.uint64(((source - b) % SIGNATURE_SIZE) << (64 - _BIN_BITS))
+    return signatures
+
+
+def minhash_signatures(texts: List[str]):
+    """計算所有文字的 MinHash 簽章（n × SIGNATURE_SIZE 的 uint64 陣列），依字元數分批處理"""
+    import numpy as np
+
+    batches = []
+    start = 0
+    while start < len(texts):
+        end = start
+        size = 0
+        while end < len(texts) and (end == start or size + len(texts[end]) <= BATCH_CODEPOINTS):
+            size += len(texts[end])
+            end += 1
+        batches.append(_signature_batch(texts[start:end]))
+        start = end
+    if not batches:
+        return np.zeros((0, SIGNATURE_SIZE), dtype=np.uint64)
+    return np.vstack(batches)
+
+
+def _candidate_pairs(signatures) -> Dict[int, set]:
+    """
+    以 LSH 找出候選組合，回傳 {編號: {與其同桶、編號較小的候選, ...}}。
+    每一段（band）的簽章值合成一個鍵，排序後鍵相同者即為同一個桶。
+    """
+    import numpy as np
+
+    count = len(signatures)
+    candidates: Dict[int, set] = {}
+    rows = SIGNATURE_SIZE // LSH_BANDS
+    prime = np.uint64(1099511628211)
+    for band in range(LSH_BANDS):
+        keys = np.zeros(count, dtype=np.uint64)
+        for column in range(band * rows, (band + 1) * rows):
+            keys = keys * prime + signatures[:, column]
+        order = np.argsort(keys, kind="stable")  # 同桶內依編號排序
+        sorted_keys = keys[order]
+        # 只逐一處理與前一筆同桶的位置，其餘（絕大多數）的桶只有一個成員
+        same = np.concatenate([[False], sorted_keys[1:] == sorted_keys[:-1]])
+        bucket_starts = np.maximum.accumulate(np.where(same, 0, np.arange(count)))
+        for position in np.nonzero(same)[0]:
+            first = max(bucket_starts[position], position - MAX_BUCKET_COMPARISONS)
+            candidates.setdefault(int(order[position]), set()).update(int(i) for i in order[first:position])
+    return candidates
+
+
+def cluster_signatures(signatures, threshold: float = DEFAULT_THRESHOLD,
+                       keys: Optional[List[tuple]] = None) -> List[int]:
+    """
+    回傳每筆所屬群組的代表（群組中最小的編號）。依編號順序處理，每一筆只有在與某個群組的代表
+    估計 Jaccard 相似度達門檻（且 keys 相同）時才加入該群組，不會經由中間成員一路串連出不相似的組合。
+    """
+    import numpy as np
+
+    candidates = _candidate_pairs(signatures)
+    representatives = list(range(len(signatures)))
+    needed = threshold * SIGNATURE_SIZE
+    for member in sorted(candidates):
+        for representative in sorted({representatives[i] for i in candidates[member]}):
+            if keys is not None and keys[representative] != keys[member]:
+                continue
+            if np.count_nonzero(signatures[member] == signatures[representative]) >= needed:
+                representatives[member] = representative
+                break
+    return representatives
+
+
+def find_near_duplicates(documents: Dict[str, str], threshold: float = DEFAULT_THRESHOLD) -> Dict[str, List[str]]:
+    """
+    找出近似重複的 chunk。documents 為 {chunk 路徑: 內文}，依傳入順序決定代表：
+    每個群組保留最先出現的 chunk，回傳 {代表 chunk: [重複的 chunk, ...]}（只列出有重複的群組）。
+    標題行不列入比對，短欄位（見 field_key）不同的 chunk 不會合併。
+    """
+    texts = {f: dedup_text(text) for f, text in documents.items()}
+    files = [f for f in documents if len(texts[f]) >= MIN_DEDUP_CHARS]
+    signatures = minhash_signatures([texts[f] for f in files])
+    roots = cluster_signatures(signatures, threshold, [field_key(documents[f]) for f in files])
+
+    clusters: Dict[str, List[str]] = {}
+    for i, root in enumerate(roots):
+        if root != i:
+            clusters.setdefault(files[root], []).append(files[i])
+    return clusters
+
+
+def _fingerprint(chunk_files: List[str], manifest, threshold: float) -> str:
+    params = (SHINGLE_SIZE, SIGNATURE_SIZE, LSH_BANDS, threshold, MAX_KEY_FIELD_CHARS, MIN_DEDUP_CHARS)
+    digest = hashlib.sha256(":".join(map(str, params)).encode("utf-8"))
+    for chunk_file in chunk_files:
+        digest.update(f"{chunk_file}\0{manifest.file_hash(chunk_file)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def dedup_chunks(chunk_files: List[str], manifest=None, output_file: str = DUPLICATES_FILE,
+                 threshold: float = DEFAULT_THRESHOLD,
+                 texts: Optional[Dict[str, str]] = None) -> Dict[str, List[str]]:
+    """
+    對 chunk 清單（依 index.json 的順序，路徑為相對路徑）做近似重複偵測並寫出 chunk_duplicates.json。
+    有提供 manifest 時，chunk 內容與參數都沒變就直接沿用上次的結果。
+    texts 為上游階段已讀入的 chunk 內文（見 search_index._read_chunk），其中沒有的才讀檔。
+
+    Returns:
+        dict: {代表 chunk: [重複的 chunk, ...]}
+    """
+    fingerprint = None
+    if manifest is not None:
+        fingerprint = _fingerprint(chunk_files, manifest, threshold)
+        try:
+            with open(output_file, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            if previous.get("version") == DUPLICATES_FORMAT_VERSION and previous.get("fingerprint") == fingerprint:
+                print(f"⏭️ chunk 未變動，沿用近似重複結果：{output_file}")
+                return previous["clusters"]
+        except (OSError, ValueError):
+            pass
+
+    from search_index import _read_chunk
+
+    started = time.perf_counter()
+    documents = {chunk_file: _read_chunk(chunk_file, texts) for chunk_file in chunk_files}
+    clusters = find_near_duplicates(documents, threshold)
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    data = {"version": DUPLICATES_FORMAT_VERSION, "fingerprint": fingerprint, "threshold": threshold,
+            "clusters": clusters}
+    write_if_changed(output_file, json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8"))
+
+    duplicates = sum(len(aliases) for aliases in clusters.values())
+    print(f"✅ 近似重複偵測：{len(chunk_files)} 個 chunk 中有 {duplicates} 個重複，"
+          f"歸併為 {len(clusters)} 組（{time.perf_counter() - started:.3f}s）")
+    return clusters
+
+
+def main():
+    from generate_index import list_chunk_files
+
+    parser = argparse.ArgumentParser(description="以 MinHash/LSH 找出近似重複的 chunk")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="視為重複的 Jaccard 相似度門檻")
+    parser.add_argument("--show", action="store_true", help="列出每一組重複")
+    args = parser.parse_args()
+
+    clusters = dedup_chunks(list_chunk_files(), threshold=args.threshold)
+    if args.show:
+        for canonical, aliases in clusters.items():
+            print(f"\n{canonical}")
+            for alias in aliases:
+                print(f"  = {alias}")
+
+
+if __name__ == "__main__":
+    main()
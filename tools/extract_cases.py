@@ -0,0 +1,479 @@
+import os
+import re
+import sqlite3
+import argparse
+import urllib.parse
+from typing import Optional
+
+from build_manifest import BuildManifest
+
+# 處罰案件統計表轉出的 Markdown 來源與結構化資料庫位置
+SOURCE_MD_DIR = "knowledge/law"
+INDEX_DATA_DIR = "knowledge_index"
+CASES_DB_FILE = os.path.join(INDEX_DATA_DIR, "violation_cases.sqlite")
+
+# 建置清單中的階段名稱與工具版本（解析規則變動時請遞增版本，所有檔案會被重新解析）
+MANIFEST_STAGE = "extract_cases"
+TOOL_VERSION = "3"
+
+# 產品名稱超過此長度多半混入了其他案件的描述
+MAX_PRODUCT_NAME_CHARS = 80
+
+# 常用的法規簡稱，查詢時可直接使用
+LAW_ALIASES = {
+    "食安法": "食品安全衛生管理法",
+    "健康食品法": "健康食品管理法",
+    "化粧品法": "化粧品衛生安全管理法",
+    "醫材法": "醫療器材管理法",
+}
+
+# 「來源」欄位可能出現的值
+SOURCES = ["網站", "電視", "廣播", "報紙", "雜誌", "平面", "立牌", "宣傳單張", "其他"]
+
+_DATE_RE = re.compile(r"(\d{2,3})/(\d{1,2})/(\d{1,2})")
+_SOURCE_AT_END_RE = re.compile(r"(%s)\s*$" % "|".join(SOURCES))
+_SOURCE_AT_START_RE = re.compile(r"^\s*(%s)" % "|".join(SOURCES))
+_ITEM_NO_RE = re.compile(r"項次\s*(\d+)")
+# 正向排列的列以「項次 發文日期」開頭（如 12 114/04/16，手動整理過的為「## 項次12 114/04/16」），
+# 用來定位每一案的項次與日期
+_ROW_ANCHOR_RE = re.compile(r"(?m)^[#\s]*(?:項次\s*)?(?P<item>\d{1,3})\s*(?P<date>\d{2,3}/\d{1,2}/\d{1,2})")
+# 違規情節固定以「受處分人」開頭，每一案恰好出現一次
+_DESC_MARK = "受處分人"
+# 產品名稱中出現描述、日期或法條，表示混入了其他案件的欄位
+_MIXED_PRODUCT_RE = re.compile(_DESC_MARK + r"|\d{2,3}/\d{1,2}/\d{1,2}|法\s*(?:\([^)]*\))?\s*第\s*\d+\s*條")
+# 違規情節之後依序為：處分商號名稱、罰鍰金額、罰則、排名（PDF 轉出後會黏在一起）。
+# 排名只有一兩位數，其後可能直接黏著下一案的罰鍰（如 2700,000 為排名 2 與 700,000）
+_FINE_RE = r"(?P<fine>[1-9]\d{0,2}(?:,\d{3})+)"
+_RANK_RE = r"(?:(?P<rank>\d{1,2})(?=[1-9]\d{0,2},\d{3}|[^\d,]|$))?"
+_TAIL_RE = re.compile(
+    r"(?P<company>[^。]*?)" + _FINE_RE
+    + r"(?P<penalty>\D[^。]*?[條項款](?:\s*第\s*\d+\s*[項款])*)" + _RANK_RE
+)
+# 反向排列的列（「商號 罰鍰 罰則 排名 來源 產品名稱 日期 項次」）整段黏在前置欄位開頭；
+# 罰則須含法規名稱，避免把產品名稱中的數量（如 1,000mg）誤判為罰鍰
+_PREFIX_TAIL_RE = re.compile(
+    r"\s*(?P<company>[^。/]*?)\s*" + _FINE_RE
+    + r"(?P<penalty>\D[^。/]*?法[^。/]*?第\s*\d+\s*條(?:\s*第\s*\d+\s*[項款])*)\s*" + _RANK_RE
+)
+_LAW_IN_TEXT_RE = re.compile(
+    r"違反\s*(?P<law>[一-鿿]+?法)\s*(?:\([^)]*\)|（[^）]*）)?\s*"
+    r"第\s*(?P<article>\d+(?:-\d+)?)\s*條(?:\s*之\s*(?P<sub>\d+))?(?:\s*第\s*(?P<para>\d+)\s*項)?"
+)
+_COMPANY_IN_TEXT_RE = re.compile(
+    r"受處分人\s*(?P<company>[^，,。（(於]{2,40}?"
+    r"(?:股份有限公司|有限公司|分公司|公司|商行|商號|診所|藥局|藥房|企業社|工作室|醫院|社)"
+    r"(?:[^，,。（(於]{1,6}?分公司)?)"  # 外商的在臺分公司，如「…股份有限公司臺灣分公司」
+)
+# 每頁頂端重複的表頭（前面常黏著上一頁的頁碼，頁碼可能獨立一行）
+_COLUMN_HEADER_RE = r"項次\s*裁處書\s*發文日期.{0,60}?排名"
+_TITLE_PERIOD_RE = re.compile(r"(\d{2,3})\s*年\s*(\d{1,2})\s*月")
+_TITLE_CITY_RE = re.compile(r"(\S{2,3}[市縣])政府")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    id INTEGER PRIMARY KEY,
+    source_file TEXT NOT NULL,
+    city TEXT,
+    year INTEGER,
+    month INTEGER,
+    domain TEXT,
+    item_no INTEGER,
+    issued_date TEXT,
+    product_name TEXT,
+    source TEXT,
+    violation TEXT,
+    company TEXT,
+    fine INTEGER,
+    law_name TEXT,
+    law_article TEXT,
+    penalty TEXT,
+    rank INTEGER,
+    flags TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cases_source_file ON cases(source_file);
+CREATE INDEX IF NOT EXISTS idx_cases_issued_date ON cases(issued_date);
+CREATE INDEX IF NOT EXISTS idx_cases_company ON cases(company);
+CREATE INDEX IF NOT EXISTS idx_cases_law ON cases(law_name, law_article);
+CREATE INDEX IF NOT EXISTS idx_cases_fine ON cases(fine);
+"""
+
+_COLUMNS = [
+    "source_file", "city", "year", "month", "domain", "item_no", "issued_date",
+    "product_name", "source", "violation", "company", "fine", "law_name",
+    "law_article", "penalty", "rank", "flags",
+]
+
+
+def _join_lines(text: str) -> str:
+    """PDF 轉出的文字會在欄位中任意斷行，合併後再整理多餘空白"""
+    return re.sub(r"[ \t　]+", " ", text.replace("\r", "").replace("\n", "")).strip()
+
+
+def _strip_page_headers(text: str, title: str) -> str:
+    """移除每頁重複出現的標題與表頭，避免混入案件欄位"""
+    title_pattern = r"\s*".join(re.escape(ch) for ch in title.replace(" ", ""))
+    header_re = re.compile(r"\d*\s*" + title_pattern + r"\s*" + _COLUMN_HEADER_RE, re.S)
+    text = header_re.sub("\n", text)
+    return re.sub(_COLUMN_HEADER_RE, "\n", text, flags=re.S)
+
+
+def roc_to_iso(year: str, month: str, day: str) -> str:
+    """民國日期轉西元 ISO 日期，例如 114/04/16 → 2025-04-16"""
+    return f"{int(year) + 1911:04d}-{int(month):02d}-{int(day):02d}"
+
+
+def classify_domain(title: str) -> str:
+    """依統計表標題判斷違規類別"""
+    if "化粧品" in title:
+        return "化粧品"
+    if "食品" in title:
+        return "食品"
+    if "藥品" in title or "醫療器材" in title:
+        return "藥品醫療器材"
+    return "其他"
+
+
+def normalize_law(law_name: str, article: str, sub: Optional[str] = None,
+                  para: Optional[str] = None) -> str:
+    """組成標準化的法條字串，例如 醫療器材管理法第46條、藥事法第66條第2項"""
+    result = f"{law_name}第{article}條"
+    if sub:
+        result += f"之{sub}"
+    if para:
+        result += f"第{para}項"
+    return result
+
+
+def _tail_fields(match) -> dict:
+    return {
+        "company": _join_lines(match.group("company")) or None,
+        "fine": int(match.group("fine").replace(",", "")),
+        "penalty": _join_lines(match.group("penalty")).replace(" ", ""),
+        "rank": int(match.group("rank")) if match.group("rank") else None,
+    }
+
+
+def _parse_prefix(prefix: str) -> dict:
+    """
+    解析案件描述前的欄位：項次、發文日期、產品名稱、來源。
+    PDF 轉出的欄位順序不固定，常見兩種：
+        「項次 日期 產品名稱 來源」以及「來源 產品名稱 日期 項次」
+    反向排列的列連處分商號、罰鍰、罰則與排名也在前面，一併解析。
+    """
+    prefix = _join_lines(prefix)
+    record = {"item_no": None, "issued_date": None, "product_name": None, "source": None,
+              "company": None, "fine": None, "penalty": None, "rank": None}
+
+    tail_match = _PREFIX_TAIL_RE.match(prefix)
+    if tail_match:
+        record.update(_tail_fields(tail_match))
+        prefix = prefix[tail_match.end():]
+
+    item_match = _ITEM_NO_RE.search(prefix)
+    if item_match:
+        record["item_no"] = int(item_match.group(1))
+        prefix = prefix[:item_match.start()] + " " + prefix[item_match.end():]
+
+    before, after = prefix, ""
+    date_match = _DATE_RE.search(prefix)
+    if date_match:
+        record["issued_date"] = roc_to_iso(*date_match.groups())
+        before, after = prefix[:date_match.start()], prefix[date_match.end():]
+
+    if record["item_no"] is None:
+        if re.fullmatch(r"\s*\d+\s*", before):
+            record["item_no"], before = int(before), ""
+        elif re.fullmatch(r"\s*\d+\s*", after):
+            record["item_no"], after = int(after), ""
+
+    rest = f"{before} {after}".strip()
+    source_match = _SOURCE_AT_END_RE.search(rest) or _SOURCE_AT_START_RE.search(rest)
+    if source_match:
+        record["source"] = source_match.group(1)
+        rest = rest[:source_match.start()] + rest[source_match.end():]
+
+    product_name = re.sub(r"^[#\s]+", "", rest).strip()
+    record["product_name"] = product_name or None
+    return record
+
+
+def _flag_record(record: dict) -> None:
+    """
+    檢查欄位錯位的跡象，記錄於 flags（逗號分隔）：
+    缺少罰鍰、項次或發文日期，或產品名稱混入其他案件的欄位（含描述、日期、法條或過長）。
+    混入描述的產品名稱直接捨棄，避免錯誤內容流入彙總統計與 facet。
+    """
+    flags = []
+    if record["fine"] is None:
+        flags.append("missing_fine")
+    if record["item_no"] is None:
+        flags.append("missing_item_no")
+    if record["issued_date"] is None:
+        flags.append("missing_date")
+    product_name = record["product_name"]
+    if product_name and (_MIXED_PRODUCT_RE.search(product_name) or len(product_name) > MAX_PRODUCT_NAME_CHARS):
+        flags.append("bad_product_name")
+        record["product_name"] = None
+    record["flags"] = ",".join(flags) or None
+
+
+def parse_violation_cases(filepath: str) -> list:
+    """
+    將一份處罰案件統計表 Markdown 解析為逐案的結構化記錄。
+
+    每個「受處分人」恰為一案：「受處分人…。」為違規情節，其後依序為處分商號、罰鍰金額、罰則與排名。
+    項次與發文日期取自該案之前最後一個以「項次 發文日期」開頭的列，找不到時（欄位反向排列）
+    才由前置欄位推斷。PDF 轉出的欄位可能缺漏或錯位，無法解析的欄位保留為 None 並記錄於 flags。
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    title = _join_lines(text.split("\n", 1)[0]).lstrip("#").strip()
+    filename = os.path.basename(filepath)
+    period_match = _TITLE_PERIOD_RE.search(title) or _TITLE_PERIOD_RE.search(filename)
+    city_match = _TITLE_CITY_RE.search(title) or _TITLE_CITY_RE.search(filename)
+    file_fields = {
+        "source_file": filename,
+        "city": city_match.group(1) if city_match else None,
+        "year": int(period_match.group(1)) + 1911 if period_match else None,
+        "month": int(period_match.group(2)) if period_match else None,
+        "domain": classify_domain(title or filename),
+    }
+
+    if title:
+        text = _strip_page_headers(text, title)
+
+    desc_starts = [m.start() for m in re.finditer(_DESC_MARK, text)]
+    rows = list(_ROW_ANCHOR_RE.finditer(text))
+
+    # 第一案的前置欄位從表頭之後開始（表頭已移除，標題若仍在則只出現在第一行）
+    prefix_start = text.find("\n") + 1 if title and text.startswith(title.split()[0]) else 0
+
+    records = []
+    for i, desc_start in enumerate(desc_starts):
+        # 描述止於下一列的「項次 發文日期」或下一個「受處分人」，之後屬於下一案
+        next_desc = desc_starts[i + 1] if i + 1 < len(desc_starts) else len(text)
+        next_row = next((m.start() for m in rows if desc_start < m.start() < next_desc), next_desc)
+        region = text[desc_start:next_row]
+
+        # 手動整理過的 Markdown 以標題分隔各案，標題之後屬於下一案
+        heading_pos = region.find("\n#")
+        body = region if heading_pos < 0 else region[:heading_pos]
+        rest = len(region) if heading_pos < 0 else heading_pos
+
+        record = dict(file_fields)
+        row_match = None
+        for match in rows:
+            if prefix_start <= match.start() and match.end() <= desc_start:
+                row_match = match
+        if row_match:
+            # 正向排列的列：項次、日期之後為產品名稱與來源，之前是上一案殘留的欄位
+            record.update(_parse_prefix(text[row_match.end():desc_start]))
+            record["item_no"] = int(row_match.group("item"))
+            record["issued_date"] = roc_to_iso(*_DATE_RE.match(row_match.group("date")).groups())
+        else:
+            record.update(_parse_prefix(text[prefix_start:desc_start]))
+        record.update({"violation": None, "law_name": None, "law_article": None})
+
+        period_pos = body.rfind("。")
+        if record["fine"] is not None:
+            # 反向排列：欄位已在前置欄位取得，最後一個句號之後屬於下一案的前置欄位
+            end = period_pos + 1 if period_pos >= 0 else rest
+            violation, prefix_start = body[:end], desc_start + end
+        else:
+            # 情節內可能還有句號，由後往前找第一個接得上欄位的句號
+            tail_match = None
+            while period_pos >= 0:
+                tail_match = _TAIL_RE.match(body, period_pos + 1)
+                if tail_match:
+                    break
+                period_pos = body.rfind("。", 0, period_pos)
+            if tail_match:
+                violation = body[:period_pos + 1]
+                record.update(_tail_fields(tail_match))
+                prefix_start = desc_start + tail_match.end()
+            else:
+                violation = body
+                prefix_start = desc_start + rest
+
+        record["violation"] = _join_lines(violation)
+
+        # 「受處分人」之後的名稱最可靠，欄位錯位時商號欄常混入其他案件的文字
+        company_match = _COMPANY_IN_TEXT_RE.match(record["violation"])
+        if company_match:
+            record["company"] = company_match.group("company").strip()
+
+        law_match = _LAW_IN_TEXT_RE.search(record["violation"]) or (
+            _LAW_IN_TEXT_RE.search("違反" + record["penalty"]) if record["penalty"] else None)
+        if law_match:
+            record["law_name"] = law_match.group("law")
+            record["law_article"] = normalize_law(law_match.group("law"), law_match.group("article"),
+                                                  law_match.group("sub"), law_match.group("para"))
+
+        _flag_record(record)
+        records.append(record)
+
+    return records
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """開啟資料庫供寫入；舊版資料表欄位不符時整個重建（呼叫端須重新解析所有檔案）"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    existing = [row["name"] for row in conn.execute("PRAGMA table_info(cases)")]
+    if existing and existing[1:] != _COLUMNS:
+        conn.execute("DROP TABLE cases")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _schema_is_current(db_path: str) -> bool:
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[1] for row in conn.execute("PRAGMA table_info(cases)")][1:] == _COLUMNS
+    finally:
+        conn.close()
+
+
+def build_case_store(source_dir: str = SOURCE_MD_DIR, db_path: str = CASES_DB_FILE,
+                     manifest: Optional[BuildManifest] = None) -> dict:
+    """
+    解析 source_dir 下所有統計表，寫入 SQLite 的 cases 資料表。
+    有提供 manifest 時只重新解析有變動的檔案；資料庫不存在或資料表為舊版時一律全部重建。
+
+    欄位疑似錯位的案件（見 _flag_record）印出警告並記錄於 flags 欄位，方便人工檢查來源。
+
+    Returns:
+        dict: {"parsed", "skipped", "removed", "cases", "flagged"}
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    db_exists = os.path.exists(db_path) and _schema_is_current(db_path)
+
+    md_files = sorted(
+        os.path.join(source_dir, f) for f in os.listdir(source_dir) if f.endswith(".md")
+    )
+    results = {"parsed": 0, "skipped": 0, "removed": 0, "cases": 0, "flagged": 0}
+
+    conn = _connect(db_path)
+    try:
+        with conn:
+            for md_path in md_files:
+                if (manifest is not None and db_exists
+                        and manifest.is_up_to_date(MANIFEST_STAGE, md_path, TOOL_VERSION)):
+                    results["skipped"] += 1
+                    continue
+
+                records = parse_violation_cases(md_path)
+                conn.execute("DELETE FROM cases WHERE source_file = ?", (os.path.basename(md_path),))
+                conn.executemany(
+                    f"INSERT INTO cases ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    [tuple(r[c] for c in _COLUMNS) for r in records],
+                )
+                if manifest is not None:
+                    manifest.record(MANIFEST_STAGE, md_path, TOOL_VERSION)
+                results["parsed"] += 1
+                print(f"✅ 已解析：{os.path.basename(md_path)}（{len(records)} 案）")
+                flagged = [r for r in records if r["flags"]]
+                if flagged:
+                    results["flagged"] += len(flagged)
+                    print(f"⚠️ {os.path.basename(md_path)}：{len(flagged)} 案欄位可能錯位，"
+                          + "；".join(f"項次 {r['item_no'] if r['item_no'] is not None else '?'}（{r['flags']}）"
+                                     for r in flagged))
+
+            # 來源已刪除的統計表，一併移除其案件
+            current = {os.path.basename(p) for p in md_files}
+            stale = [row[0] for row in conn.execute("SELECT DISTINCT source_file FROM cases")
+                     if row[0] not in current]
+            for source_file in stale:
+                conn.execute("DELETE FROM cases WHERE source_file = ?", (source_file,))
+            results["removed"] = len(stale)
+            if manifest is not None:
+                manifest.prune(MANIFEST_STAGE, md_files)
+
+        results["cases"] = conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+    finally:
+        conn.close()
+
+    return results
+
+
+def query_cases(db_path: str = CASES_DB_FILE, company: Optional[str] = None,
+                law: Optional[str] = None, min_fine: Optional[int] = None,
+                max_fine: Optional[int] = None, date_from: Optional[str] = None,
+                date_to: Optional[str] = None, domain: Optional[str] = None,
+                limit: Optional[int] = None) -> list:
+    """
+    查詢違規案件，所有條件皆走索引。
+
+    Args:
+        company: 處分商號全名
+        law: 法規名稱、簡稱（如 食安法）或完整法條（如 醫療器材管理法第46條）
+        min_fine / max_fine: 罰鍰金額範圍（元）
+        date_from / date_to: 發文日期範圍（西元 YYYY-MM-DD）
+        domain: 食品 / 化粧品 / 藥品醫療器材
+        limit: 最多回傳筆數
+
+    Returns:
+        list: 依發文日期排序的案件 dict
+    """
+    clauses, params = [], []
+    if company:
+        clauses.append("company = ?")
+        params.append(company)
+    if law:
+        law = LAW_ALIASES.get(law, law)
+        if "第" in law:
+            clauses.append("law_article = ?")
+        else:
+            clauses.append("law_name = ?")
+        params.append(law)
+    if min_fine is not None:
+        clauses.append("fine >= ?")
+        params.append(min_fine)
+    if max_fine is not None:
+        clauses.append("fine <= ?")
+        params.append(max_fine)
+    if date_from:
+        clauses.append("issued_date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("issued_date <= ?")
+        params.append(date_to)
+    if domain:
+        clauses.append("domain = ?")
+        params.append(domain)
+
+    sql = "SELECT * FROM cases"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY issued_date, source_file, item_no"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+
+    # 查詢只讀取，不建立資料表，也不會在資料庫不存在時產生空檔
+    conn = sqlite3.connect(f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="將處罰案件統計表解析為結構化案件資料庫")
+    parser.add_argument("--source-dir", default=SOURCE_MD_DIR, help="統計表 Markdown 所在目錄")
+    parser.add_argument("--db", default=CASES_DB_FILE, help="輸出的 SQLite 檔案")
+    args = parser.parse_args()
+
+    with BuildManifest() as build_manifest:
+        results = build_case_store(args.source_dir, args.db, manifest=build_manifest)
+
+    print(f"✅ 案件資料庫已更新：{args.db}，解析 {results['parsed']} 份、略過 {results['skipped']} 份、"
+          f"移除 {results['removed']} 份，共 {results['cases']} 案")
+    if results["flagged"]:
+        print(f"⚠️ 本次解析共 {results['flagged']} 案欄位可能錯位（flags 欄位），請檢查上列統計表")
+
+
+if __name__ == "__main__":
+    main()
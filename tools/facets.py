@@ -0,0 +1,345 @@
+import os
+import re
+import json
+import base64
+import sqlite3
+import hashlib
+import argparse
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+# 分面索引輸出位置（與 index.json 一起產生）
+INDEX_DATA_DIR = "knowledge_index"
+FACETS_FILE = os.path.join(INDEX_DATA_DIR, "facets.json")
+CASES_DB_FILE = os.path.join(INDEX_DATA_DIR, "violation_cases.sqlite")
+
+# 建置清單中的階段名稱與工具版本（詞典或標記規則變動時請遞增版本）
+MANIFEST_STAGE = "facets"
+TOOL_VERSION = "2"
+FACETS_FORMAT_VERSION = 1
+
+# 民國年的辨識範圍（民國 100 年 = 2011 年）
+ROC_YEAR_RANGE = range(100, 131)
+
+# 違規類別：統計表標題與內文中的關鍵字 → 類別（與 extract_cases.classify_domain 的分類一致）
+DOMAIN_KEYWORDS = {
+    "化粧品": "化粧品",
+    "化妝品": "化粧品",
+    "食品": "食品",
+    "健康食品": "食品",
+    "藥品": "藥品醫療器材",
+    "醫療器材": "藥品醫療器材",
+}
+
+# 縣市（臺、台兩種寫法都標記為「臺」）
+CITIES = [
+    "臺北市", "新北市", "桃園市", "臺中市", "臺南市", "高雄市", "基隆市", "新竹市", "嘉義市",
+    "新竹縣", "苗栗縣", "彰化縣", "南投縣", "雲林縣", "嘉義縣", "屏東縣", "宜蘭縣", "花蓮縣",
+    "臺東縣", "澎湖縣", "金門縣", "連江縣",
+]
+
+# 法規全名與常用簡稱（extract_cases.LAW_ALIASES 的簡稱也會一併加入）
+LAW_NAMES = ["食品安全衛生管理法", "健康食品管理法", "化粧品衛生安全管理法", "醫療器材管理法", "藥事法"]
+
+# 罰鍰金額分級（元），chunk 中出現的每個金額各自標記所屬級距
+FINE_BUCKETS = [
+    (100_000, "10萬以下"),
+    (500_000, "10萬-50萬"),
+    (1_000_000, "50萬-100萬"),
+    (None, "100萬以上"),
+]
+
+FACET_NAMES = ["year", "month", "domain", "city", "company", "law", "fine", "product"]
+# 期間分面：chunk 只依所屬統計表的公告期間標記，不看內文中的日期
+PERIOD_FACETS = ("year", "month")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# 法規名稱之後的條號，例如「第 46 條」、「第10條第1項」、「第28條之1」
+_ARTICLE_RE = re.compile(r"(?:\([^)]*\)|（[^）]*）)?第(\d+(?:-\d+)?)條(?:之(\d+))?(?:第(\d+)項)?")
+_FINE_RE = re.compile(r"(?<![\d,])\d{1,3}(?:,\d{3})+(?![\d,])")
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多字串比對自動機：所有關鍵字建成一棵 trie 並加上失敗連結，
+    掃描一次文字即可找出所有關鍵字的出現位置，成本與文字長度成正比、與關鍵字數量無關。
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, object]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, object]]] = [[]]
+        for pattern, value in patterns:
+            if pattern:
+                self._add(pattern, value)
+        self._link()
+
+    def _add(self, pattern: str, value):
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((len(pattern), value))
+
+    def _link(self):
+        """以廣度優先建立失敗連結，並將失敗連結上的輸出併入，掃描時不必再沿連結收集"""
+        queue = list(self._goto[0].values())  # 第一層節點的失敗連結都指向根節點
+        for state in queue:
+            for ch, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+                queue.append(next_state)
+
+    def iter(self, text: str):
+        """逐一產生 (結束位置, 關鍵字長度, 值)，結束位置為關鍵字最後一個字元之後的索引"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, value in outputs[state]:
+                yield i + 1, length, value
+
+    def __len__(self):
+        return len(self._goto)
+
+
+def normalize_text(text: str) -> str:
+    """NFKC 正規化並移除所有空白（PDF 轉出的欄位常在字中斷行），台 統一為 臺"""
+    return _WHITESPACE_RE.sub("", unicodedata.normalize("NFKC", text)).replace("台", "臺")
+
+
+def load_company_names(db_path: str = CASES_DB_FILE) -> List[str]:
+    """由案件資料庫取得所有處分商號作為公司詞典；資料庫不存在時回傳空串列"""
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT DISTINCT company FROM cases WHERE company IS NOT NULL").fetchall()
+    finally:
+        conn.close()
+    return sorted({row[0] for row in rows if len(row[0]) >= 4})
+
+
+def _product_keywords() -> Dict[str, str]:
+    from csv_to_md import PRODUCT_FOLDER_MAP
+
+    return dict(PRODUCT_FOLDER_MAP)
+
+
+def _law_aliases() -> Dict[str, str]:
+    from extract_cases import LAW_ALIASES
+
+    return dict(LAW_ALIASES)
+
+
+class FacetTagger:
+    """
+    將所有詞典（年月、類別、縣市、法規、公司、產品）建成同一個 Aho-Corasick 自動機，
+    每個 chunk 只掃描一次。法規名稱命中後再就地解析其後的條號；罰鍰金額不是固定詞彙，
+    只在有命中法規的 chunk 中以金額格式擷取。
+    """
+
+    def __init__(self, companies: Optional[Iterable[str]] = None):
+        self.companies = sorted(set(companies or []))
+        patterns = []
+        for roc_year in ROC_YEAR_RANGE:
+            year = roc_year + 1911
+            patterns.append((f"{roc_year}年", ("year", str(year))))
+            patterns.append((f"{year}年", ("year", str(year))))
+            for month in range(1, 13):
+                period = ("month", f"{year}-{month:02d}")
+                for month_text in {str(month), f"{month:02d}"}:
+                    patterns.append((f"{roc_year}年{month_text}月", period))
+                    patterns.append((f"{roc_year}/{month_text}/", period))
+        patterns += [(keyword, ("domain", domain)) for keyword, domain in DOMAIN_KEYWORDS.items()]
+        patterns += [(normalize_text(city), ("city", city)) for city in CITIES]
+        patterns += [(law, ("law", law)) for law in LAW_NAMES]
+        patterns += [(alias, ("law", law)) for alias, law in _law_aliases().items()]
+        patterns += [(normalize_text(company), ("company", company)) for company in self.companies]
+        patterns += [(normalize_text(keyword), ("product", folder)) for keyword, folder in _product_keywords().items()]
+        self.automaton = AhoCorasick(patterns)
+
+    def tag(self, text: str) -> Dict[str, Set[str]]:
+        """回傳 {分面: {值, ...}}，沒有命中的分面不列出"""
+        text = normalize_text(text)
+        tags: Dict[str, Set[str]] = {}
+        for end, _, (facet, value) in self.automaton.iter(text):
+            if facet == "law":
+                article = _ARTICLE_RE.match(text, end)
+                if article:
+                    tags.setdefault("law", set()).add(_format_article(value, *article.groups()))
+                    continue
+            elif facet == "month":
+                tags.setdefault("year", set()).add(value[:4])
+            tags.setdefault(facet, set()).add(value)
+
+        if "law" in tags:
+            fines = [int(m.group(0).replace(",", "")) for m in _FINE_RE.finditer(text)]
+            if fines:
+                tags["fine"] = {fine_bucket(fine) for fine in fines}
+        return tags
+
+    def tag_chunk(self, chunk_file: str, text: str) -> Dict[str, Set[str]]:
+        """
+        標記 chunk 的分面。年、月只取自來源統計表的標題（即 chunk 檔名，如「公告114年4月份處理…」，
+        與 extract_cases 取期間的方式相同）；內文中的日期多半是廣告詞（如「2013年諾貝爾」）
+        或陳情、查獲日期，不代表案件所屬的期間。產品 FAQ 等沒有公告期間的 chunk 不標記年月。
+        """
+        tags = {facet: values for facet, values in self.tag(text).items() if facet not in PERIOD_FACETS}
+        period = self.tag(os.path.basename(chunk_file))
+        tags.update({facet: period[facet] for facet in PERIOD_FACETS if facet in period})
+        return tags
+
+
+def _format_article(law: str, article: str, sub: Optional[str], para: Optional[str]) -> str:
+    from extract_cases import normalize_law
+
+    return normalize_law(law, article, sub, para)
+
+
+def fine_bucket(amount: int) -> str:
+    for upper, label in FINE_BUCKETS:
+        if upper is None or amount <= upper:
+            return label
+    return FINE_BUCKETS[-1][1]
+
+
+def _encode_bitset(doc_indexes: Iterable[int]) -> str:
+    bits = 0
+    for i in doc_indexes:
+        bits |= 1 << i
+    return base64.b64encode(bits.to_bytes((bits.bit_length() + 7) // 8, "little")).decode("ascii")
+
+
+def _decode_bitset(data: str) -> int:
+    return int.from_bytes(base64.b64decode(data), "little")
+
+
+def build_facet_index(index_list: List[dict], manifest=None, output_file: str = FACETS_FILE,
+                      db_path: str = CASES_DB_FILE, texts: Optional[Dict[str, str]] = None) -> bool:
+    """
+    為 index.json 的每個 chunk（連同標題）標記分面，寫出 facets.json：
+        docs:   chunk 路徑（順序與 index.json 相同）
+        facets: {分面: {值: 以 base64 表示的 bitset（第 i 個位元代表 docs[i]）}}
+    有提供 manifest 時，chunk、公司詞典都未變動就略過。
+    texts 為上游階段已讀入的 chunk 內文（見 search_index._read_chunk），其中沒有的才讀檔。
+
+    Returns:
+        bool: 是否重新建立了分面索引
+    """
+    from search_index import _read_chunk
+
+    companies = load_company_names(db_path)
+    chunk_files = [entry["file"] for entry in index_list]
+
+    fingerprint = None
+    if manifest is not None:
+        digest = hashlib.sha256("\n".join(companies).encode("utf-8"))
+        for entry in index_list:
+            digest.update(f"{entry['file']}\0{entry['title']}\0{manifest.file_hash(entry['file'])}\n".encode("utf-8"))
+        fingerprint = digest.hexdigest()
+        previous = manifest.data(MANIFEST_STAGE, output_file) or {}
+        if (previous.get("fingerprint") == fingerprint
+                and manifest.is_up_to_date(MANIFEST_STAGE, output_file, TOOL_VERSION)):
+            print(f"⏭️ 分面索引未變動，略過：{output_file}")
+            return False
+
+    tagger = FacetTagger(companies)
+    postings: Dict[str, Dict[str, List[int]]] = {facet: {} for facet in FACET_NAMES}
+    for i, entry in enumerate(index_list):
+        text = entry["title"] + "\n" + _read_chunk(entry["file"], texts)
+        for facet, values in tagger.tag_chunk(entry["file"], text).items():
+            for value in values:
+                postings[facet].setdefault(value, []).append(i)
+
+    facets = {facet: {value: _encode_bitset(docs) for value, docs in sorted(values.items())}
+              for facet, values in postings.items()}
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump({"version": FACETS_FORMAT_VERSION, "docs": chunk_files, "facets": facets},
+                  f, ensure_ascii=False, separators=(",", ":"))
+
+    if manifest is not None:
+        manifest.record(MANIFEST_STAGE, output_file, TOOL_VERSION, data={"fingerprint": fingerprint})
+
+    print(f"✅ 已建立分面索引：{len(chunk_files)} 個 chunk、"
+          + "、".join(f"{facet} {len(values)}" for facet, values in facets.items() if values))
+    return True
+
+
+class FacetIndex:
+    """分面索引的查詢端：依分面條件取得候選 chunk，再交給 BM25 等文字計分"""
+
+    def __init__(self, data: dict):
+        if data.get("version") != FACETS_FORMAT_VERSION:
+            raise ValueError(f"不支援的分面索引版本：{data.get('version')}")
+        self.docs = data["docs"]
+        self.facets = {facet: {value: _decode_bitset(bits) for value, bits in values.items()}
+                       for facet, values in data["facets"].items()}
+
+    @classmethod
+    def load(cls, path: str = FACETS_FILE) -> "FacetIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def values(self, facet: str) -> Dict[str, int]:
+        """回傳某個分面的 {值: chunk 數}"""
+        return {value: bin(bits).count("1") for value, bits in self.facets.get(facet, {}).items()}
+
+    def filter(self, filters: Dict[str, Union[str, Iterable[str]]]) -> List[str]:
+        """
+        回傳符合條件的 chunk 路徑（依 index.json 順序）。不同分面之間為 AND，
+        同一分面的多個值為 OR，例如 {"domain": "化粧品", "month": ["2025-01", "2025-02"]}。
+        """
+        selected = (1 << len(self.docs)) - 1
+        for facet, wanted in filters.items():
+            if facet not in self.facets:
+                raise ValueError(f"未知的分面：{facet}")
+            values = [wanted] if isinstance(wanted, str) else list(wanted)
+            bits = 0
+            for value in values:
+                bits |= self.facets[facet].get(value, 0)
+            selected &= bits
+        return [doc for i, doc in enumerate(self.docs) if selected >> i & 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查詢分面索引，或列出文字中可辨識的分面")
+    parser.add_argument("--facet", action="append", default=[], metavar="分面=值",
+                        help="篩選條件，可重複指定，例如 --facet domain=化粧品 --facet month=2025-01")
+    parser.add_argument("--values", metavar="分面", help="列出某個分面的所有值與 chunk 數")
+    parser.add_argument("--tag", metavar="文字", help="顯示一段文字（例如使用者問題）會被標記的分面")
+    args = parser.parse_args()
+
+    if args.tag:
+        for facet, values in FacetTagger(load_company_names()).tag(args.tag).items():
+            print(f"{facet}: {', '.join(sorted(values))}")
+        return
+
+    index = FacetIndex.load()
+    if args.values:
+        for value, count in index.values(args.values).items():
+            print(f"{count:5d}  {value}")
+        return
+
+    filters: Dict[str, List[str]] = {}
+    for item in args.facet:
+        facet, _, value = item.partition("=")
+        filters.setdefault(facet, []).append(value)
+    for chunk_file in index.filter(filters):
+        print(chunk_file)
+
+
+if __name__ == "__main__":
+    main()
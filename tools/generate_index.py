@@ -1,13 +1,26 @@
 import os
 import json
+import argparse
 from datetime import datetime
 import urllib.parse
 
+from build_manifest import BuildManifest
+
+# 檢索、向量、分面、分片、打包與去重等模組只在用到時才載入，
+# tools/watch.py、tools/pipeline.py 只取用本檔的條目函式時不必付出載入整套索引工具的成本
+
 # 設定路徑
-KNOWLEDGE_DIR = "knowledge_chunks/law_CK"              # 放 .md 的資料夾
+KNOWLEDGE_DIR = "knowledge_chunks"                     # 放 chunk .md 的資料夾（law_CK 與 product 各分類）
 OUTPUT_FILE = "index.json"               # 產出的索引檔
 GITHUB_RAW_BASE = "https://raw.githubusercontent.com/Wonders-com/test_index_wonders/main"
 
+# 建置清單中的階段名稱與工具版本（索引欄位變動時請遞增版本，所有條目會被重新產生）
+MANIFEST_STAGE = "generate_index"
+TOOL_VERSION = "2"
+
+# 條目中 tokens 欄位的估算方式（與 chunk_md.py 的 --estimator 相同）
+DEFAULT_ESTIMATOR = "cjk"
+
 
 # 這是關鍵的維護點，當有新產品資料夾時，需要更新這裡
 PRODUCT_FOLDER_TO_NAME_MAP = {
@@ -16,62 +29,287 @@ PRODUCT_FOLDER_TO_NAME_MAP = {
     "product_other_unmatch":"無法識別產品",
     # 範例：如果未來有新產品
     # "product_xyz_vitamin": "XYZ綜合維他命",
-    
+
 }
 
-index_list = []
 law = str("law")  # 將 law 設定為 "law"，用於分類
 
-# 遍歷資料夾
-for root, dirs, files in os.walk(KNOWLEDGE_DIR):
-    for file in files:
-        if file.endswith(".md"):
-            file_path = os.path.join(root, file)
-            relative_path = os.path.relpath(file_path, start=".").replace("\\", "/")
-
-            # 分類，例如 knowledge/law/xxx.md → law
-            parts = relative_path.split("/")
-            category = "unknown"
-
-            product_name = "未知產品" # 預設值
-
-            # 根據路徑深度和命名慣例來判斷 category 和 product_name
-            if len(parts) >= 2: # 至少 knowledge/something
-                if parts[1] == "product" and len(parts) >= 3: # knowledge/product/product_xxx
-                    category = parts[2] # 新的 category 是 product_xxx_productname
-                    # 從映射中查找對應的中文產品名稱
-                    product_name = PRODUCT_FOLDER_TO_NAME_MAP.get(category, "未知產品")
-                elif parts[1] == "law_CK": # 如果 category 是 "law_CK"
-                    category = law # 設定 category 為 law
-                    product_name = "法規" # productName 顯示為 "法規"
-                elif parts[1] != "product": # knowledge/law 或者其他頂層分類
-                    category = parts[1] # 保持原來的 category 提取方式
-                    # 非產品類別的 product_name 可以保持預設或設定為 None
-
-            # 標題優先用第一行 markdown 標題，否則用檔名
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    first_line = f.readline().strip().lstrip("#").strip()
-                    title = first_line if first_line else os.path.splitext(file)[0]
-            except Exception: # 捕獲所有異常，避免文件讀取問題導致腳本停止
-                title = os.path.splitext(file)[0]
-
-            raw_url = f"{GITHUB_RAW_BASE}/{urllib.parse.quote(relative_path)}"
-
-            # 最後更新時間
-            updated = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d")
-
-            index_list.append({
-                "title": title,
-                "file": relative_path,
-                "url": raw_url,
-                "category": category,
-                "product_name": product_name,
-                "updated": updated
-            })
-
-# 儲存為 index.json
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    json.dump(index_list, f, ensure_ascii=False, indent=2)
-
-print(f"✅ 已成功產出 {OUTPUT_FILE}，共 {len(index_list)} 筆")
\ No newline at end of file
+# 索引條目的欄位與順序（建置清單以 sort_keys 儲存快取，讀回時依此順序還原，index.json 才不會因快取而改變）
+# bytes / chars / tokens 為 chunk 的位元組數、字元數與估算的 token 數，讀取端不必先下載就能控制 prompt 長度
+INDEX_FIELDS = ["title", "file", "url", "category", "product_name", "updated", "bytes", "chars", "tokens"]
+
+
+def index_tool_version(estimator=DEFAULT_ESTIMATOR):
+    """建置清單中記錄的工具版本（估算方式也納入，變更時所有條目會重新產生）"""
+    return f"{TOOL_VERSION}:{estimator}"
+
+
+def relative_chunk_path(file_path):
+    """chunk 在索引中的鍵值（相對於目前目錄的 POSIX 路徑，與條目的 file 欄位相同）"""
+    return os.path.relpath(file_path, start=".").replace("\\", "/")
+
+
+def build_index_entry(file_path, estimator=DEFAULT_ESTIMATOR, texts=None):
+    """
+    依 chunk 檔案路徑產生一筆索引條目。
+    texts 為各階段共用的 chunk 內文（{相對路徑: 內文}，見 search_index._read_chunk），
+    切割階段剛寫出的 chunk 直接取用不再讀檔，讀檔取得的內文也存入供後續階段使用。
+    """
+    from chunk_md import TOKEN_ESTIMATORS
+
+    file = os.path.basename(file_path)
+    relative_path = relative_chunk_path(file_path)
+
+    # 分類，例如 knowledge/law/xxx.md → law
+    parts = relative_path.split("/")
+    category = "unknown"
+
+    product_name = "未知產品" # 預設值
+
+    # 根據路徑深度和命名慣例來判斷 category 和 product_name
+    if len(parts) >= 2: # 至少 knowledge/something
+        if parts[1] == "product" and len(parts) >= 3: # knowledge/product/product_xxx
+            category = parts[2] # 新的 category 是 product_xxx_productname
+            # 從映射中查找對應的中文產品名稱
+            product_name = PRODUCT_FOLDER_TO_NAME_MAP.get(category, "未知產品")
+        elif parts[1] == "law_CK": # 如果 category 是 "law_CK"
+            category = law # 設定 category 為 law
+            product_name = "法規" # productName 顯示為 "法規"
+        elif parts[1] != "product": # knowledge/law 或者其他頂層分類
+            category = parts[1] # 保持原來的 category 提取方式
+            # 非產品類別的 product_name 可以保持預設或設定為 None
+
+    # 標題優先用第一行 markdown 標題，否則用檔名
+    try:
+        if texts is not None and relative_path in texts:
+            text = texts[relative_path]
+            raw = text.encode("utf-8")
+        else:
+            with open(file_path, "rb") as f:
+                raw = f.read()
+            text = raw.decode("utf-8")
+            if texts is not None:
+                texts[relative_path] = text
+        first_line = text.split("\n", 1)[0].strip().lstrip("#").strip()
+        title = first_line if first_line else os.path.splitext(file)[0]
+    except Exception: # 捕獲所有異常，避免文件讀取問題導致腳本停止
+        raw, text = b"", ""
+        title = os.path.splitext(file)[0]
+
+    raw_url = f"{GITHUB_RAW_BASE}/{urllib.parse.quote(relative_path)}"
+
+    # 最後更新時間
+    updated = datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d")
+
+    return {
+        "title": title,
+        "file": relative_path,
+        "url": raw_url,
+        "category": category,
+        "product_name": product_name,
+        "updated": updated,
+        "bytes": len(raw),
+        "chars": len(text),
+        "tokens": TOKEN_ESTIMATORS[estimator](text),
+    }
+
+
+def list_chunk_files(knowledge_dir=KNOWLEDGE_DIR):
+    """遍歷資料夾，回傳所有 chunk 檔案路徑（排序後，讓索引順序穩定）"""
+    chunk_files = []
+    for root, dirs, files in os.walk(knowledge_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(".md"):
+                chunk_files.append(os.path.join(root, file))
+    return chunk_files
+
+
+def apply_aliases(index_list, aliases):
+    """
+    依近似重複偵測結果（{代表 chunk: [重複的 chunk, ...]}）移除重複的條目，
+    並在代表條目加上 aliases 欄位列出被合併的 chunk。回傳新的串列，不修改原條目。
+    """
+    alias_files = {alias for group in aliases.values() for alias in group}
+    deduped = []
+    for entry in index_list:
+        if entry["file"] in alias_files:
+            continue
+        if entry["file"] in aliases:
+            entry = dict(entry, aliases=aliases[entry["file"]])
+        deduped.append(entry)
+    return deduped
+
+
+def apply_rollups(index_list, rollups_file=None):
+    """
+    在由處罰案件統計表切出的條目加上 rollups 欄位，指向預先彙總的案件統計（tools/case_rollups.py），
+    讀取 index.json 的一端遇到這類條目即可改查彙總統計，不必下載所有月份的統計表。
+    彙總檔不存在時原樣回傳；回傳新的串列，不修改原條目。
+    """
+    from case_rollups import ROLLUPS_FILE
+
+    rollups_file = rollups_file or ROLLUPS_FILE
+    try:
+        with open(rollups_file, "r", encoding="utf-8") as f:
+            sources = json.load(f)["sources"]
+    except (OSError, ValueError, KeyError):
+        return index_list
+    stems = {os.path.splitext(source)[0] for source in sources}
+    reference = relative_chunk_path(rollups_file)
+    return [dict(entry, rollups=reference)
+            if os.path.basename(entry["file"]).rpartition("_chunk_")[0] in stems else entry
+            for entry in index_list]
+
+
+def annotate_index(index_list, bundle_by=None):
+    """
+    在（已去重的）條目加上 bundle 與 rollups 欄位：bundle_by 指定時重新打包 chunk bundle 並記錄位移。
+    tools/watch.py 就地更新條目後也以此重新標註，位移與完整建置相同。回傳新的串列，不修改原條目。
+    """
+    if bundle_by:
+        from chunk_bundles import annotate_entries, pack_chunk_bundles
+
+        table = pack_chunk_bundles(index_list, grouping=bundle_by, url_base=GITHUB_RAW_BASE)
+        index_list = annotate_entries(index_list, table)
+        print(f"✅ 已打包 {len(table['bundles'])} 個 chunk bundle（依 {bundle_by}）")
+    return apply_rollups(index_list)
+
+
+def serialize_index(index_list):
+    """index.json 的內容（tools/watch.py 就地更新條目時也以相同格式寫出）"""
+    return json.dumps(index_list, ensure_ascii=False, indent=2)
+
+
+def generate_index(knowledge_dir=KNOWLEDGE_DIR, output_file=OUTPUT_FILE, manifest=None, chunk_files=None,
+                   bundle_by=None, aliases=None, estimator=DEFAULT_ESTIMATOR, metrics=None, texts=None):
+    """
+    產生 index.json。
+    有提供 manifest 時，內容未變動的 chunk 直接沿用上次的條目（包含 updated 日期），
+    產出內容與既有索引相同時不重寫檔案。
+    chunk_files 由上一個階段（tools/pipeline.py 的切割階段）直接提供時，不再重新走訪資料夾。
+    aliases 為近似重複偵測的結果，提供時重複的 chunk 不列入索引，改記錄在代表條目的 aliases 欄位。
+    bundle_by 指定時（category 或 source），另將 chunks 打包為 bundle，
+    並在每個條目加上 bundle 欄位（bundle 檔路徑、位移、長度），讀取端可一次請求取得多個 chunk。
+    已產生案件彙總統計時，統計表的條目另有 rollups 欄位指向彙總檔（見 apply_rollups）。
+    estimator 為 tokens 欄位的估算方式，變更時所有條目會重新產生。
+    texts 為上游階段已在記憶體中的 chunk 內文（見 build_index_entry），重新產生條目時優先取用。
+    metrics（tools/metrics.py 的 StageMetrics）提供時記錄沿用快取與重新產生的條目數、讀取與輸出的位元組數。
+    """
+    tool_version = index_tool_version(estimator)
+    if chunk_files is None:
+        chunk_files = list_chunk_files(knowledge_dir)
+
+    index_list = []
+    changed = manifest is None
+    rebuilt = 0
+    for file_path in chunk_files:
+        entry = None
+        if manifest is not None and manifest.is_up_to_date(MANIFEST_STAGE, file_path, tool_version):
+            cached = manifest.data(MANIFEST_STAGE, file_path)
+            if cached is not None:
+                entry = {field: cached[field] for field in INDEX_FIELDS}
+        if entry is None:
+            entry = build_index_entry(file_path, estimator, texts)
+            changed = True
+            rebuilt += 1
+        index_list.append(entry)
+
+    if manifest is not None and manifest.prune(MANIFEST_STAGE, chunk_files):
+        changed = True
+
+    # 去重、打包與彙總統計的指向都是在條目之上的轉換，快取的條目本身不含這些欄位（位移會隨其他 chunk 變動）
+    output_list = index_list
+    if aliases:
+        output_list = apply_aliases(output_list, aliases)
+    output_list = annotate_index(output_list, bundle_by)
+
+    content = serialize_index(output_list)
+    try:
+        with open(output_file, "r", encoding="utf-8") as f:
+            written = f.read() != content
+    except FileNotFoundError:
+        written = True
+
+    if written:
+        # 儲存為 index.json
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write(content)
+        print(f"✅ 已成功產出 {output_file}，共 {len(output_list)} 筆")
+    else:
+        print(f"⏭️ 索引未變動，略過：{output_file}，共 {len(output_list)} 筆")
+
+    if manifest is not None and (changed or written):
+        for file_path, entry in zip(chunk_files, index_list):
+            manifest.record(MANIFEST_STAGE, file_path, tool_version, [output_file], data=entry)
+
+    if metrics is not None:
+        metrics.add(chunks=len(index_list), entries=len(output_list), rebuilt=rebuilt,
+                    cache_hits=len(index_list) - rebuilt, bytes_in=sum(entry["bytes"] for entry in index_list),
+                    bytes_out=len(content.encode("utf-8")), written=int(written))
+
+    return output_list
+
+
+def write_shards(index_list, shard_format):
+    """另外輸出依分類拆分的精簡索引分片（knowledge_index/shards/），內容未變動的分片不重寫"""
+    from index_shards import write_index_shards
+
+    stats = write_index_shards(index_list, shard_format=shard_format)
+    print(f"✅ 索引分片：{stats['shards']} 個（{shard_format}，共 {stats['bytes']} bytes），"
+          f"更新 {stats['written']} 個檔案、移除 {stats['removed']} 個舊分片")
+    return stats
+
+
+def main():
+    from chunk_md import TOKEN_ESTIMATORS
+    from search_index import build_search_index
+    from vector_index import build_vector_index
+    from facets import build_facet_index
+    from index_shards import SHARD_FORMATS
+    from chunk_bundles import BUNDLE_GROUPINGS
+    from dedup_chunks import dedup_chunks
+    from metrics import add_metrics_arguments, metrics_from_args, stage_metrics, write_metrics
+
+    parser = argparse.ArgumentParser(description="產生 index.json 與檢索索引")
+    parser.add_argument("--shards", choices=list(SHARD_FORMATS), default=None,
+                        help="另外輸出依分類拆分的索引分片（json、gzip 或 msgpack）")
+    parser.add_argument("--bundles", choices=BUNDLE_GROUPINGS, default=None,
+                        help="將 chunks 依分類或來源文件打包為 bundle，並在索引中記錄位移與長度")
+    parser.add_argument("--dedup", action="store_true",
+                        help="以 MinHash/LSH 合併近似重複的 chunk，重複者記錄在代表條目的 aliases 欄位")
+    parser.add_argument("--estimator", choices=list(TOKEN_ESTIMATORS), default=DEFAULT_ESTIMATOR,
+                        help="條目 tokens 欄位的估算方式")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    metrics = metrics_from_args(args)
+
+    # 各步驟共用同一份 chunk 內文，每個 chunk 最多讀檔一次
+    texts = {}
+    with BuildManifest() as build_manifest:
+        chunk_files = list_chunk_files()
+        aliases = None
+        if args.dedup:
+            with stage_metrics(metrics, "dedup"):
+                aliases = dedup_chunks([relative_chunk_path(f) for f in chunk_files], manifest=build_manifest,
+                                       texts=texts)
+        with stage_metrics(metrics, MANIFEST_STAGE) as stage:
+            index_list = generate_index(manifest=build_manifest, chunk_files=chunk_files, bundle_by=args.bundles,
+                                        aliases=aliases, estimator=args.estimator, metrics=stage, texts=texts)
+        # 同步建立 BM25 倒排索引，查詢端不必再逐一讀取 chunk 內文
+        with stage_metrics(metrics, "search_index"):
+            build_search_index(index_list, manifest=build_manifest, texts=texts)
+        # 語意相近查詢用的向量索引（離線 TF-IDF + SVD）
+        with stage_metrics(metrics, "vector_index"):
+            build_vector_index(index_list, manifest=build_manifest, texts=texts)
+        # 年月、類別、縣市、公司、法條、罰鍰等分面，查詢時可先縮小候選範圍
+        with stage_metrics(metrics, "facets"):
+            build_facet_index(index_list, manifest=build_manifest, texts=texts)
+    if args.shards:
+        with stage_metrics(metrics, "shards"):
+            write_shards(index_list, args.shards)
+    write_metrics(metrics, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import os
+import json
+import gzip
+import hashlib
+import argparse
+import urllib.parse
+from typing import Dict, Iterable, List, Optional
+
+from build_manifest import write_if_changed
+from case_rollups import ROLLUPS_FILE
+
+# 分片索引輸出位置：每個分類（law、各產品資料夾）一個分片，另有一份列出所有分片的清單
+INDEX_DATA_DIR = "knowledge_index"
+SHARDS_DIR = os.path.join(INDEX_DATA_DIR, "shards")
+SHARDS_MANIFEST_FILE = os.path.join(SHARDS_DIR, "manifest.json")
+SHARD_FORMAT_VERSION = 5
+
+# 可用的分片編碼與副檔名；msgpack 為選用套件，只有選用時才需要安裝
+SHARD_FORMATS = {
+    "json": ".json",
+    "gzip": ".json.gz",
+    "msgpack": ".msgpack",
+}
+DEFAULT_SHARD_FORMAT = "json"
+
+# 分片中每列的欄位：bytes / chars / tokens / bundle_offset / bundle_length 為數值，其餘為字串表的索引。
+# 前 7 欄必有；之後為選用欄位，缺少時為 null，列尾的 null 省略：
+# url 只在無法由 url_base + 檔案路徑還原時才存在，bundle_* 對應 index.json 的 bundle（檔案、位移、長度），
+# aliases 為去重後併入此條目的 chunk 路徑（字串索引的清單），rollups 為案件彙總統計檔的路徑
+SHARD_FIELDS = ["title", "dir", "name", "updated", "bytes", "chars", "tokens", "url",
+                "bundle_file", "bundle_offset", "bundle_length", "aliases", "rollups"]
+_REQUIRED_FIELDS = 7
+
+
+def _encode(shard: dict, shard_format: str) -> bytes:
+    if shard_format == "msgpack":
+        import msgpack  # 延遲載入，只有選用 msgpack 格式時才需要安裝
+
+        return msgpack.packb(shard, use_bin_type=True)
+    data = json.dumps(shard, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if shard_format == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)  # 固定 mtime，內容相同時輸出也相同
+    return data
+
+
+def _decode(data: bytes, shard_format: str) -> dict:
+    if shard_format == "msgpack":
+        import msgpack
+
+        return msgpack.unpackb(data, raw=False)
+    if shard_format == "gzip":
+        data = gzip.decompress(data)
+    return json.loads(data.decode("utf-8"))
+
+
+def _url_base(entries: List[dict]) -> str:
+    """由條目推算共同的網址前綴（file 欄位之前的部分）"""
+    for entry in entries:
+        quoted = urllib.parse.quote(entry["file"])
+        if entry["url"].endswith(quoted):
+            return entry["url"][:-len(quoted)]
+    return ""
+
+
+def build_shard(category: str, entries: List[dict], url_base: str) -> dict:
+    """
+    將同一分類的條目轉為分片：重複出現的字串（資料夾、日期等）只存一次於 strings，
+    每個條目以字串索引組成一列；分類與產品名稱整個分片只存一次。
+    """
+    strings: List[str] = []
+    string_ids: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        sid = string_ids.get(value)
+        if sid is None:
+            sid = string_ids[value] = len(strings)
+            strings.append(value)
+        return sid
+
+    rows = []
+    for entry in entries:
+        directory, _, name = entry["file"].rpartition("/")
+        row = [intern(entry["title"]), intern(directory), intern(name), intern(entry["updated"]),
+               entry["bytes"], entry["chars"], entry["tokens"]]
+        url = entry["url"] if entry["url"] != url_base + urllib.parse.quote(entry["file"]) else None
+        row.append(intern(url) if url is not None else None)
+        bundle = entry.get("bundle")
+        row.extend([intern(bundle["file"]), bundle["offset"], bundle["length"]] if bundle else [None] * 3)
+        aliases = entry.get("aliases")
+        row.append([intern(alias) for alias in aliases] if aliases else None)
+        row.append(intern(entry["rollups"]) if entry.get("rollups") else None)
+        while len(row) > _REQUIRED_FIELDS and row[-1] is None:
+            row.pop()
+        rows.append(row)
+
+    return {
+        "version": SHARD_FORMAT_VERSION,
+        "category": category,
+        "product_name": entries[0]["product_name"] if entries else "",
+        "url_base": url_base,
+        "fields": SHARD_FIELDS,
+        "strings": strings,
+        "rows": rows,
+    }
+
+
+def expand_shard(shard: dict) -> List[dict]:
+    """將分片還原為與 index.json 相同格式的條目"""
+    if shard.get("version") != SHARD_FORMAT_VERSION:
+        raise ValueError(f"不支援的分片版本：{shard.get('version')}")
+    strings = shard["strings"]
+    entries = []
+    for row in shard["rows"]:
+        directory, name = strings[row[1]], strings[row[2]]
+        file = f"{directory}/{name}" if directory else name
+        extra = dict(zip(SHARD_FIELDS[_REQUIRED_FIELDS:], row[_REQUIRED_FIELDS:]))
+        url = extra.get("url")
+        entry = {
+            "title": strings[row[0]],
+            "file": file,
+            "url": strings[url] if url is not None else shard["url_base"] + urllib.parse.quote(file),
+            "category": shard["category"],
+            "product_name": shard["product_name"],
+            "updated": strings[row[3]],
+            "bytes": row[4],
+            "chars": row[5],
+            "tokens": row[6],
+        }
+        if extra.get("aliases"):
+            entry["aliases"] = [strings[sid] for sid in extra["aliases"]]
+        if extra.get("bundle_file") is not None:
+            entry["bundle"] = {"file": strings[extra["bundle_file"]], "offset": extra["bundle_offset"],
+                               "length": extra["bundle_length"]}
+        if extra.get("rollups") is not None:
+            entry["rollups"] = strings[extra["rollups"]]
+        entries.append(entry)
+    return entries
+
+
+def write_index_shards(index_list: List[dict], shards_dir: str = SHARDS_DIR,
+                       shard_format: str = DEFAULT_SHARD_FORMAT) -> dict:
+    """
+    依分類將索引拆成多個分片並寫出分片清單，載入端只需下載問題相關的分片。
+    只重寫內容有變動的分片，並刪除已不存在分類的舊分片。
+
+    Returns:
+        dict: {"shards", "written", "removed", "bytes"}
+    """
+    if shard_format not in SHARD_FORMATS:
+        raise ValueError(f"未知的分片格式：{shard_format}")
+    extension = SHARD_FORMATS[shard_format]
+    os.makedirs(shards_dir, exist_ok=True)
+
+    by_category: Dict[str, List[dict]] = {}
+    for entry in index_list:
+        by_category.setdefault(entry["category"], []).append(entry)
+    url_base = _url_base(index_list)
+
+    listing = []
+    written = total_bytes = 0
+    for category in sorted(by_category):
+        entries = by_category[category]
+        data = _encode(build_shard(category, entries, url_base), shard_format)
+        filename = category + extension
+        written += write_if_changed(os.path.join(shards_dir, filename), data)
+        total_bytes += len(data)
+        listing.append({
+            "category": category,
+            "product_name": entries[0]["product_name"],
+            "file": filename,
+            "entries": len(entries),
+            "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        })
+
+    manifest = {
+        "version": SHARD_FORMAT_VERSION,
+        "format": shard_format,
+        "url_base": url_base,
+        "entries": len(index_list),
+        "shards": listing,
+    }
+    if os.path.exists(ROLLUPS_FILE):
+        # 彙總統計（件數、罰鍰）不屬於任何分類，由清單指向，統計類問題不必下載分片
+        manifest["rollups"] = os.path.relpath(ROLLUPS_FILE, shards_dir).replace("\\", "/")
+    manifest_path = os.path.join(shards_dir, os.path.basename(SHARDS_MANIFEST_FILE))
+    manifest_data = json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    written += write_if_changed(manifest_path, manifest_data)
+
+    # 移除已不存在分類（或改用其他格式前）留下的分片
+    current = {item["file"] for item in listing} | {os.path.basename(manifest_path)}
+    removed = 0
+    for name in os.listdir(shards_dir):
+        if name not in current and name.endswith(tuple(SHARD_FORMATS.values())):
+            os.remove(os.path.join(shards_dir, name))
+            removed += 1
+
+    return {"shards": len(listing), "written": written, "removed": removed, "bytes": total_bytes}
+
+
+def load_shards_manifest(manifest_path: str = SHARDS_MANIFEST_FILE) -> dict:
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_index_shards(categories: Optional[Iterable[str]] = None,
+                      manifest_path: str = SHARDS_MANIFEST_FILE) -> List[dict]:
+    """
+    只讀取指定分類的分片並還原為 index.json 格式的條目；未指定分類時讀取全部。
+    例如 load_index_shards(["product_weider_probiotic"]) 只會讀取該產品的分片。
+    """
+    manifest = load_shards_manifest(manifest_path)
+    wanted = set(categories) if categories is not None else None
+    shards_dir = os.path.dirname(manifest_path)
+
+    entries = []
+    for item in manifest["shards"]:
+        if wanted is not None and item["category"] not in wanted:
+            continue
+        with open(os.path.join(shards_dir, item["file"]), "rb") as f:
+            entries.extend(expand_shard(_decode(f.read(), manifest["format"])))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="由 index.json 產生依分類拆分的精簡索引分片")
+    parser.add_argument("--index", default="index.json", help="來源 index.json")
+    parser.add_argument("--format", choices=list(SHARD_FORMATS), default=DEFAULT_SHARD_FORMAT, help="分片編碼")
+    args = parser.parse_args()
+
+    with open(args.index, "r", encoding="utf-8") as f:
+        index_list = json.load(f)
+    stats = write_index_shards(index_list, shard_format=args.format)
+    print(f"✅ 已產出 {stats['shards']} 個索引分片（{args.format}，共 {stats['bytes']} bytes），"
+          f"更新 {stats['written']} 個檔案、移除 {stats['removed']} 個舊分片")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import platform
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+# 各工具共用的量測層：記錄每個階段與檔案的耗時、輸入輸出的位元組數、頁數、列數、
+# 快取命中與略過次數，以及記憶體峰值，寫成結構化的 JSON；--profile 時另外輸出各階段的 cProfile 檔。
+# 未啟用時各工具收到的 metrics 為 None，只多一次 is None 判斷。
+#
+# 使用方式（各工具的 main）：
+#     metrics = metrics_from_args(args)
+#     with stage_metrics(metrics, MANIFEST_STAGE) as stage:
+#         convert_all_pdfs(..., metrics=stage)
+#     write_metrics(metrics, args)
+
+# 預設的量測結果檔（只在指定 --metrics 時寫出，勿 commit）
+METRICS_FILE = "build_metrics.json"
+METRICS_FORMAT_VERSION = 1
+
+
+def peak_rss_mb() -> float:
+    """目前為止本行程與已結束子行程（行程池）的記憶體峰值，取兩者較大者"""
+    try:
+        import resource
+    except ImportError:  # Windows 沒有 resource 模組
+        return 0.0
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)  # macOS 為 bytes，Linux 為 KB
+
+
+class StageMetrics:
+    """單一階段的計數器與各檔案的明細，由各工具在處理檔案時填入"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.peak_rss_mb = 0.0
+        self.counters: Dict[str, float] = {}
+        self.files: Dict[str, dict] = {}
+
+    def add(self, **counters):
+        """累加階段層級的計數，例如 add(skipped=1, cache_hits=3)"""
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def file(self, path: str, seconds: Optional[float] = None, **counters):
+        """
+        記錄單一檔案的耗時與計數（同一檔案多次記錄時累加），計數同時累加到階段層級，
+        例如 file("x.pdf", seconds=0.3, bytes_in=1024, pages=4)
+        """
+        entry = self.files.setdefault(path, {})
+        if seconds is not None:
+            entry["seconds"] = round(entry.get("seconds", 0) + seconds, 4)
+        for key, value in counters.items():
+            entry[key] = entry.get(key, 0) + value
+        self.add(**counters)
+
+    @contextmanager
+    def time_file(self, path: str, **counters):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.file(path, seconds=time.perf_counter() - started, **counters)
+
+    def to_dict(self) -> dict:
+        slowest = sorted(self.files.items(), key=lambda item: -item[1].get("seconds", 0))
+        return {
+            "seconds": round(self.seconds, 4),
+            "peak_rss_mb": self.peak_rss_mb,
+            "counters": dict(sorted(self.counters.items())),
+            "files": dict(slowest),
+        }
+
+
+class Metrics:
+    """
+    一次執行（單一工具或整個 tools/pipeline.py）的量測結果。
+    profile_dir 指定時，每個階段以 cProfile 剖析並輸出 <profile_dir>/<階段>.pstats，
+    可用 python -m pstats 或 snakeviz 檢視。
+    """
+
+    def __init__(self, profile_dir: Optional[str] = None):
+        self.profile_dir = profile_dir
+        self.started = time.perf_counter()
+        self.stages: Dict[str, StageMetrics] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        stage = self.stages.setdefault(name, StageMetrics(name))
+        profiler = None
+        if self.profile_dir:
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds += time.perf_counter() - started
+            stage.peak_rss_mb = peak_rss_mb()
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profile_path = os.path.join(self.profile_dir, f"{name}.pstats")
+                profiler.dump_stats(profile_path)
+                print(f"🔬 [{name}] cProfile 已輸出：{profile_path}")
+
+    def to_dict(self) -> dict:
+        return {
+            "version": METRICS_FORMAT_VERSION,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seconds": round(time.perf_counter() - self.started, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+        }
+
+    def write(self, path: str = METRICS_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"📊 量測結果已寫入 {path}")
+
+
+@contextmanager
+def stage_metrics(metrics: Optional[Metrics], name: str):
+    """metrics 為 None（未啟用）時直接交出 None，工具內的量測全部略過"""
+    if metrics is None:
+        yield None
+        return
+    with metrics.stage(name) as stage:
+        yield stage
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics", nargs="?", const=METRICS_FILE, default=None, metavar="PATH",
+                        help=f"將各階段與檔案的耗時、位元組數、快取命中與記憶體峰值寫成 JSON（預設 {METRICS_FILE}）")
+    parser.add_argument("--profile", default=None, metavar="DIR",
+                        help="以 cProfile 剖析各階段，輸出 <DIR>/<階段>.pstats")
+
+
+def metrics_from_args(args) -> Optional[Metrics]:
+    if not args.metrics and not args.profile:
+        return None
+    return Metrics(profile_dir=args.profile)
+
+
+def write_metrics(metrics: Optional[Metrics], args):
+    if metrics is not None and args.metrics:
+        metrics.write(args.metrics)
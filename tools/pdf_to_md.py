@@ -1,49 +1,291 @@
 import os
-import PyPDF2
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from build_manifest import BuildManifest
+from metrics import add_metrics_arguments, metrics_from_args, stage_metrics, write_metrics
 
 # PDF 來源與 .md 輸出位置（可自訂分類）
 PDF_DIR = "original_file/pdfs"
 MD_OUTPUT_DIR = "knowledge/law"
 
-# 確保輸出資料夾存在
-os.makedirs(MD_OUTPUT_DIR, exist_ok=True)
+# 建置清單中的階段名稱與工具版本（轉換邏輯變動時請遞增版本，既有輸出會被重新轉換）
+MANIFEST_STAGE = "pdf_to_md"
+TOOL_VERSION = "1"
+
+# 平行模式下，超過此大小的 PDF 會再依頁數切成多個工作分給不同行程
+LARGE_PDF_BYTES = 5 * 1024 * 1024
+# 大型 PDF 每個工作負責的頁數
+PAGES_PER_TASK = 20
 
 def extract_text_from_pdf_pypdf2(pdf_path):
-    text = ""
+    import PyPDF2  # 延遲載入，所有 PDF 都未變動時不必載入
+
+    pages = []
     try:
         with open(pdf_path, 'rb') as file:
             reader = PyPDF2.PdfReader(file)
             for page_num in range(len(reader.pages)):
                 page = reader.pages[page_num]
-                text += page.extract_text() + "\n"  # 提取每頁文字並換行
+                pages.append(page.extract_text() + "\n")  # 提取每頁文字並換行
     except Exception as e:
         print(f"❌ 無法處理 PDF 檔案：{pdf_path}，錯誤：{e}")
-    return text
+    return "".join(pages)
+
+def count_pdf_pages(pdf_path):
+    """回傳 PDF 頁數"""
+    import PyPDF2
+
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def extract_pdf_pages_to_file(pdf_path, output_path, start=0, end=None):
+    """
+    將 PDF 第 [start, end) 頁的文字逐頁寫入 output_path，
+    不在記憶體中累積整份文件。回傳 (處理頁數, 字元數)。
+    """
+    import PyPDF2
+
+    chars = 0
+    with open(pdf_path, 'rb') as file, open(output_path, 'w', encoding='utf-8') as out:
+        reader = PyPDF2.PdfReader(file)
+        end = len(reader.pages) if end is None else min(end, len(reader.pages))
+        for page_num in range(start, end):
+            page_text = reader.pages[page_num].extract_text()
+            out.write(page_text)
+            out.write("\n")  # 提取每頁文字並換行
+            chars += len(page_text)
+    return max(end - start, 0), chars
+
+def _extract_task(pdf_path, output_path, start=0, end=None):
+    """行程池中執行的工作：錯誤以字串回傳，單一檔案失敗不會中斷整批。回傳 (頁數, 字元數, 錯誤, 耗時秒數)"""
+    started = time.perf_counter()
+    try:
+        pages, chars = extract_pdf_pages_to_file(pdf_path, output_path, start, end)
+        return pages, chars, None, time.perf_counter() - started
+    except Exception as e:
+        return 0, 0, str(e), time.perf_counter() - started
+
+def _merge_parts(part_paths, output_path):
+    """依序串接各頁段的暫存檔，再移除暫存檔"""
+    with open(output_path, 'wb') as out:
+        for part_path in part_paths:
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, out)
+    _remove_files(part_paths)
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _plan_tasks(pdf_path, md_path):
+    """
+    規劃單一 PDF 的工作：一般檔案整份一個工作，
+    大型檔案依 PAGES_PER_TASK 切成多個頁段，各自寫入暫存檔。
+    回傳 [(start, end, 暫存檔路徑), ...]
+    """
+    tmp_path = md_path + ".tmp"
+    if os.path.getsize(pdf_path) < LARGE_PDF_BYTES:
+        return [(0, None, tmp_path)]
+    page_count = count_pdf_pages(pdf_path)
+    if page_count <= PAGES_PER_TASK:
+        return [(0, None, tmp_path)]
+    return [
+        (start, start + PAGES_PER_TASK, f"{tmp_path}.{i:04d}")
+        for i, start in enumerate(range(0, page_count, PAGES_PER_TASK))
+    ]
+
+def _convert_sequential(pending, file_stats=None):
+    """逐一轉換，回傳 {pdf_file: 錯誤訊息或 None}；file_stats 提供時填入各檔案的 {"seconds", "pages", "chars"}"""
+    outcomes = {}
+    for pdf_file, pdf_path, md_path in pending:
+        tmp_path = md_path + ".tmp"
+        pages, chars, error, elapsed = _extract_task(pdf_path, tmp_path)
+        outcomes[pdf_file] = _finalize(tmp_path, md_path, chars, error)
+        if file_stats is not None:
+            file_stats[pdf_file] = {"seconds": elapsed, "pages": pages, "chars": chars}
+    return outcomes
+
+def _convert_parallel(pending, workers, file_stats=None):
+    """
+    以行程池轉換，回傳 {pdf_file: 錯誤訊息或 None}；
+    file_stats 提供時填入各檔案的 {"seconds", "pages", "chars"}（大型 PDF 為各頁段耗時的總和）
+    """
+    outcomes = {}
+    jobs = {}  # pdf_file -> {"md_path", "parts", "remaining", "chars", "error"}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for pdf_file, pdf_path, md_path in pending:
+            try:
+                tasks = _plan_tasks(pdf_path, md_path)
+            except Exception as e:
+                outcomes[pdf_file] = str(e)
+                continue
+            jobs[pdf_file] = {
+                "md_path": md_path,
+                "parts": [part_path for _, _, part_path in tasks],
+                "remaining": len(tasks),
+                "chars": 0,
+                "error": None,
+            }
+            for start, end, part_path in tasks:
+                future = executor.submit(_extract_task, pdf_path, part_path, start, end)
+                futures[future] = pdf_file
+
+        for future in as_completed(futures):
+            pdf_file = futures[future]
+            job = jobs[pdf_file]
+            try:
+                pages, chars, error, elapsed = future.result()
+            except Exception as e:  # 例如工作行程異常結束
+                pages, chars, error, elapsed = 0, 0, str(e), 0.0
+            if file_stats is not None:
+                stats = file_stats.setdefault(pdf_file, {"seconds": 0.0, "pages": 0, "chars": 0})
+                stats["seconds"] += elapsed
+                stats["pages"] += pages
+                stats["chars"] += chars
+            job["chars"] += chars
+            job["error"] = job["error"] or error
+            job["remaining"] -= 1
+            if job["remaining"]:
+                continue
+
+            tmp_path = job["md_path"] + ".tmp"
+            if len(job["parts"]) > 1 and job["error"] is None:
+                _merge_parts(job["parts"], tmp_path)
+            elif len(job["parts"]) > 1:
+                _remove_files(job["parts"])
+            outcomes[pdf_file] = _finalize(tmp_path, job["md_path"], job["chars"], job["error"])
 
-# 遍歷 pdfs 資料夾
-pdf_files = [f for f in os.listdir(PDF_DIR) if f.endswith(".pdf")]
+    return outcomes
 
-if not pdf_files:
-    print("⚠️ 沒有找到任何 PDF 檔案。")
-else:
+def _finalize(tmp_path, md_path, chars, error):
+    """成功時以暫存檔取代正式輸出，失敗或無內容時清掉暫存檔"""
+    if error is None and chars > 0:
+        os.replace(tmp_path, md_path)
+        return None
+    _remove_files([tmp_path])
+    return error or "無法提取內容"
+
+def convert_pdf(pdf_path, md_output_dir=MD_OUTPUT_DIR, manifest=None):
+    """
+    轉換單一 PDF（tools/watch.py 只處理有變動的檔案時使用），成功時記錄到建置清單。
+
+    Returns:
+        tuple: (輸出的 .md 路徑, 錯誤訊息或 None)
+    """
+    os.makedirs(md_output_dir, exist_ok=True)
+    md_path = os.path.join(md_output_dir, os.path.splitext(os.path.basename(pdf_path))[0] + ".md")
+    tmp_path = md_path + ".tmp"
+    _, chars, error, _ = _extract_task(pdf_path, tmp_path)
+    error = _finalize(tmp_path, md_path, chars, error)
+    if error is None and manifest is not None:
+        manifest.record(MANIFEST_STAGE, pdf_path, TOOL_VERSION, [md_path])
+    return md_path, error
+
+def convert_all_pdfs(pdf_dir=PDF_DIR, md_output_dir=MD_OUTPUT_DIR, manifest=None, workers=1, metrics=None):
+    """
+    將 pdf_dir 下所有 PDF 轉為 Markdown。
+    有提供 manifest 時，以內容雜湊判斷是否需要重新轉換，
+    PDF 更新或輸出檔被改動、刪除時都會重新轉換。
+    workers 大於 1 時以行程池平行處理，大型 PDF 會再依頁數拆分；
+    各頁文字直接串流寫入檔案，個別檔案的錯誤會收集在結果中而不中斷整批。
+    metrics（tools/metrics.py 的 StageMetrics）提供時記錄各檔案的耗時、頁數與輸入輸出位元組數。
+
+    Returns:
+        dict: {"success", "failed", "skipped", "total", "errors": {檔名: 錯誤訊息}}
+    """
+    # 確保輸出資料夾存在
+    os.makedirs(md_output_dir, exist_ok=True)
+
+    pdf_files = sorted(f for f in os.listdir(pdf_dir) if f.endswith(".pdf"))
+    results = {"success": 0, "failed": 0, "skipped": 0, "total": len(pdf_files), "errors": {}}
+
+    if not pdf_files:
+        print("⚠️ 沒有找到任何 PDF 檔案。")
+        return results
+
+    pending = []
     for pdf_file in pdf_files:
-        pdf_path = os.path.join(PDF_DIR, pdf_file)
+        pdf_path = os.path.join(pdf_dir, pdf_file)
         md_filename = os.path.splitext(pdf_file)[0] + ".md"
-        md_path = os.path.join(MD_OUTPUT_DIR, md_filename)
+        md_path = os.path.join(md_output_dir, md_filename)
 
-        # 跳過已轉換的 PDF
-        if os.path.exists(md_path):
-            print(f"⏭️ 已存在，略過：{md_filename}")
+        if manifest is None:
+            # 沒有建置清單時維持舊行為：跳過已轉換的 PDF
+            if os.path.exists(md_path):
+                print(f"⏭️ 已存在，略過：{md_filename}")
+                results["skipped"] += 1
+                continue
+        elif manifest.is_up_to_date(MANIFEST_STAGE, pdf_path, TOOL_VERSION):
+            print(f"⏭️ 未變動，略過：{md_filename}")
+            results["skipped"] += 1
             continue
+        elif not manifest.outputs(MANIFEST_STAGE, pdf_path) and os.path.exists(md_path):
+            # 清單中還沒有這筆記錄（首次啟用清單），沿用既有的 .md 作為基準
+            manifest.record(MANIFEST_STAGE, pdf_path, TOOL_VERSION, [md_path])
+            print(f"⏭️ 已存在，納入建置清單：{md_filename}")
+            results["skipped"] += 1
+            continue
+
+        pending.append((pdf_file, pdf_path, md_path))
 
-        content = extract_text_from_pdf_pypdf2(pdf_path)
+    file_stats = {} if metrics is not None else None
+    if workers > 1 and len(pending) > 0:
+        outcomes = _convert_parallel(pending, workers, file_stats)
+    else:
+        outcomes = _convert_sequential(pending, file_stats)
 
-        if content:
-            with open(md_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            print(f"✅ 已轉換：{pdf_file} ➝ {md_filename}")
+    for pdf_file, pdf_path, md_path in pending:
+        error = outcomes.get(pdf_file, "未執行")
+        if metrics is not None:
+            stats = file_stats.get(pdf_file, {})
+            metrics.file(pdf_file, seconds=stats.get("seconds", 0.0), pages=stats.get("pages", 0),
+                         chars_out=stats.get("chars", 0), bytes_in=os.path.getsize(pdf_path),
+                         bytes_out=os.path.getsize(md_path) if error is None else 0)
+        if error is None:
+            if manifest is not None:
+                manifest.record(MANIFEST_STAGE, pdf_path, TOOL_VERSION, [md_path])
+            results["success"] += 1
+            print(f"✅ 已轉換：{pdf_file} ➝ {os.path.basename(md_path)}")
         else:
-            print(f"⚠️ 無法提取內容：{pdf_file}")
+            results["failed"] += 1
+            results["errors"][pdf_file] = error
+            print(f"❌ 無法處理 PDF 檔案：{pdf_path}，錯誤：{error}")
+
+    if manifest is not None:
+        manifest.prune(MANIFEST_STAGE, [os.path.join(pdf_dir, f) for f in pdf_files])
+    if metrics is not None:
+        metrics.add(files=results["total"], converted=results["success"], skipped=results["skipped"],
+                    failed=results["failed"])
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="將 PDF 轉換為 Markdown")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="平行處理的行程數，0 代表使用全部 CPU 核心（預設 1，逐一處理）")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    metrics = metrics_from_args(args)
+
+    with BuildManifest() as build_manifest, stage_metrics(metrics, MANIFEST_STAGE) as stage:
+        results = convert_all_pdfs(manifest=build_manifest, workers=workers, metrics=stage)
+    write_metrics(metrics, args)
+
+    print(f"完成：成功 {results['success']}，略過 {results['skipped']}，失敗 {results['failed']}")
+
+
+if __name__ == "__main__":
+    main()
 
 # 使用範例：
 # 請將 'your_document.pdf' 替換為您實際的 PDF 檔案路徑
@@ -0,0 +1,270 @@
+import os
+import sys
+import time
+import logging
+import argparse
+
+from build_manifest import BuildManifest
+from metrics import add_metrics_arguments, metrics_from_args, stage_metrics, write_metrics
+
+# 單一行程依序執行的建置階段，以 DAG 描述相依關係（維護點：新增階段時在這裡註冊）
+#   pdf   - PDF 轉 Markdown（tools/pdf_to_md.py）
+#   csv   - CSV 轉 Markdown（tools/csv_to_md.py）
+#   cases - 處罰案件統計表解析為 SQLite（tools/extract_cases.py）
+#   rollups - 由案件資料庫預先彙總各月份、類別、法條、商號、來源的件數與罰鍰（tools/case_rollups.py）
+#   chunk - 切割整個知識庫（tools/chunk_md.py）
+#   dedup - 以 MinHash/LSH 找出近似重複的 chunk（tools/dedup_chunks.py）
+#   index - 產生 index.json、BM25 檢索索引、向量索引與分面索引（tools/generate_index.py）
+#           （分面索引的公司詞典取自 cases 階段的案件資料庫；cases 依宣告順序先執行，
+#            但不列為相依，案件解析失敗時索引仍照常產生，只是少了公司分面的更新）
+# 各階段的模組在執行到該階段時才載入，pandas、PyPDF2 也只在真的有檔案要轉換時才載入。
+STAGE_DEPENDENCIES = {
+    "pdf": [],
+    "csv": [],
+    "cases": ["pdf"],
+    "rollups": ["cases"],
+    "chunk": ["pdf", "csv"],
+    "dedup": ["chunk"],
+    "index": ["chunk", "dedup"],
+}
+
+
+def _run_pdf(context):
+    from pdf_to_md import convert_all_pdfs
+
+    return convert_all_pdfs(manifest=context["manifest"], workers=context["workers"], metrics=context["metrics"])
+
+
+def _run_csv(context):
+    from csv_to_md import batch_convert_csv_to_md
+
+    return batch_convert_csv_to_md("original_file/csvs/", "knowledge/", manifest=context["manifest"],
+                                   metrics=context["metrics"])
+
+
+def _run_cases(context):
+    from extract_cases import build_case_store
+
+    return build_case_store(manifest=context["manifest"])
+
+
+def _run_rollups(context):
+    from case_rollups import build_case_rollups
+
+    return build_case_rollups(manifest=context["manifest"])
+
+
+def _run_chunk(context):
+    from chunk_md import process_knowledge_tree
+    from generate_index import relative_chunk_path
+
+    results = process_knowledge_tree(manifest=context["manifest"], workers=context["workers"],
+                                     metrics=context["metrics"], **context["chunk_options"])
+    # 剛切出的 chunk 內文直接交給去重與索引階段，不再讀回磁碟
+    context["texts"].update((relative_chunk_path(path), text) for path, text in results.pop("chunk_texts").items())
+    return results
+
+
+def _chunk_files(context):
+    """切割階段有執行時直接沿用它回傳的 chunk 清單，否則走訪 knowledge_chunks/"""
+    from generate_index import list_chunk_files
+
+    chunk_results = context["results"].get("chunk")
+    return chunk_results["chunk_files"] if chunk_results else list_chunk_files()
+
+
+def _run_dedup(context):
+    from dedup_chunks import dedup_chunks
+    from generate_index import relative_chunk_path
+
+    chunk_files = [relative_chunk_path(f) for f in _chunk_files(context)]
+    clusters = dedup_chunks(chunk_files, manifest=context["manifest"], texts=context["texts"])
+    return {"clusters": clusters, "duplicates": sum(len(aliases) for aliases in clusters.values())}
+
+
+def _run_index(context):
+    from generate_index import generate_index, write_shards
+    from search_index import build_search_index
+    from vector_index import build_vector_index
+    from facets import build_facet_index
+
+    # 去重階段未執行時（例如 --skip dedup），索引列出所有 chunk
+    dedup_results = context["results"].get("dedup")
+    index_list = generate_index(manifest=context["manifest"], chunk_files=_chunk_files(context),
+                                bundle_by=context["bundle_by"],
+                                aliases=dedup_results["clusters"] if dedup_results else None,
+                                estimator=context["chunk_options"].get("estimator", "cjk"),
+                                metrics=context["metrics"], texts=context["texts"])
+    rebuilt = build_search_index(index_list, manifest=context["manifest"], texts=context["texts"])
+    vectors_rebuilt = build_vector_index(index_list, manifest=context["manifest"], texts=context["texts"])
+    facets_rebuilt = build_facet_index(index_list, manifest=context["manifest"], texts=context["texts"])
+    if context["shard_format"]:
+        write_shards(index_list, context["shard_format"])
+    return {"entries": len(index_list), "search_index_rebuilt": rebuilt, "vector_index_rebuilt": vectors_rebuilt,
+            "facet_index_rebuilt": facets_rebuilt}
+
+
+STAGE_RUNNERS = {
+    "pdf": _run_pdf,
+    "csv": _run_csv,
+    "cases": _run_cases,
+    "rollups": _run_rollups,
+    "chunk": _run_chunk,
+    "dedup": _run_dedup,
+    "index": _run_index,
+}
+
+
+def resolve_stages(only=None, skip=None, with_dependencies=False):
+    """
+    依相依順序回傳要執行的階段。
+    only 指定時只執行這些階段；with_dependencies 為 True 時一併執行它們的上游階段。
+    未執行的上游階段不會重跑，下游改讀磁碟上的既有產出。
+    """
+    unknown = set(only or []) | set(skip or [])
+    unknown -= set(STAGE_DEPENDENCIES)
+    if unknown:
+        raise ValueError(f"未知的階段：{', '.join(sorted(unknown))}")
+
+    selected = set(only) if only else set(STAGE_DEPENDENCIES)
+    if with_dependencies:
+        pending = list(selected)
+        while pending:
+            for dependency in STAGE_DEPENDENCIES[pending.pop()]:
+                if dependency not in selected:
+                    selected.add(dependency)
+                    pending.append(dependency)
+    selected -= set(skip or [])
+
+    ordered = []
+    visited = set()
+
+    def visit(stage):
+        if stage in visited:
+            return
+        visited.add(stage)
+        for dependency in STAGE_DEPENDENCIES[stage]:
+            visit(dependency)
+        if stage in selected:
+            ordered.append(stage)
+
+    for stage in STAGE_DEPENDENCIES:
+        visit(stage)
+    return ordered
+
+
+def downstream_stages(stages):
+    """
+    依相依順序回傳直接或間接依賴 stages 的下游階段（不含 stages 本身），
+    例如 tools/watch.py 處理完變動的來源後，以此決定還有哪些階段的產出需要更新。
+    """
+    affected = set(stages)
+    downstream = []
+    for stage in resolve_stages():
+        if stage not in affected and affected.intersection(STAGE_DEPENDENCIES[stage]):
+            affected.add(stage)
+            downstream.append(stage)
+    return downstream
+
+
+def run_pipeline(stages, manifest=None, workers=1, chunk_options=None, shard_format=None, bundle_by=None,
+                 metrics=None):
+    """
+    在同一個行程中依序執行各階段，階段之間以記憶體中的結果交接，
+    整個流程共用同一份建置清單，最後只寫回一次。
+    切割階段寫出的 chunk 內文保留在 context["texts"]，去重、索引、檢索、向量與分面索引直接取用，
+    其餘 chunk 也只在第一次用到時讀檔一次。
+    shard_format 指定時，索引階段另外輸出依分類拆分的索引分片；
+    bundle_by 指定時，索引階段另將 chunks 打包為 bundle 並在索引中記錄位移。
+    metrics（tools/metrics.py 的 Metrics）提供時，各階段的量測記錄在同名的階段下。
+
+    Returns:
+        dict: {"results": {階段: 該階段回傳的結果}, "timings": {階段: 秒}, "errors": {階段: 錯誤}}
+    """
+    context = {
+        "manifest": manifest,
+        "workers": workers,
+        "chunk_options": chunk_options or {},
+        "shard_format": shard_format,
+        "bundle_by": bundle_by,
+        "results": {},
+        "texts": {},
+        "metrics": None,
+    }
+    timings = {}
+    errors = {}
+
+    for stage in stages:
+        failed_dependencies = [d for d in STAGE_DEPENDENCIES[stage] if d in errors]
+        if failed_dependencies:
+            errors[stage] = f"上游階段失敗：{', '.join(failed_dependencies)}"
+            print(f"⏭️ [{stage}] 略過，{errors[stage]}")
+            continue
+
+        print(f"\n▶️ [{stage}] 開始")
+        started = time.perf_counter()
+        with stage_metrics(metrics, stage) as context["metrics"]:
+            try:
+                context["results"][stage] = STAGE_RUNNERS[stage](context)
+            except Exception as e:
+                errors[stage] = str(e)
+                print(f"❌ [{stage}] 失敗：{e}")
+        timings[stage] = round(time.perf_counter() - started, 4)
+        print(f"⏱️ [{stage}] {timings[stage]:.3f}s")
+
+    return {"results": context["results"], "timings": timings, "errors": errors}
+
+
+def _parse_stage_list(value):
+    return [s.strip() for s in value.split(",") if s.strip()] if value else None
+
+
+def main():
+    from chunk_md import CHUNK_MODES, DEFAULT_CHUNK_MODE, DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, TOKEN_ESTIMATORS
+    from csv_to_md import LOG_FORMAT
+    from index_shards import SHARD_FORMATS
+    from chunk_bundles import BUNDLE_GROUPINGS
+
+    parser = argparse.ArgumentParser(description="在單一行程中執行 轉換 → 切割 → 索引 的完整建置流程")
+    parser.add_argument("--only", help=f"只執行指定階段，以逗號分隔（可用：{', '.join(STAGE_DEPENDENCIES)}）")
+    parser.add_argument("--skip", help="略過指定階段，以逗號分隔")
+    parser.add_argument("--with-deps", action="store_true", help="搭配 --only 時一併執行上游階段")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="PDF 轉換與切割的平行行程數，0 代表使用全部 CPU 核心（預設 1）")
+    parser.add_argument("--mode", choices=CHUNK_MODES, default=DEFAULT_CHUNK_MODE, help="切割模式")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="每個 chunk 的 token 上限")
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS, help="相鄰 chunk 的重疊 token 數")
+    parser.add_argument("--estimator", choices=list(TOKEN_ESTIMATORS), default="cjk", help="長度估算方式")
+    parser.add_argument("--shards", choices=list(SHARD_FORMATS), default=None,
+                        help="索引階段另外輸出依分類拆分的索引分片（json、gzip 或 msgpack）")
+    parser.add_argument("--bundles", choices=BUNDLE_GROUPINGS, default=None,
+                        help="索引階段將 chunks 依分類或來源文件打包為 bundle，並在索引中記錄位移與長度")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    try:
+        stages = resolve_stages(_parse_stage_list(args.only), _parse_stage_list(args.skip), args.with_deps)
+    except ValueError as e:
+        parser.error(str(e))
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    chunk_options = {"mode": args.mode, "max_tokens": args.max_tokens,
+                     "overlap_tokens": args.overlap_tokens, "estimator": args.estimator}
+
+    metrics = metrics_from_args(args)
+    started = time.perf_counter()
+    with BuildManifest() as build_manifest:
+        outcome = run_pipeline(stages, manifest=build_manifest, workers=workers, chunk_options=chunk_options,
+                               shard_format=args.shards, bundle_by=args.bundles, metrics=metrics)
+    write_metrics(metrics, args)
+
+    print(f"\n✅ 建置流程完成（{time.perf_counter() - started:.3f}s）："
+          + "，".join(f"{stage} {seconds:.3f}s" for stage, seconds in outcome["timings"].items()))
+    if outcome["errors"]:
+        for stage, error in outcome["errors"].items():
+            print(f"❌ {stage}：{error}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import json
+import argparse
+from typing import Dict, List, Sequence, Tuple
+
+# 每個 chunk 放進 prompt 時額外的分隔與來源標示（標題、網址等）所需的 token 數
+CHUNK_OVERHEAD_TOKENS = 16
+# 動態規劃時 token 預算最多切成幾格；chunk 大小一律無條件進位到格子，選出的組合保證不超過預算
+KNAPSACK_RESOLUTION = 2048
+
+# 選擇方式：
+#   knapsack - 在預算內使分數總和最大（0/1 背包），較小的次要 chunk 可以補滿預算
+#   greedy   - 依排名放入，放不下就略過，結果較容易預測
+PACKING_STRATEGIES = ("knapsack", "greedy")
+DEFAULT_STRATEGY = "knapsack"
+
+
+def _cost(entry: dict, overhead: int) -> int:
+    return int(entry["tokens"]) + overhead
+
+
+def _pack_greedy(costs: List[int], budget: int) -> List[int]:
+    chosen, used = [], 0
+    for i, cost in enumerate(costs):
+        if used + cost <= budget:
+            chosen.append(i)
+            used += cost
+    return chosen
+
+
+def _pack_knapsack(costs: List[int], scores: List[float], budget: int) -> List[int]:
+    unit = max(1, -(-budget // KNAPSACK_RESOLUTION))
+    capacity = budget // unit
+    weights = [-(-cost // unit) for cost in costs]
+
+    # best[c]：容量 c 內可得的最高分；keep[i][c]：第 i 個候選是否在容量 c 的最佳解中
+    best = [0.0] * (capacity + 1)
+    keep = []
+    for weight, score in zip(weights, scores):
+        taken = [False] * (capacity + 1)
+        if score > 0:
+            for c in range(capacity, weight - 1, -1):
+                candidate = best[c - weight] + score
+                if candidate > best[c]:
+                    best[c] = candidate
+                    taken[c] = True
+        keep.append(taken)
+
+    chosen = []
+    c = capacity
+    for i in range(len(costs) - 1, -1, -1):
+        if keep[i][c]:
+            chosen.append(i)
+            c -= weights[i]
+    return sorted(chosen)
+
+
+def pack_prompt(candidates: Sequence[Tuple[dict, float]], token_budget: int,
+                strategy: str = DEFAULT_STRATEGY, overhead: int = CHUNK_OVERHEAD_TOKENS) -> dict:
+    """
+    依檢索排名與 index.json 的 tokens 欄位，挑出放得進 token 預算的 chunk 組合，不需要下載 chunk。
+
+    Args:
+        candidates: 依排名排序的 [(索引條目, 分數), ...]
+        token_budget: 可用於 chunk 內容的 token 數
+        strategy: knapsack 或 greedy（見 PACKING_STRATEGIES）
+        overhead: 每個 chunk 額外的 token 數
+
+    Returns:
+        dict: {"selected": 依排名排序的條目, "tokens": 使用的 token 數（含 overhead）, "skipped": 未選入的條目}
+    """
+    if strategy not in PACKING_STRATEGIES:
+        raise ValueError(f"未知的選擇方式：{strategy}")
+    costs = [_cost(entry, overhead) for entry, _ in candidates]
+    if strategy == "greedy" or token_budget <= 0:
+        chosen = _pack_greedy(costs, max(token_budget, 0))
+    else:
+        chosen = _pack_knapsack(costs, [score for _, score in candidates], token_budget)
+
+    chosen_set = set(chosen)
+    return {
+        "selected": [candidates[i][0] for i in chosen],
+        "tokens": sum(costs[i] for i in chosen),
+        "skipped": [entry for i, (entry, _) in enumerate(candidates) if i not in chosen_set],
+    }
+
+
+def pack_ranked_files(ranked: Sequence[Tuple[str, float]], index_list: List[dict], token_budget: int,
+                      strategy: str = DEFAULT_STRATEGY, overhead: int = CHUNK_OVERHEAD_TOKENS) -> dict:
+    """pack_prompt 的便利版本：ranked 為檢索結果 [(chunk 路徑, 分數), ...]，例如 BM25Index.search 的回傳值"""
+    by_file: Dict[str, dict] = {entry["file"]: entry for entry in index_list}
+    candidates = [(by_file[chunk_file], score) for chunk_file, score in ranked if chunk_file in by_file]
+    return pack_prompt(candidates, token_budget, strategy, overhead)
+
+
+def main():
+    from search_index import BM25Index
+
+    parser = argparse.ArgumentParser(description="以 BM25 檢索並在 token 預算內挑選要放進 prompt 的 chunk")
+    parser.add_argument("query", help="查詢問題")
+    parser.add_argument("--budget", type=int, default=4000, help="chunk 內容可用的 token 數")
+    parser.add_argument("--candidates", type=int, default=20, help="參與挑選的檢索結果數")
+    parser.add_argument("--strategy", choices=PACKING_STRATEGIES, default=DEFAULT_STRATEGY, help="選擇方式")
+    parser.add_argument("--index", default="index.json", help="index.json 路徑")
+    args = parser.parse_args()
+
+    with open(args.index, "r", encoding="utf-8") as f:
+        index_list = json.load(f)
+    ranked = BM25Index.load().search(args.query, top_k=args.candidates)
+    packed = pack_ranked_files(ranked, index_list, args.budget, args.strategy)
+    for entry in packed["selected"]:
+        print(f"{entry['tokens']:6d}  {entry['file']}")
+    print(f"✅ 選入 {len(packed['selected'])} 個 chunk，共 {packed['tokens']} / {args.budget} tokens，"
+          f"略過 {len(packed['skipped'])} 個")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+import os
+import re
+import json
+import time
+import asyncio
+import argparse
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from search_index import BM25_META_FILE, BM25_POSTINGS_FILE, BM25Index
+from facets import FACETS_FILE, FacetIndex
+from prompt_packing import CHUNK_OVERHEAD_TOKENS, pack_prompt
+
+# 本機檢索服務：與 Cloudflare worker 相同的問題 → 排序後 chunk 內文流程，供壓力測試與效能分析使用
+INDEX_FILE = "index.json"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8787
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 50
+# 指定 token_budget 時先取這麼多名候選再挑選放得進預算的組合（前 top_k 名可能都太大）
+BUDGET_CANDIDATES = MAX_TOP_K
+
+# 查詢結果快取（以正規化後的問題為鍵）與 chunk 內文快取的上限
+RESULT_CACHE_SIZE = 2048
+RESULT_CACHE_TTL = 300.0
+CHUNK_CACHE_BYTES = 64 * 1024 * 1024
+# 每隔幾秒檢查一次 index.json 與 BM25 索引是否更新
+RELOAD_INTERVAL = 2.0
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+KEEP_ALIVE_TIMEOUT = 15.0
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_STATUS_TEXT = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def normalize_question(question: str) -> str:
+    """NFKC 正規化、轉小寫並縮減空白，只差在全半形或空白的問題共用同一筆快取"""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", question)).strip().lower()
+
+
+class TTLCache:
+    """容量有限的 LRU 快取，每筆資料超過 ttl 秒即失效"""
+
+    def __init__(self, max_items: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items: "OrderedDict[object, Tuple[float, object]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key, value):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ChunkCache:
+    """
+    以總位元組數為上限的 chunk 內文 LRU 快取，超過上限時淘汰最久未使用的 chunk。
+    檢索在背景執行緒執行，快取的存取以鎖保護（讀檔在鎖外進行）。
+    """
+
+    def __init__(self, max_bytes: int = CHUNK_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chunk_file: str) -> str:
+        with self._lock:
+            content = self._items.get(chunk_file)
+            if content is not None:
+                self._items.move_to_end(chunk_file)
+                return content
+        with open(chunk_file, "r", encoding="utf-8") as f:
+            content = f.read()
+        with self._lock:
+            if chunk_file not in self._items:
+                self._items[chunk_file] = content
+                self.bytes += len(content.encode("utf-8"))
+            while self.bytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= len(evicted.encode("utf-8"))
+        return content
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Retriever:
+    """
+    載入 index.json 與 BM25 索引，回答「問題 → 排序後的 chunk」。
+    有分面索引時可先依分面條件縮小候選範圍再計分。
+    啟動時依索引順序預先讀入 chunk，直到 chunk 快取的上限為止。
+    """
+
+    def __init__(self, index_file: str = INDEX_FILE, meta_path: str = BM25_META_FILE,
+                 postings_path: str = BM25_POSTINGS_FILE, facets_path: str = FACETS_FILE,
+                 chunk_cache_bytes: int = CHUNK_CACHE_BYTES):
+        self.watched = [index_file, meta_path, postings_path, facets_path]
+        self.signature = self._signature(self.watched)
+        with open(index_file, "r", encoding="utf-8") as f:
+            self.entries = {entry["file"]: entry for entry in json.load(f)}
+        self.bm25 = BM25Index.load(meta_path, postings_path)
+        self.facets = FacetIndex.load(facets_path) if os.path.exists(facets_path) else None
+        self.chunks = ChunkCache(chunk_cache_bytes)
+        for chunk_file in self.entries:
+            if self.chunks.bytes >= chunk_cache_bytes:
+                break
+            try:
+                self.chunks.get(chunk_file)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _signature(paths: List[str]) -> tuple:
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def changed(self) -> bool:
+        """index.json、BM25 或分面索引檔是否在載入後被改寫"""
+        return self._signature(self.watched) != self.signature
+
+    def rank(self, question: str, top_k: int = DEFAULT_TOP_K,
+             facets: Optional[Dict[str, List[str]]] = None) -> List[dict]:
+        """
+        回傳 [{"file", "title", "url", "category", "tokens", "score"}, ...]，依分數由高到低，不讀取 chunk 內文。
+        facets 指定時只在符合分面條件的 chunk 中計分，例如 {"domain": ["化粧品"], "month": ["2025-01"]}。
+        """
+        candidates = None
+        if facets:
+            if self.facets is None:
+                raise ValueError("尚未產生分面索引，無法依分面篩選")
+            candidates = self.facets.filter(facets)
+        results = []
+        for chunk_file, score in self.bm25.search(question, top_k=top_k, candidates=candidates):
+            entry = self.entries.get(chunk_file)
+            if entry is None:
+                continue  # BM25 索引與 index.json 不同步時略過索引中已不存在的 chunk
+            results.append({"file": chunk_file, "title": entry["title"], "url": entry["url"],
+                            "category": entry["category"], "tokens": entry["tokens"], "score": round(score, 4)})
+        return results
+
+    def with_content(self, ranked: List[dict]) -> List[dict]:
+        """為 rank() 的結果附上 chunk 內文（content），讀取失敗的 chunk 略過"""
+        results = []
+        for item in ranked:
+            try:
+                results.append({**item, "content": self.chunks.get(item["file"])})
+            except OSError:
+                continue
+        return results
+
+    def retrieve(self, question: str, top_k: int = DEFAULT_TOP_K,
+                 facets: Optional[Dict[str, List[str]]] = None) -> List[dict]:
+        """rank() 並附上 chunk 內文"""
+        return self.with_content(self.rank(question, top_k, facets))
+
+
+class RetrievalService:
+    """以 asyncio 實作的 HTTP/1.1 服務（支援 keep-alive），只使用標準函式庫"""
+
+    def __init__(self, retriever_factory, result_cache: Optional[TTLCache] = None,
+                 reload_interval: float = RELOAD_INTERVAL):
+        self.retriever_factory = retriever_factory
+        self.retriever: Retriever = retriever_factory()
+        self.results = result_cache if result_cache is not None else TTLCache()
+        self.reload_interval = reload_interval
+        self.requests = 0
+        self.reloads = 0
+        self.started = time.time()
+
+    async def watch(self):
+        """定期檢查索引檔，有變動時在背景執行緒重新載入，完成後再一次替換，查詢不中斷"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            if not self.retriever.changed():
+                continue
+            try:
+                retriever = await loop.run_in_executor(None, self.retriever_factory)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ 索引重新載入失敗，繼續使用舊索引：{e}")  # 可能正在寫入，下一輪再試
+                continue
+            self.retriever = retriever
+            self.results.clear()
+            self.reloads += 1
+            print(f"🔄 已重新載入索引：{len(retriever.entries)} 筆")
+
+    async def handle_query(self, payload: dict) -> dict:
+        """
+        驗證請求後檢索。BM25 計分與讀取 chunk 內文在背景執行緒執行，不阻塞其他連線；
+        結果快取只在事件迴圈中存取。
+        """
+        question = payload.get("question")
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError("缺少 question")
+        top_k = payload.get("top_k", DEFAULT_TOP_K)
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or not 1 <= top_k <= MAX_TOP_K:
+            raise ValueError(f"top_k 需為 1 到 {MAX_TOP_K} 的整數")
+        token_budget = payload.get("token_budget")
+        if token_budget is not None and (isinstance(token_budget, bool) or not isinstance(token_budget, int)
+                                         or token_budget <= 0):
+            raise ValueError("token_budget 需為正整數")
+
+        facets = payload.get("facets") or {}
+        if not isinstance(facets, dict):
+            raise ValueError("facets 需為 {分面: 值或值的串列}")
+        for values in facets.values():
+            if not isinstance(values, str) and not (isinstance(values, list)
+                                                    and all(isinstance(value, str) for value in values)):
+                raise ValueError("facets 的值需為字串或字串的串列")
+        facets = {facet: sorted([values] if isinstance(values, str) else values)
+                  for facet, values in facets.items()}
+
+        # 指定 token_budget 時從較多的候選中挑選，前 top_k 名都放不進預算時仍能回傳較小的 chunk
+        pool = top_k if token_budget is None else max(top_k, BUDGET_CANDIDATES)
+        loop = asyncio.get_running_loop()
+        retriever = self.retriever
+        key = (normalize_question(question), pool, json.dumps(facets, ensure_ascii=False, sort_keys=True))
+        ranked = self.results.get(key)
+        cached = ranked is not None
+        if not cached:
+            ranked = await loop.run_in_executor(None, retriever.rank, key[0], pool, facets)
+            self.results.put(key, ranked)
+
+        response = {"question": question, "cached": cached}
+        if token_budget is not None:
+            # 只依索引中的 tokens 欄位挑選，只讀取選中 chunk 的內文；top_k 為回傳筆數上限
+            packed = pack_prompt([(item, item["score"]) for item in ranked], token_budget)
+            response["budget"] = {"token_budget": token_budget, "candidates": len(ranked)}
+            ranked = packed["selected"][:top_k]
+            response["budget"]["tokens"] = sum(item["tokens"] + CHUNK_OVERHEAD_TOKENS for item in ranked)
+            if not ranked:
+                smallest = min((item["tokens"] for item in packed["skipped"]), default=None)
+                response["budget"]["message"] = (
+                    "沒有符合條件的 chunk" if smallest is None
+                    else f"沒有任何 chunk 放得進 token_budget（最小的候選約 {smallest} tokens，另加每個 chunk 的標示）")
+        response["chunks"] = await loop.run_in_executor(None, retriever.with_content, ranked)
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.retriever.entries),
+            "requests": self.requests,
+            "reloads": self.reloads,
+            "uptime": round(time.time() - self.started, 1),
+            "result_cache": {"items": len(self.results), "hits": self.results.hits, "misses": self.results.misses},
+            "chunk_cache": {"items": len(self.retriever.chunks), "bytes": self.retriever.chunks.bytes},
+        }
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[int, Optional[dict]]:
+        path = path.split("?", 1)[0]
+        if path == "/" and method == "POST":
+            try:
+                payload = json.loads(body.decode("utf-8"))
+                if not isinstance(payload, dict):
+                    raise ValueError("請以 JSON 物件傳送 question")
+                return 200, await self.handle_query(payload)
+            except (UnicodeDecodeError, ValueError) as e:
+                return 400, {"error": str(e)}
+        if path == "/" and method == "OPTIONS":
+            return 204, None
+        if path == "/stats" and method == "GET":
+            return 200, self.stats()
+        if path in ("/", "/stats"):
+            return 405, {"error": f"不支援的方法：{method}"}
+        return 404, {"error": f"找不到路徑：{path}"}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "無效的請求"}, keep_alive=False)
+                    break
+                headers: Dict[str, str] = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # 無法判斷請求內容的結尾，回應後關閉連線
+                    await self._respond(writer, 400, {"error": "無效的 Content-Length"}, keep_alive=False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "請求內容過大"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+                self.requests += 1
+                try:
+                    status, payload = await self.route(method, path, body)
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Optional[dict], keep_alive: bool):
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Access-Control-Allow-Origin: *\r\n"
+                "Access-Control-Allow-Methods: POST, GET, OPTIONS\r\n"
+                "Access-Control-Allow-Headers: Content-Type\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, **kwargs):
+    service = RetrievalService(**kwargs)
+    server = await asyncio.start_server(service.handle_connection, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+    print(f"🚀 檢索服務已啟動：http://{host}:{port}/（{len(service.retriever.entries)} 筆索引，"
+          f"預載 {len(service.retriever.chunks)} 個 chunk）")
+    watcher = asyncio.create_task(service.watch())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機檢索服務：POST {\"question\": ...} 回傳排序後的 chunk 內文")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="監聽位址")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="監聽埠號")
+    parser.add_argument("--cache-size", type=int, default=RESULT_CACHE_SIZE, help="查詢結果快取筆數")
+    parser.add_argument("--cache-ttl", type=float, default=RESULT_CACHE_TTL, help="查詢結果快取秒數")
+    parser.add_argument("--chunk-cache-mb", type=int, default=CHUNK_CACHE_BYTES // (1024 * 1024),
+                        help="chunk 內文快取上限（MB）")
+    args = parser.parse_args()
+
+    chunk_cache_bytes = args.chunk_cache_mb * 1024 * 1024
+    try:
+        asyncio.run(serve(args.host, args.port,
+                          retriever_factory=lambda: Retriever(chunk_cache_bytes=chunk_cache_bytes),
+                          result_cache=TTLCache(args.cache_size, args.cache_ttl)))
+    except KeyboardInterrupt:
+        print("\n👋 檢索服務已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import os
+import re
+import json
+import math
+import heapq
+import hashlib
+import argparse
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 檢索索引輸出位置（與 index.json 一起產生）
+INDEX_DATA_DIR = "knowledge_index"
+BM25_META_FILE = os.path.join(INDEX_DATA_DIR, "bm25_meta.json")
+BM25_POSTINGS_FILE = os.path.join(INDEX_DATA_DIR, "bm25_postings.bin")
+
+# 建置清單中的階段名稱與工具版本（斷詞或檔案格式變動時請遞增版本）
+MANIFEST_STAGE = "search_index"
+TOOL_VERSION = "1"
+INDEX_FORMAT_VERSION = 1
+
+DEFAULT_TOKENIZER = "cjk_bigram"
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+_TOKEN_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]+|[a-z0-9]+")
+
+
+def cjk_bigram_tokenize(text: str) -> List[str]:
+    """
+    中文以相鄰兩字（bigram）為詞，英數字以整個單字為詞。
+    先做 NFKC 正規化與轉小寫，讓全形英數與半形一致；單一中文字則保留單字。
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(unicodedata.normalize("NFKC", text).lower()):
+        run = match.group(0)
+        if run[0].isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _jieba_tokenize(text: str) -> List[str]:
+    """使用 jieba 斷詞（選用套件，未安裝時請改用 cjk_bigram）"""
+    import jieba  # 延遲載入，只有選用此斷詞器時才需要安裝
+
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    return [t for t in jieba.cut_for_search(normalized) if _TOKEN_RE.fullmatch(t)]
+
+
+# 可用的斷詞器（維護點：新增斷詞器時在這裡註冊，索引會記錄建置時使用的名稱）
+TOKENIZERS: Dict[str, Callable[[str], List[str]]] = {
+    "cjk_bigram": cjk_bigram_tokenize,
+    "jieba": _jieba_tokenize,
+}
+
+
+def register_tokenizer(name: str, tokenizer: Callable[[str], List[str]]):
+    """註冊自訂斷詞器，建置與查詢時以名稱指定"""
+    TOKENIZERS[name] = tokenizer
+
+
+def _encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_postings(data: bytes) -> List[Tuple[int, int]]:
+    """解碼 (文件差值, 詞頻) 交錯的 varint 序列，回傳 [(doc_id, tf), ...]"""
+    postings = []
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(value)
+        value = shift = 0
+    doc_id = 0
+    for i in range(0, len(values), 2):
+        doc_id += values[i]
+        postings.append((doc_id, values[i + 1]))
+    return postings
+
+
+def build_bm25_index(documents: Iterable[Tuple[str, str]], meta_path: str = BM25_META_FILE,
+                     postings_path: str = BM25_POSTINGS_FILE, tokenizer: str = DEFAULT_TOKENIZER,
+                     k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> dict:
+    """
+    以 (chunk_id, 內文) 建立 BM25 倒排索引。
+
+    每個詞的 postings 依文件編號排序，以「文件編號差值、詞頻」交錯的 varint 陣列存放於
+    postings 檔，詞典、文件長度與 IDF 等統計值存放於 meta 檔。
+
+    Returns:
+        dict: {"documents", "terms", "postings_bytes"}
+    """
+    tokenize = TOKENIZERS[tokenizer]
+    doc_ids = []
+    doc_lengths = []
+    inverted: Dict[str, List[Tuple[int, int]]] = {}
+
+    for doc_index, (doc_id, text) in enumerate(documents):
+        tokens = tokenize(text)
+        doc_ids.append(doc_id)
+        doc_lengths.append(len(tokens))
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            inverted.setdefault(token, []).append((doc_index, tf))
+
+    doc_count = len(doc_ids)
+    postings = bytearray()
+    terms = {}
+    for term in sorted(inverted):
+        offset = len(postings)
+        previous = 0
+        for doc_index, tf in inverted[term]:
+            _encode_varint(doc_index - previous, postings)
+            _encode_varint(tf, postings)
+            previous = doc_index
+        df = len(inverted[term])
+        idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        terms[term] = [offset, len(postings) - offset, df, round(idf, 6)]
+
+    meta = {
+        "version": INDEX_FORMAT_VERSION,
+        "tokenizer": tokenizer,
+        "k1": k1,
+        "b": b,
+        "avgdl": (sum(doc_lengths) / doc_count) if doc_count else 0.0,
+        "docs": doc_ids,
+        "doc_lengths": doc_lengths,
+        "terms": terms,
+    }
+
+    os.makedirs(os.path.dirname(meta_path) or ".", exist_ok=True)
+    with open(postings_path, "wb") as f:
+        f.write(postings)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(",", ":"))
+
+    return {"documents": doc_count, "terms": len(terms), "postings_bytes": len(postings)}
+
+
+class BM25Index:
+    """
+    BM25 倒排索引的查詢端。載入時只讀入詞典與文件長度，
+    查詢時才解碼查詢詞的 postings，因此單次查詢通常在毫秒內完成。
+    """
+
+    def __init__(self, meta: dict, postings: bytes):
+        if meta.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"不支援的索引版本：{meta.get('version')}")
+        self.tokenize = TOKENIZERS[meta["tokenizer"]]
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+        self.docs = meta["docs"]
+        self.terms = meta["terms"]
+        self._postings = postings
+        avgdl = meta["avgdl"] or 1.0
+        # 預先計算每份文件的長度正規化項，查詢時只剩乘加運算
+        self._norms = [self.k1 * (1 - self.b + self.b * dl / avgdl) for dl in meta["doc_lengths"]]
+        self._doc_index = {doc_id: i for i, doc_id in enumerate(self.docs)}
+
+    @classmethod
+    def load(cls, meta_path: str = BM25_META_FILE, postings_path: str = BM25_POSTINGS_FILE) -> "BM25Index":
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(postings_path, "rb") as f:
+            postings = f.read()
+        return cls(meta, postings)
+
+    def postings(self, term: str) -> List[Tuple[int, int]]:
+        """回傳某個詞的 [(doc_index, tf), ...]，詞不存在時回傳空串列"""
+        info = self.terms.get(term)
+        if info is None:
+            return []
+        offset, length = info[0], info[1]
+        return _decode_postings(self._postings[offset:offset + length])
+
+    def search(self, query: str, top_k: int = 10,
+               candidates: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        以 BM25 計分並回傳前 top_k 名的 (chunk_id, 分數)。
+
+        Args:
+            query: 使用者問題
+            top_k: 回傳筆數
+            candidates: 只在這些 chunk_id 之中計分（例如先以其他條件篩選過）
+        """
+        allowed = None
+        if candidates is not None:
+            allowed = {self._doc_index[c] for c in candidates if c in self._doc_index}
+
+        query_terms: Dict[str, int] = {}
+        for token in self.tokenize(query):
+            query_terms[token] = query_terms.get(token, 0) + 1
+
+        scores: Dict[int, float] = {}
+        k1_plus_1 = self.k1 + 1
+        norms = self._norms
+        for term, query_tf in query_terms.items():
+            info = self.terms.get(term)
+            if info is None:
+                continue
+            weight = info[3] * query_tf
+            for doc_index, tf in self.postings(term):
+                if allowed is not None and doc_index not in allowed:
+                    continue
+                scores[doc_index] = scores.get(doc_index, 0.0) + weight * tf * k1_plus_1 / (tf + norms[doc_index])
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(self.docs[doc_index], score) for doc_index, score in best]
+
+
+def _read_chunk(path: str, texts: Optional[Dict[str, str]] = None) -> str:
+    """
+    讀取 chunk 內文（近似重複偵測、向量索引與分面索引共用），讀取失敗時以空內容處理。
+    texts 為各階段共用的內文快取（{chunk 路徑: 內文}，由 tools/pipeline.py 傳入），
+    已有的內文直接取用，從磁碟讀到的也存入，同一次建置中每個 chunk 最多讀一次。
+    """
+    if texts is not None and path in texts:
+        return texts[path]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except OSError as e:
+        print(f"⚠️ 無法讀取 chunk，以空內容建立索引：{path}，錯誤：{e}")
+        return ""
+    if texts is not None:
+        texts[path] = text
+    return text
+
+
+def build_search_index(index_list: List[dict], manifest=None,
+                       meta_path: str = BM25_META_FILE, postings_path: str = BM25_POSTINGS_FILE,
+                       tokenizer: str = DEFAULT_TOKENIZER, texts: Optional[Dict[str, str]] = None) -> bool:
+    """
+    依 index.json 的條目建立 BM25 索引，chunk_id 即條目的 file 欄位。
+    有提供 manifest 時，所有 chunk 內容與索引檔都未變動就略過。
+    texts 為上游階段已讀入的 chunk 內文（見 _read_chunk），其中沒有的才讀檔。
+
+    Returns:
+        bool: 是否重新建立了索引
+    """
+    chunk_files = [entry["file"] for entry in index_list]
+
+    fingerprint = None
+    if manifest is not None:
+        digest = hashlib.sha256(tokenizer.encode("utf-8"))
+        for chunk_file in chunk_files:
+            digest.update(f"{chunk_file}\0{manifest.file_hash(chunk_file)}\n".encode("utf-8"))
+        fingerprint = digest.hexdigest()
+        previous = manifest.data(MANIFEST_STAGE, meta_path) or {}
+        if (previous.get("fingerprint") == fingerprint
+                and manifest.is_up_to_date(MANIFEST_STAGE, meta_path, TOOL_VERSION)
+                and manifest.file_hash(postings_path) is not None):
+            print(f"⏭️ 檢索索引未變動，略過：{meta_path}")
+            return False
+
+    stats = build_bm25_index(((f, _read_chunk(f, texts)) for f in chunk_files),
+                             meta_path, postings_path, tokenizer=tokenizer)
+
+    if manifest is not None:
+        # 以 meta 檔為來源、postings 檔為產出記錄，任一被改動都會重建
+        manifest.record(MANIFEST_STAGE, meta_path, TOOL_VERSION, [postings_path],
+                        data={"fingerprint": fingerprint})
+
+    print(f"✅ 已建立 BM25 檢索索引：{stats['documents']} 份文件、{stats['terms']} 個詞、"
+          f"postings {stats['postings_bytes']} bytes")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以 BM25 索引查詢相關 chunk")
+    parser.add_argument("query", help="查詢問題")
+    parser.add_argument("--top-k", type=int, default=5, help="回傳筆數")
+    args = parser.parse_args()
+
+    index = BM25Index.load()
+    for chunk_id, score in index.search(args.query, top_k=args.top_k):
+        print(f"{score:8.3f}  {chunk_id}")
+
+
+if __name__ == "__main__":
+    main()
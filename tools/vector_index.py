@@ -0,0 +1,389 @@
+import io
+import os
+import json
+import time
+import hashlib
+import argparse
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from build_manifest import write_if_changed
+
+# 向量索引輸出位置（與 index.json 一起產生）
+INDEX_DATA_DIR = "knowledge_index"
+VECTORS_FILE = os.path.join(INDEX_DATA_DIR, "vectors.npy")
+VECTORS_META_FILE = os.path.join(INDEX_DATA_DIR, "vectors_meta.json")
+
+# 建置清單中的階段名稱與工具版本（編碼方式或檔案格式變動時請遞增版本）
+MANIFEST_STAGE = "vector_index"
+TOOL_VERSION = "2"
+INDEX_FORMAT_VERSION = 1
+
+DEFAULT_ENCODER = "tfidf_svd"
+# 雜湊特徵數、字元 n-gram 長度與 SVD 降維後的維度
+HASH_FEATURES = 1 << 14
+NGRAM_SIZES = (2, 3)
+DEFAULT_DIM = 128
+SVD_OVERSAMPLES = 10
+SVD_POWER_ITERATIONS = 2
+SVD_SEED = 20240601
+# 稀疏矩陣乘法時每批展開為稠密矩陣的列數，控制暫存記憶體用量（256 × 16384 × 4 bytes = 16 MB）
+DENSE_BATCH_ROWS = 256
+# 以投影矩陣列加總編碼時，每批處理的非零項數（65536 × 128 × 4 bytes = 32 MB）
+GATHER_BATCH_NONZEROS = 1 << 16
+# 查詢時每批轉為 float32 的文件向量列數，不必把整個 mmap 的向量矩陣複製到記憶體
+SCORE_BATCH_ROWS = 8192
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def hashed_ngram_counts(texts: List[str], n_features: int = HASH_FEATURES, ngram_sizes=NGRAM_SIZES):
+    """
+    以 numpy 向量化計算每份文字的字元 n-gram 雜湊計數，回傳 CSR 形式的 (indptr, indices, counts)。
+    空白不計入 n-gram；不同文字之間的 n-gram 不會相連。
+    """
+    import numpy as np
+
+    texts = [_normalize(t) for t in texts]
+    lengths = np.array([len(t) for t in texts], dtype=np.int64)
+    codepoints = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    doc_of_char = np.repeat(np.arange(len(texts)), lengths)
+    is_space = np.isin(codepoints, np.array([0x20, 0x09, 0x0A, 0x0D, 0x3000], dtype=np.uint64))
+
+    keys = []
+    prime = np.uint64(1099511628211)
+    for n in ngram_sizes:
+        positions = len(codepoints) - n + 1
+        if positions <= 0:
+            continue
+        h = codepoints[:positions] + np.uint64(n)
+        valid = doc_of_char[:positions] == doc_of_char[n - 1:n - 1 + positions]
+        valid &= ~is_space[:positions]
+        for j in range(1, n):
+            h *= prime
+            h += codepoints[j:j + positions]
+            valid &= ~is_space[j:j + positions]
+        h ^= h >> np.uint64(33)
+        h *= np.uint64(0xFF51AFD7ED558CCD)
+        h ^= h >> np.uint64(33)
+        features = (h % np.uint64(n_features)).astype(np.int64)
+        keys.append(doc_of_char[:positions][valid] * n_features + features[valid])
+
+    if keys:
+        unique_keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+    else:
+        unique_keys, counts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    rows = unique_keys // n_features
+    indices = unique_keys % n_features
+    indptr = np.searchsorted(rows, np.arange(len(texts) + 1))
+    return indptr, indices, counts.astype(np.float32)
+
+
+def _dense_batches(indptr, indices, values, n_features: int):
+    """依序將 CSR 矩陣的數列展開為稠密區塊，讓乘法交給 BLAS；每塊最多 DENSE_BATCH_ROWS 列"""
+    import numpy as np
+
+    rows = len(indptr) - 1
+    for start in range(0, rows, DENSE_BATCH_ROWS):
+        end = min(start + DENSE_BATCH_ROWS, rows)
+        lo, hi = indptr[start], indptr[end]
+        block = np.zeros((end - start, n_features), dtype=np.float32)
+        block[np.repeat(np.arange(end - start), np.diff(indptr[start:end + 1])), indices[lo:hi]] = values[lo:hi]
+        yield start, end, block
+
+
+def _npy_bytes(array) -> bytes:
+    """陣列的 .npy 內容；經 write_if_changed 寫出，重建結果相同時不改動檔案"""
+    import numpy as np
+
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def _sparse_dot(csr, dense):
+    """X · dense（X 為 CSR 稀疏矩陣）"""
+    import numpy as np
+
+    indptr = csr[0]
+    out = np.empty((len(indptr) - 1, dense.shape[1]), dtype=np.float32)
+    for start, end, block in _dense_batches(*csr, dense.shape[0]):
+        out[start:end] = block @ dense
+    return out
+
+
+def _sparse_rows_dot(csr, dense):
+    """
+    X · dense，只取出 X 非零項對應的 dense 列加權加總（不展開稠密區塊、不轉換整個 dense）；
+    dense 可為 mmap 的 float16 矩陣，查詢只會讀取用到的數列。
+    """
+    import numpy as np
+
+    indptr, indices, values = csr
+    rows = len(indptr) - 1
+    out = np.zeros((rows, dense.shape[1]), dtype=np.float32)
+    row_of = np.repeat(np.arange(rows), np.diff(indptr))
+    for lo in range(0, len(indices), GATHER_BATCH_NONZEROS):
+        hi = min(lo + GATHER_BATCH_NONZEROS, len(indices))
+        weighted = np.asarray(dense[indices[lo:hi]], dtype=np.float32) * values[lo:hi, None]
+        batch_rows = row_of[lo:hi]
+        # CSR 的非零項依列排序，同一列的項目相鄰，以 reduceat 逐段加總
+        starts = np.flatnonzero(np.r_[True, batch_rows[1:] != batch_rows[:-1]])
+        out[batch_rows[starts]] += np.add.reduceat(weighted, starts, axis=0)
+    return out
+
+
+def _sparse_tdot(csr, dense, n_features: int):
+    """Xᵀ · dense（X 為 CSR 稀疏矩陣）"""
+    import numpy as np
+
+    out = np.zeros((n_features, dense.shape[1]), dtype=np.float32)
+    for start, end, block in _dense_batches(*csr, n_features):
+        out += block.T @ dense[start:end]
+    return out
+
+
+class HashedTfidfSvdEncoder:
+    """
+    離線、免 GPU 的文字編碼器：字元 n-gram 雜湊 TF-IDF，再以隨機化截斷 SVD 降維。
+    IDF 權重直接併入投影矩陣，查詢時只需 n-gram 計數乘以一個矩陣再正規化。
+    """
+
+    name = "tfidf_svd"
+
+    def __init__(self, projection=None, dim: int = DEFAULT_DIM, n_features: int = HASH_FEATURES):
+        self.projection = projection  # (n_features, dim)，列為各雜湊特徵的 IDF × SVD 成分
+        self.dim = dim
+        self.n_features = n_features
+
+    def _weighted_counts(self, texts):
+        import numpy as np
+
+        indptr, indices, counts = hashed_ngram_counts(texts, self.n_features)
+        return indptr, indices, (1.0 + np.log(counts)).astype(np.float32)  # 次線性 TF
+
+    def fit_transform(self, texts: List[str]):
+        """以語料估計 IDF 與 SVD 成分，回傳語料的向量（已正規化）"""
+        import numpy as np
+
+        indptr, indices, tf = self._weighted_counts(texts)
+        n_docs = len(texts)
+        df = np.bincount(indices, minlength=self.n_features)
+        idf = (np.log((1 + n_docs) / (1 + df)) + 1.0).astype(np.float32)
+        values = tf * idf[indices]
+        # 每份文件先做 L2 正規化，避免長文件主導 SVD
+        lengths = np.diff(indptr)
+        norms = np.sqrt(np.bincount(np.repeat(np.arange(n_docs), lengths), weights=values ** 2, minlength=n_docs))
+        values = (values / np.repeat(np.maximum(norms, 1e-12), lengths)).astype(np.float32)
+
+        # 隨機化截斷 SVD（Halko 等）：只需要稀疏矩陣與稠密矩陣相乘
+        if n_docs == 0:
+            self.projection = np.zeros((self.n_features, self.dim), dtype=np.float16)
+            return np.zeros((0, self.dim), dtype=np.float32)
+        rank = min(self.dim, n_docs)
+        sketch = min(rank + SVD_OVERSAMPLES, n_docs)
+        csr = (indptr, indices, values)
+        rng = np.random.default_rng(SVD_SEED)
+        q, _ = np.linalg.qr(_sparse_dot(csr, rng.standard_normal((self.n_features, sketch)).astype(np.float32)))
+        for _ in range(SVD_POWER_ITERATIONS):
+            z, _ = np.linalg.qr(_sparse_tdot(csr, q, self.n_features))
+            q, _ = np.linalg.qr(_sparse_dot(csr, z))
+        b = _sparse_tdot(csr, q, self.n_features).T  # (sketch, n_features) = Qᵀ X
+        _, _, vt = np.linalg.svd(b, full_matrices=False)
+        components = vt[:rank]
+
+        self.dim = rank
+        # 投影矩陣以 float16 儲存，文件也用同一份 float16 投影編碼，與查詢時載入的完全一致
+        self.projection = (idf[:, None] * components.T).astype(np.float16)
+        return self.transform_counts(indptr, indices, tf)
+
+    def transform_counts(self, indptr, indices, tf):
+        import numpy as np
+
+        vectors = _sparse_rows_dot((indptr, indices, tf), self.projection)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def transform(self, texts: List[str]):
+        """將文字編碼為正規化向量"""
+        return self.transform_counts(*self._weighted_counts(texts))
+
+    def save(self, path_prefix: str) -> dict:
+        """
+        儲存投影矩陣（float16 .npy），回傳寫入向量索引 meta 的參數（files 列出編碼器產出的檔案）。
+        投影矩陣可由 chunk 重新產生，不 commit（已列入 .gitignore）。
+        """
+        import numpy as np
+
+        projection_path = path_prefix + "_projection.npy"
+        write_if_changed(projection_path, _npy_bytes(np.asarray(self.projection, dtype=np.float16)))
+        return {"files": {"projection": projection_path}, "dim": self.dim, "n_features": self.n_features,
+                "ngram_sizes": list(NGRAM_SIZES)}
+
+    @classmethod
+    def load(cls, params: dict) -> "HashedTfidfSvdEncoder":
+        import numpy as np
+
+        projection = np.load(params["files"]["projection"], mmap_mode="r")
+        return cls(projection=projection, dim=params["dim"], n_features=params["n_features"])
+
+
+# 可用的編碼器（維護點：新增編碼器時在這裡註冊，需提供 fit_transform / transform / save / load）
+ENCODERS: Dict[str, Callable] = {
+    "tfidf_svd": HashedTfidfSvdEncoder,
+}
+
+
+def register_encoder(name: str, encoder_class):
+    """註冊自訂編碼器，建置時以名稱指定，索引會記錄建置時使用的名稱"""
+    ENCODERS[name] = encoder_class
+
+
+def build_dense_index(documents: Iterable[Tuple[str, str]], vectors_path: str = VECTORS_FILE,
+                       meta_path: str = VECTORS_META_FILE, encoder: str = DEFAULT_ENCODER,
+                       dim: int = DEFAULT_DIM) -> dict:
+    """
+    以 (chunk_id, 內文) 建立向量索引：所有 chunk 的正規化向量以 float16 存成 .npy，
+    編碼器狀態與 chunk_id 清單存放於 meta 檔。
+
+    Returns:
+        dict: {"documents", "dim", "bytes", "encoder_files"}
+    """
+    import numpy as np
+
+    doc_ids, texts = [], []
+    for doc_id, text in documents:
+        doc_ids.append(doc_id)
+        texts.append(text)
+
+    model = ENCODERS[encoder](dim=dim)
+    vectors = model.fit_transform(texts).astype(np.float16)
+
+    os.makedirs(os.path.dirname(vectors_path) or ".", exist_ok=True)
+    write_if_changed(vectors_path, _npy_bytes(vectors))
+    meta = {
+        "version": INDEX_FORMAT_VERSION,
+        "encoder": encoder,
+        "encoder_params": model.save(os.path.splitext(vectors_path)[0]),
+        "docs": doc_ids,
+    }
+    write_if_changed(meta_path, json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    encoder_files = list(meta["encoder_params"].get("files", {}).values())
+    return {"documents": len(doc_ids), "dim": vectors.shape[1], "bytes": vectors.nbytes,
+            "encoder_files": encoder_files}
+
+
+class VectorIndex:
+    """
+    向量索引的查詢端。載入時以 mmap 對應向量矩陣與投影矩陣，幾乎不花時間；
+    查詢時整批問題一次編碼、一次矩陣乘法，再以 argpartition 取前 top_k 名。
+    """
+
+    def __init__(self, meta: dict, vectors):
+        if meta.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"不支援的索引版本：{meta.get('version')}")
+        self.encoder = ENCODERS[meta["encoder"]].load(meta["encoder_params"])
+        self.docs = meta["docs"]
+        self.vectors = vectors
+
+    @classmethod
+    def load(cls, meta_path: str = VECTORS_META_FILE, vectors_path: str = VECTORS_FILE) -> "VectorIndex":
+        import numpy as np
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(meta, np.load(vectors_path, mmap_mode="r"))
+
+    def _scores(self, query_vectors):
+        """
+        查詢向量與所有文件向量的內積。float16 的矩陣乘法沒有 BLAS 加速，
+        每次只將 SCORE_BATCH_ROWS 列文件向量轉為 float32，記憶體用量固定，不複製整個 mmap 矩陣。
+        """
+        import numpy as np
+
+        scores = np.empty((query_vectors.shape[0], len(self.vectors)), dtype=np.float32)
+        for start in range(0, len(self.vectors), SCORE_BATCH_ROWS):
+            block = np.asarray(self.vectors[start:start + SCORE_BATCH_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = query_vectors @ block.T
+        return scores
+
+    def search_batch(self, queries: List[str], top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        """一次查詢多個問題，回傳每個問題的 [(chunk_id, 餘弦相似度), ...]"""
+        import numpy as np
+
+        if not queries or not self.docs:
+            return [[] for _ in queries]
+        scores = self._scores(self.encoder.transform(queries))
+        k = min(top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [[(self.docs[i], float(s)) for i, s in zip(row, row_scores)]
+                for row, row_scores in zip(top, top_scores)]
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        return self.search_batch([query], top_k)[0]
+
+
+def build_vector_index(index_list: List[dict], manifest=None, vectors_path: str = VECTORS_FILE,
+                       meta_path: str = VECTORS_META_FILE, encoder: str = DEFAULT_ENCODER,
+                       texts: Optional[Dict[str, str]] = None) -> bool:
+    """
+    依 index.json 的條目建立向量索引，chunk_id 即條目的 file 欄位。
+    有提供 manifest 時，所有 chunk 內容與索引檔都未變動就略過。
+    texts 為上游階段已讀入的 chunk 內文（見 search_index._read_chunk），其中沒有的才讀檔。
+
+    Returns:
+        bool: 是否重新建立了索引
+    """
+    from search_index import _read_chunk
+
+    chunk_files = [entry["file"] for entry in index_list]
+
+    fingerprint = None
+    if manifest is not None:
+        digest = hashlib.sha256(encoder.encode("utf-8"))
+        for chunk_file in chunk_files:
+            digest.update(f"{chunk_file}\0{manifest.file_hash(chunk_file)}\n".encode("utf-8"))
+        fingerprint = digest.hexdigest()
+        previous = manifest.data(MANIFEST_STAGE, meta_path) or {}
+        if (previous.get("fingerprint") == fingerprint
+                and manifest.is_up_to_date(MANIFEST_STAGE, meta_path, TOOL_VERSION)
+                and manifest.file_hash(vectors_path) is not None):
+            print(f"⏭️ 向量索引未變動，略過：{vectors_path}")
+            return False
+
+    started = time.perf_counter()
+    stats = build_dense_index(((f, _read_chunk(f, texts)) for f in chunk_files), vectors_path, meta_path,
+                              encoder=encoder)
+
+    if manifest is not None:
+        # 以 meta 檔為來源、向量與編碼器檔案為產出記錄，任一被改動都會重建
+        manifest.record(MANIFEST_STAGE, meta_path, TOOL_VERSION, [vectors_path] + stats["encoder_files"],
+                        data={"fingerprint": fingerprint})
+
+    print(f"✅ 已建立向量索引：{stats['documents']} 份文件、{stats['dim']} 維、"
+          f"{stats['bytes']} bytes（{time.perf_counter() - started:.3f}s）")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以向量索引查詢語意相近的 chunk")
+    parser.add_argument("query", nargs="+", help="查詢問題（可一次輸入多個）")
+    parser.add_argument("--top-k", type=int, default=5, help="回傳筆數")
+    args = parser.parse_args()
+
+    index = VectorIndex.load()
+    for query, hits in zip(args.query, index.search_batch(args.query, top_k=args.top_k)):
+        print(f"\n🔎 {query}")
+        for chunk_id, score in hits:
+            print(f"{score:8.3f}  {chunk_id}")
+
+
+if __name__ == "__main__":
+    main()
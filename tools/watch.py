@@ -0,0 +1,441 @@
+import os
+import json
+import time
+import argparse
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from build_manifest import BuildManifest
+
+# 常駐模式：輪詢來源資料夾，等一批檔案放完（debounce）後，只轉換、切割有變動的檔案，
+# 並就地更新 index.json 中受影響的條目，不必重新走訪整個 knowledge_chunks/。
+# 來源被刪除或重新切割後 chunk 變少時，過期的 chunk 檔與索引條目會一併移除。
+# 轉換、切割、去重與索引由本檔逐檔處理（INCREMENTAL_STAGES）；其餘受影響的下游階段
+# （案件資料庫、彙總統計等）依 tools/pipeline.py 的階段 DAG 找出後交給 run_pipeline 執行。
+# 上次完整建置有產生 chunk bundle 或索引分片時，更新條目後以相同設定重新打包與輸出。
+#
+# 監看的來源：
+#   original_file/pdfs/*.pdf     → knowledge/law/*.md（tools/pdf_to_md.py）
+#   original_file/csvs/**/*.csv  → knowledge/product/...（tools/csv_to_md.py）
+#   knowledge/<分類>/**/*.md     → knowledge_chunks/...（tools/chunk_md.py，直接編輯 Markdown 也會觸發）
+# 轉換產生的 Markdown 會在同一批一起切割，不會在下一次輪詢被當成新的變動；處理期間其他檔案的變動留到下一批。
+PDF_DIR = "original_file/pdfs"
+CSV_DIR = "original_file/csvs"
+CSV_OUTPUT_DIR = "knowledge/"
+
+# 輪詢間隔，以及最後一次變動後要再等多久才開始處理（檔案仍在複製時大小會持續改變，等待時間會順延）
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 2.0
+
+# 更新條目後一併重建的衍生索引（BM25 較快，向量與分面索引預設留給完整建置流程）
+REFRESH_TARGETS = ("search", "vector", "facets")
+DEFAULT_REFRESH = ("search",)
+
+# 由本檔逐檔處理的 pipeline 階段，其餘下游階段交給 tools/pipeline.py 執行
+INCREMENTAL_STAGES = ("pdf", "csv", "chunk", "dedup", "index")
+
+
+def _list_sources() -> List[str]:
+    """目前所有要監看的來源檔"""
+    from chunk_md import list_markdown_files
+
+    paths = []
+    if os.path.isdir(PDF_DIR):
+        paths.extend(os.path.join(PDF_DIR, f) for f in sorted(os.listdir(PDF_DIR)) if f.endswith(".pdf"))
+    for root, dirs, files in os.walk(CSV_DIR):
+        dirs.sort()
+        paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(".csv"))
+    paths.extend(os.path.relpath(p) for p in list_markdown_files())
+    return paths
+
+
+def snapshot() -> Dict[str, Tuple[int, int]]:
+    """{來源路徑: (大小, mtime_ns)}，只做 stat，不讀檔"""
+    state = {}
+    for path in _list_sources():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:  # 走訪與 stat 之間被刪除
+            continue
+        state[path] = (st.st_size, st.st_mtime_ns)
+    return state
+
+
+def diff_snapshots(before: Dict[str, Tuple[int, int]], after: Dict[str, Tuple[int, int]]) -> Set[str]:
+    """新增、修改或刪除的來源路徑"""
+    return {path for path in before.keys() | after.keys() if before.get(path) != after.get(path)}
+
+
+def _source_kind(path: str) -> str:
+    if path.lower().endswith(".pdf"):
+        return "pdf"
+    if path.lower().endswith(".csv"):
+        return "csv"
+    return "md"
+
+
+def _remove_file(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _derived_markdown(manifest: BuildManifest, stage: str, source: str, default_path: str) -> List[str]:
+    """來源對應的 Markdown：優先採用建置清單的記錄，沒有記錄時用預設的輸出路徑"""
+    recorded = [os.path.relpath(os.path.join(manifest.root_dir, key)) for key in manifest.outputs(stage, source)]
+    return recorded or [default_path]
+
+
+def convert_sources(changed: Iterable[str], manifest: BuildManifest) -> Tuple[Set[str], dict]:
+    """
+    轉換有變動的 PDF 與 CSV，刪除已不存在的來源所轉出的 Markdown。
+
+    Returns:
+        tuple: (需要重新切割或移除 chunks 的 Markdown 路徑, {"converted", "removed", "skipped", "errors"})
+    """
+    import pdf_to_md
+    import csv_to_md
+
+    markdown: Set[str] = set()
+    stats = {"converted": 0, "removed": 0, "skipped": 0, "errors": {}}
+    for path in sorted(changed):
+        kind = _source_kind(path)
+        if kind == "md":
+            markdown.add(path)
+            continue
+
+        if kind == "pdf":
+            stage, version = pdf_to_md.MANIFEST_STAGE, pdf_to_md.TOOL_VERSION
+            default_md = os.path.join(pdf_to_md.MD_OUTPUT_DIR, os.path.splitext(os.path.basename(path))[0] + ".md")
+        else:
+            stage, version = csv_to_md.MANIFEST_STAGE, csv_to_md.TOOL_VERSION
+            default_md = os.path.relpath(csv_to_md.get_output_path(path, CSV_OUTPUT_DIR))
+
+        if not os.path.exists(path):
+            for md_path in _derived_markdown(manifest, stage, path, default_md):
+                if _remove_file(md_path):
+                    print(f"🗑️ 來源已刪除，移除 {md_path}")
+                    stats["removed"] += 1
+                markdown.add(md_path)
+            manifest.forget(stage, path)
+            continue
+
+        if manifest.is_up_to_date(stage, path, version):
+            stats["skipped"] += 1
+            continue
+
+        if kind == "pdf":
+            md_path, error = pdf_to_md.convert_pdf(path, manifest=manifest)
+        else:
+            error = None if csv_to_md.convert_csv_to_md(path, CSV_OUTPUT_DIR) else "轉換失敗"
+            md_path = default_md
+            if error is None:
+                manifest.record(stage, path, version, [md_path])
+        if error:
+            stats["errors"][path] = error
+            print(f"❌ 無法轉換 {path}：{error}")
+            continue
+        stats["converted"] += 1
+        markdown.add(os.path.relpath(md_path))
+        print(f"✅ 已轉換：{path} ➝ {md_path}")
+    return markdown, stats
+
+
+def rechunk_markdown(markdown: Iterable[str], manifest: BuildManifest,
+                     chunk_options: dict) -> Tuple[Set[str], Set[str], dict]:
+    """
+    重新切割有變動的 Markdown；Markdown 已被刪除時移除它所有的 chunks。
+
+    Returns:
+        tuple: (內容可能變動的 chunk 路徑, 已移除的 chunk 路徑, {"chunked", "removed", "skipped", "errors"})
+    """
+    import chunk_md
+
+    tool_version = chunk_md._tool_version(chunk_options)
+    updated: Set[str] = set()
+    removed: Set[str] = set()
+    stats = {"chunked": 0, "removed": 0, "skipped": 0, "errors": {}}
+    for md_path in sorted(markdown):
+        output_dir = chunk_md.get_output_dir(md_path)
+        base_filename = os.path.splitext(os.path.basename(md_path))[0]
+        before = {os.path.relpath(p) for p in chunk_md.existing_chunks(output_dir, base_filename).values()}
+
+        if not os.path.exists(md_path):
+            for chunk_path in before:
+                _remove_file(chunk_path)
+            removed |= before
+            manifest.forget(chunk_md.MANIFEST_STAGE, md_path)
+            if before:
+                stats["removed"] += 1
+                print(f"🗑️ {md_path} 已刪除，移除 {len(before)} 個 chunk")
+            continue
+
+        if manifest.is_up_to_date(chunk_md.MANIFEST_STAGE, md_path, tool_version):
+            stats["skipped"] += 1
+            continue
+
+        _, output_filepaths, elapsed, error, _ = chunk_md._chunk_file_task(md_path, chunk_options)
+        if error:
+            stats["errors"][md_path] = error
+            print(f"❌ {md_path} 切割失敗：{error}")
+            continue
+        after = {os.path.relpath(p) for p in output_filepaths}
+        updated |= after
+        removed |= before - after
+        manifest.record(chunk_md.MANIFEST_STAGE, md_path, tool_version, output_filepaths)
+        stats["chunked"] += 1
+        print(f"⏱️ {elapsed:7.3f}s  {md_path} → {len(after)} 個 chunk"
+              + (f"，移除 {len(before - after)} 個過期 chunk" if before - after else ""))
+    return updated, removed, stats
+
+
+def _walk_key(entry: dict):
+    from chunk_md import _walk_order
+
+    return _walk_order(entry["file"])
+
+
+def _write_atomic(path: str, content: str):
+    """先寫暫存檔再取代，檢索服務輪詢時不會讀到寫到一半的索引"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _index_layout(index_list: List[dict]) -> Tuple[Optional[str], Optional[str]]:
+    """由上次建置的產出推得 (bundle 打包方式, 索引分片格式)，沒有產生過時為 None"""
+    from chunk_bundles import BUNDLES_TABLE_FILE
+    from index_shards import SHARDS_MANIFEST_FILE
+
+    def read_field(path, field):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f).get(field)
+        except (OSError, ValueError):
+            return None
+
+    bundle_by = read_field(BUNDLES_TABLE_FILE, "grouping") if any("bundle" in e for e in index_list) else None
+    return bundle_by, read_field(SHARDS_MANIFEST_FILE, "format")
+
+
+def patch_index(updated: Iterable[str], removed: Iterable[str], manifest: BuildManifest,
+                index_file: str = "index.json", estimator: str = "cjk") -> Optional[List[dict]]:
+    """
+    就地更新 index.json：移除已刪除 chunk 的條目（也從代表條目的 aliases 中移除），
+    內容有變動的 chunk 重新產生條目並依 os.walk 順序插入，其餘條目的 aliases 維持原狀。
+    代表條目被移除或重新產生時，它原本合併的重複 chunk 改回各自的條目，不會從索引中消失
+    （下次完整建置的去重階段會再重新分組）。
+    bundle 位移與 rollups 欄位以 generate_index.annotate_index 重新標註，打包方式沿用上次建置。
+    index.json 不存在時改為完整產生。
+
+    Returns:
+        更新後的索引條目；沒有任何變動時回傳 None
+    """
+    from generate_index import (INDEX_FIELDS, MANIFEST_STAGE, annotate_index, build_index_entry, generate_index,
+                                index_tool_version, relative_chunk_path, serialize_index)
+
+    tool_version = index_tool_version(estimator)
+    try:
+        with open(index_file, "r", encoding="utf-8") as f:
+            index_list = json.load(f)
+    except FileNotFoundError:
+        print(f"⚠️ 找不到 {index_file}，改為完整產生索引")
+        return generate_index(output_file=index_file, manifest=manifest, estimator=estimator)
+
+    listed = {entry["file"] for entry in index_list}
+    listed |= {alias for entry in index_list for alias in entry.get("aliases", [])}
+    # 重新切割後內容沒變的 chunk（write_chunks 不會重寫）沿用原條目；被合併為 aliases 的重複 chunk 也維持原狀
+    rebuilt = sorted(
+        path for path in {relative_chunk_path(p) for p in updated}
+        if os.path.exists(path)
+        and not (relative_chunk_path(path) in listed and manifest.is_up_to_date(MANIFEST_STAGE, path, tool_version))
+    )
+    dropped = {relative_chunk_path(p) for p in removed} | set(rebuilt)
+    if not rebuilt and not dropped & listed:
+        return None
+
+    # 寫入前仍然有效的條目，寫入後要以新的 index.json 雜湊重新記錄，下次完整建置才會沿用
+    still_valid = [source for source in manifest.sources(MANIFEST_STAGE)
+                   if source not in dropped and manifest.is_up_to_date(MANIFEST_STAGE, source, tool_version)]
+
+    bundle_by, _ = _index_layout(index_list)
+    patched = []
+    orphans = set()
+    for entry in index_list:
+        entry = {key: value for key, value in entry.items() if key not in ("bundle", "rollups")}
+        aliases = entry.get("aliases")
+        if entry["file"] in dropped:
+            # 代表條目沒了，仍存在的重複 chunk 改回各自的條目
+            orphans.update(alias for alias in aliases or [] if alias not in dropped and os.path.exists(alias))
+            continue
+        if aliases and dropped.intersection(aliases):
+            kept = [alias for alias in aliases if alias not in dropped]
+            if kept:
+                entry["aliases"] = kept
+            else:
+                del entry["aliases"]
+        patched.append(entry)
+    orphans = sorted(orphans)
+    new_entries = [build_index_entry(path, estimator) for path in rebuilt + orphans]
+    patched.extend(new_entries)
+    patched.sort(key=_walk_key)
+    patched = annotate_index(patched, bundle_by)
+
+    _write_atomic(index_file, serialize_index(patched))
+    removed_count = len((dropped & listed) - set(rebuilt))
+    print(f"✅ 已就地更新 {index_file}：更新 {len(rebuilt)} 筆、移除 {removed_count} 筆"
+          + (f"、{len(orphans)} 個重複 chunk 改回獨立條目" if orphans else "") + f"，共 {len(patched)} 筆")
+
+    for source in still_valid:
+        manifest.record(MANIFEST_STAGE, source, tool_version, [index_file], data=manifest.data(MANIFEST_STAGE, source))
+    for path, entry in zip(rebuilt + orphans, new_entries):
+        manifest.record(MANIFEST_STAGE, path, tool_version, [index_file],
+                        data={field: entry[field] for field in INDEX_FIELDS})
+    for path in dropped - set(rebuilt):
+        manifest.forget(MANIFEST_STAGE, path)
+    return patched
+
+
+def refresh_derived_indexes(index_list: List[dict], manifest: BuildManifest, targets: Iterable[str]):
+    """以更新後的條目重建衍生索引（各自以指紋判斷，內容未變時不重建）"""
+    if "search" in targets:
+        from search_index import build_search_index
+        build_search_index(index_list, manifest=manifest)
+    if "vector" in targets:
+        from vector_index import build_vector_index
+        build_vector_index(index_list, manifest=manifest)
+    if "facets" in targets:
+        from facets import build_facet_index
+        build_facet_index(index_list, manifest=manifest)
+
+
+def affected_stages(markdown: Iterable[str], chunks_changed: bool) -> List[str]:
+    """
+    依 tools/pipeline.py 的階段 DAG，找出這批變動影響到、且不由本檔逐檔處理的下游階段：
+    處罰案件統計表（knowledge/law/）有變動時視同 pdf 階段有新產出，有 chunk 變動時視同 chunk 階段。
+    """
+    from extract_cases import SOURCE_MD_DIR
+    from pipeline import downstream_stages
+
+    roots = set()
+    if any(os.path.normpath(os.path.dirname(path)) == os.path.normpath(SOURCE_MD_DIR) for path in markdown):
+        roots.add("pdf")
+    if chunks_changed:
+        roots.add("chunk")
+    return [stage for stage in downstream_stages(roots) if stage not in INCREMENTAL_STAGES]
+
+
+def process_changes(changed: Iterable[str], manifest: BuildManifest, chunk_options: Optional[dict] = None,
+                    refresh: Iterable[str] = DEFAULT_REFRESH, index_file: str = "index.json") -> dict:
+    """
+    處理一批有變動的來源：轉換 → 切割 → 其他受影響的 pipeline 階段（案件資料庫、彙總統計）
+    → 就地更新索引（含 bundle 與 rollups 欄位）→ 重建衍生索引與索引分片，最後寫回建置清單。
+    案件資料庫有更新時，分面索引的公司詞典隨之改變，一併重建分面索引。
+
+    Returns:
+        dict: {"convert": 轉換統計, "chunk": 切割統計, "markdown": 轉換階段寫出或刪除的 Markdown,
+               "stages": run_pipeline 的結果（沒有其他受影響的階段時為 None）, "index_updated": bool, "seconds"}
+    """
+    from pipeline import run_pipeline
+
+    chunk_options = chunk_options or {}
+    started = time.perf_counter()
+    markdown, convert_stats = convert_sources(changed, manifest)
+    updated, removed, chunk_stats = rechunk_markdown(markdown, manifest, chunk_options)
+
+    # 彙總統計要在更新條目之前完成，新條目的 rollups 欄位才會指向最新的彙總
+    stages = affected_stages(markdown, bool(updated or removed))
+    stage_outcome = run_pipeline(stages, manifest) if stages else None
+    cases_results = stage_outcome["results"].get("cases", {}) if stage_outcome else {}
+    cases_changed = bool(cases_results.get("parsed") or cases_results.get("removed"))
+
+    index_list = None
+    if updated or removed:
+        index_list = patch_index(updated, removed, manifest, index_file=index_file,
+                                 estimator=chunk_options.get("estimator", "cjk"))
+    if index_list is not None:
+        refresh_derived_indexes(index_list, manifest, set(refresh) | ({"facets"} if cases_changed else set()))
+        _, shard_format = _index_layout(index_list)
+        if shard_format:
+            from generate_index import write_shards
+
+            write_shards(index_list, shard_format)
+    manifest.save()
+    return {"convert": convert_stats, "chunk": chunk_stats, "markdown": sorted(markdown), "stages": stage_outcome,
+            "index_updated": index_list is not None, "seconds": round(time.perf_counter() - started, 4)}
+
+
+def watch(manifest: BuildManifest, chunk_options: Optional[dict] = None, refresh: Iterable[str] = DEFAULT_REFRESH,
+          poll_interval: float = DEFAULT_POLL_INTERVAL, debounce: float = DEFAULT_DEBOUNCE,
+          max_batches: Optional[int] = None):
+    """
+    輪詢來源資料夾並處理變動。連續放入多個檔案時，等到 debounce 秒內不再有變動才一起處理；
+    max_batches 指定時處理這麼多批後結束（測試用），否則持續執行直到 Ctrl+C。
+    """
+    previous = snapshot()
+    pending: Set[str] = set()
+    last_change = 0.0
+    batches = 0
+    print(f"👀 監看 {PDF_DIR}、{CSV_DIR} 與 knowledge/（{len(previous)} 個來源，每 {poll_interval:g}s 輪詢，"
+          f"debounce {debounce:g}s），Ctrl+C 結束")
+    while max_batches is None or batches < max_batches:
+        time.sleep(poll_interval)
+        current = snapshot()
+        changed = diff_snapshots(previous, current)
+        previous = current
+        if changed:
+            pending |= changed
+            last_change = time.monotonic()
+            continue
+        if not pending or time.monotonic() - last_change < debounce:
+            continue
+
+        print(f"\n🔄 偵測到 {len(pending)} 個來源變動")
+        outcome = process_changes(pending, manifest, chunk_options, refresh)
+        convert_stats, chunk_stats = outcome["convert"], outcome["chunk"]
+        print(f"✅ 處理完成（{outcome['seconds']:.3f}s）：轉換 {convert_stats['converted']}、"
+              f"切割 {chunk_stats['chunked']}、移除 {convert_stats['removed'] + chunk_stats['removed']}、"
+              f"失敗 {len(convert_stats['errors']) + len(chunk_stats['errors'])}")
+        pending.clear()
+        batches += 1
+        # 本批轉換寫出的 Markdown 直接納入基準，不再視為新的變動
+        current = snapshot()
+        for path in outcome["markdown"]:
+            if path in current:
+                previous[path] = current[path]
+            else:
+                previous.pop(path, None)
+
+
+def main():
+    from chunk_md import CHUNK_MODES, DEFAULT_CHUNK_MODE, DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, TOKEN_ESTIMATORS
+
+    parser = argparse.ArgumentParser(description="常駐監看來源資料夾，只轉換、切割有變動的檔案並就地更新 index.json")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL, help="輪詢間隔秒數")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help="最後一次變動後等待幾秒才處理")
+    parser.add_argument("--refresh", default=",".join(DEFAULT_REFRESH),
+                        help=f"更新條目後重建的衍生索引，以逗號分隔（可用：{', '.join(REFRESH_TARGETS)}；空字串表示不重建）")
+    parser.add_argument("--mode", choices=CHUNK_MODES, default=DEFAULT_CHUNK_MODE, help="切割模式")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="每個 chunk 的 token 上限")
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS, help="相鄰 chunk 的重疊 token 數")
+    parser.add_argument("--estimator", choices=list(TOKEN_ESTIMATORS), default="cjk", help="長度估算方式")
+    args = parser.parse_args()
+
+    refresh = [t.strip() for t in args.refresh.split(",") if t.strip()]
+    unknown = set(refresh) - set(REFRESH_TARGETS)
+    if unknown:
+        parser.error(f"未知的衍生索引：{', '.join(sorted(unknown))}")
+    chunk_options = {"mode": args.mode, "max_tokens": args.max_tokens,
+                     "overlap_tokens": args.overlap_tokens, "estimator": args.estimator}
+
+    with BuildManifest() as build_manifest:
+        try:
+            watch(build_manifest, chunk_options, refresh, args.interval, args.debounce)
+        except KeyboardInterrupt:
+            print("\n👋 已停止監看")
+
+
+if __name__ == "__main__":
+    main()